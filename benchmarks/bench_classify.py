@@ -0,0 +1,155 @@
+"""
+Microbenchmark: doc-type classification vs. running every processor.
+
+    python benchmarks/bench_classify.py [--n 2000]
+
+For one OCR-like text per document type, reports the type detected by
+pipeline.classify (and its confidence when submitted as that type), then
+compares the per-document cost of one signature-index scan with running
+all registered processors - the brute-force way to find out which type
+yields fields.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Callable, Dict
+
+from ocr_service.core.types import DocType, OCRResult
+from ocr_service.documents.registry import PROCESSOR_PATHS, get_processor
+from ocr_service.pipeline.classify import check_doc_type, score_text, signature_index
+
+SAMPLES: Dict[DocType, str] = {
+    DocType.ID_FRONT: """\
+MAGYARORSZÁG HUNGARY
+SZEMÉLYAZONOSÍTÓ IGAZOLVÁNY IDENTITY CARD
+Családi és utónév / Family name and given name
+KISS JÁNOS
+Nem / Sex: F   Állampolgárság / Nationality: HUN
+Születési idő / Date of birth: 31 01 1990
+Érvényességi idő / Date of expiry: 01 05 2031
+Okmányazonosító / Doc. No: 123456AB   CAN 123456
+""",
+    DocType.ID_BACK: """\
+Születési hely / Place of birth: BUDAPEST
+Születési családi és utónév / Family name and given name at birth: KISS JÁNOS
+Anyja születési neve / Mother's maiden name: NAGY MÁRIA
+Származási hely / Place of origin: BUDAPEST
+Kiállító hatóság / Issuing authority: BM
+I<HUN123456AB<<<<<<<<<<<<<<<
+9001311M3105012HUN<<<<<<<<<<<4
+KISS<<JANOS<<<<<<<<<<<<<<<<<<<
+""",
+    DocType.ID_OLD_FRONT: """\
+SZEMÉLYI AZONOSÍTÓ IGAZOLVÁNY
+Családi és utónév / Surname and given name
+KISS JÁNOS
+123456AB
+""",
+    DocType.ID_OLD_BACK: """\
+Születési név / Birth name: KISS JÁNOS
+Születési hely / Place of birth: BUDAPEST
+Születési idő / Date of birth: 1990.01.31
+Anyja neve / Mother's name: NAGY MÁRIA
+Nem / Sex: férfi
+""",
+    DocType.DRIVING_LICENSE: """\
+VEZETŐI ENGEDÉLY MAGYARORSZÁG
+1. KISS
+2. JÁNOS
+3. 1990.01.31 BUDAPEST
+4a. 2021.05.01  4b. 2031.05.01
+4c. BUDAPEST
+5. AB123456
+9. B
+""",
+    DocType.ADDRESS_CARD: """\
+LAKCÍMET IGAZOLÓ HATÓSÁGI IGAZOLVÁNY
+Családi és utónév: KISS JÁNOS
+Születési hely, idő: BUDAPEST 1990.01.31
+Anyja neve: NAGY MÁRIA
+Lakóhely: 1111 BUDAPEST, FŐ UTCA 1.
+Bejelentési idő: 2015.03.01
+Kiállító hatóság: BUDAPEST FŐVÁROS KORMÁNYHIVATALA
+123456AB
+""",
+    DocType.PASSPORT: """\
+ÚTLEVÉL PASSPORT MAGYARORSZÁG HUNGARY
+Típus/Type P  Kód/Code HUN  Útlevélszám/Passport No. FA1234567
+Családi név/Surname KISS
+Utónév/Given names JÁNOS
+Állampolgárság/Nationality MAGYAR/HUNGARIAN
+Születési idő/Date of birth 31 JAN 1990
+Nem/Sex F   Születési hely/Place of birth BUDAPEST
+Kiállítási dátum/Date of issue 01 MAY 2021
+Érvényességi idő/Date of expiry 01 MAY 2031
+P<HUNKISS<<JANOS<<<<<<<<<<<<<<<<<<<<<<<<<<<<
+FA12345674HUN9001311M3105012<<<<<<<<<<<<<<04
+""",
+    DocType.REGISTRATION: """\
+FORGALMI ENGEDÉLY
+A. ABC-123
+B. 2015.03.01
+D.1 VOLKSWAGEN
+D.2 GOLF
+D.3 GOLF VII
+E. WVWZZZAUZFW123456
+P.1 1395
+P.2 92
+V.9 EURO 6
+Gyártási év: 2015
+""",
+}
+
+
+def _bench(fn: Callable[[], object], n: int) -> float:
+    for _ in range(min(n, 100)):
+        fn()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=2000)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    index = signature_index()
+    print(f"index: {len(index.entries)} entries, built in {(time.perf_counter() - t0) * 1000:.1f} ms\n")
+
+    wrong = 0
+    print(f"{'sample':<16} {'detected':<16} {'confidence':>10}")
+    for doc_type, text in SAMPLES.items():
+        check = check_doc_type(text, None)
+        submitted = check_doc_type(text, doc_type)
+        wrong += check.detected is not doc_type
+        detected = check.detected.value if check.detected else "-"
+        print(f"{doc_type.value:<16} {detected:<16} {submitted.confidence:>10.3f}")
+
+    processors = [get_processor(dt) for dt in PROCESSOR_PATHS]
+    ocrs = [OCRResult(text=t, raw={"pages": [{"index": 0, "markdown": t}]}) for t in SAMPLES.values()]
+
+    def _classify() -> None:
+        for ocr in ocrs:
+            score_text(ocr.text)
+
+    def _all_processors() -> None:
+        for ocr in ocrs:
+            for p in processors:
+                if p is not None:
+                    p.extract_fields(ocr)
+
+    per_doc = len(ocrs)
+    classify = _bench(_classify, args.n) / per_doc
+    brute = _bench(_all_processors, max(1, args.n // 20)) / per_doc
+    print(f"\nclassify         {classify * 1e6:>9.1f} us/doc")
+    print(f"all processors   {brute * 1e6:>9.1f} us/doc  ({brute / classify:.0f}x)")
+    if wrong:
+        print(f"\n{wrong} sample(s) misclassified")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Microbenchmark: per-response cost of the API serialisation paths.
+
+    python benchmarks/bench_serialization.py [--n 20000] [--batch 10]
+
+Compares, for a typical ProcessResponse body and a batch of them:
+- fastapi:  response_model validation + jsonable_encoder + stdlib json (FastAPI default)
+- stdlib:   trusted dict encoded directly with stdlib json
+- fast:     trusted dict encoded with api.serialization.dumps (orjson if installed)
+- compact:  fast + null fields dropped from personal_data / vehicle_data
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict
+
+from fastapi.encoders import jsonable_encoder
+
+from ocr_service.api.models import BatchResponse, ProcessResponse
+from ocr_service.api.serialization import compact_result, dumps, orjson
+from ocr_service.documents import personal_schema
+
+
+def _sample_body(i: int = 0) -> Dict[str, Any]:
+    data = personal_schema.empty()
+    data.update({
+        "full_name": "KISS JÁNOS",
+        "birth_date": "1990.01.31",
+        "birth_place": "BUDAPEST",
+        "sex": "F",
+        "nationality": "HUN",
+        "expiry_date": "2031.05.01",
+    })
+    return {
+        "uid": f"user-{i}",
+        "doc_type": "ID_FRONT",
+        "document_number": "123456AB",
+        "is_correct_document": True,
+        "confidence": 0.5,
+        "personal_data": data,
+        "vehicle_data": None,
+    }
+
+
+def _stdlib(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _fastapi_path(model: Any, body: Any) -> bytes:
+    validated = model.model_validate(body)
+    return _stdlib(jsonable_encoder(validated))
+
+
+def _bench(fn: Callable[[], bytes], n: int) -> float:
+    for _ in range(min(n, 1000)):
+        fn()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6  # µs per call
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--batch", type=int, default=10)
+    args = ap.parse_args()
+
+    single = _sample_body()
+    batch = {"items": [
+        {"index": i, "uid": f"user-{i}", "ok": True, "duplicate_of": None, "result": _sample_body(i),
+         "error": None}
+        for i in range(args.batch)
+    ]}
+    compact_batch = {"items": [{**it, "result": compact_result(it["result"])} for it in batch["items"]]}
+
+    print(f"encoder: {'orjson' if orjson is not None else 'stdlib json (orjson not installed)'}")
+    print(f"{'case':<10} {'path':<10} {'µs/resp':>10} {'bytes':>8}")
+    cases = [
+        ("single", "fastapi", lambda: _fastapi_path(ProcessResponse, single)),
+        ("single", "stdlib", lambda: _stdlib(single)),
+        ("single", "fast", lambda: dumps(single)),
+        ("single", "compact", lambda: dumps(compact_result(single))),
+        (f"batch{args.batch}", "fastapi", lambda: _fastapi_path(BatchResponse, batch)),
+        (f"batch{args.batch}", "stdlib", lambda: _stdlib(batch)),
+        (f"batch{args.batch}", "fast", lambda: dumps(batch)),
+        (f"batch{args.batch}", "compact", lambda: dumps(compact_batch)),
+    ]
+    for case, path, fn in cases:
+        n = args.n if case == "single" else max(1, args.n // args.batch)
+        print(f"{case:<10} {path:<10} {_bench(fn, n):>10.2f} {len(fn()):>8}")
+
+
+if __name__ == "__main__":
+    main()
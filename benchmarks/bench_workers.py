@@ -0,0 +1,212 @@
+"""
+Throughput vs uvicorn worker count, against a local mock of the Mistral OCR API.
+
+    python benchmarks/bench_workers.py [--workers 1 2 4] [--requests 200]
+                                       [--concurrency 32] [--latency 0.3] [--dup 0.5]
+
+For each worker count a fresh server (fresh cache / state dirs) is started
+with MISTRAL_SERVER_URL pointing at the mock, and --requests POST /v1/process
+calls are fired with --concurrency in flight. A --dup fraction of them reuse
+one of a few images under distinct uids, so they miss idempotency but should
+hit the shared OCR cache - in whichever worker they land. Reported per run:
+requests/s, latency p50/p95, status counts and the number of provider calls
+the mock actually received (== distinct images when the cache is shared).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+import httpx
+from PIL import Image, ImageDraw
+
+_DUP_IMAGES = 4
+
+_OCR_MARKDOWN = (
+    "MAGYARORSZÁG / HUNGARY\nSZEMÉLYAZONOSÍTÓ IGAZOLVÁNY / IDENTITY CARD\n"
+    "Név / Name: KISS JÁNOS\nSzületési idő / Date of birth: 1990.01.31\n"
+    "Okmányazonosító / Document No: 123456AB\nÉrvényes / Date of expiry: 2031.05.01"
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class _MockOCR:
+    """
+    Minimal /v1/ocr endpoint: sleeps `latency` seconds, returns one page of markdown.
+    """
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:  # noqa: N802
+                self.rfile.read(int(self.headers.get("content-length", "0")))
+                with mock._lock:
+                    mock.calls += 1
+                time.sleep(mock.latency)
+                body = json.dumps({
+                    "pages": [{"index": 0, "markdown": _OCR_MARKDOWN, "images": [], "dimensions": None}],
+                    "model": "mistral-ocr-latest",
+                    "usage_info": {"pages_processed": 1, "doc_size_bytes": None},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.port = _free_port()
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+
+    def close(self) -> None:
+        self.server.shutdown()
+
+
+def _image(seed: int) -> bytes:
+    rng = random.Random(seed)
+    img = Image.new("RGB", (1200, 800), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(200):
+        x, y = rng.randrange(1200), rng.randrange(800)
+        draw.rectangle((x, y, x + rng.randrange(5, 80), y + rng.randrange(5, 40)), fill=rng.randrange(256))
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _payloads(n: int, dup: float) -> List[bytes]:
+    rng = random.Random(1)
+    dup_images = [_image(10_000 + i) for i in range(_DUP_IMAGES)]
+    return [
+        rng.choice(dup_images) if rng.random() < dup else _image(i)
+        for i in range(n)
+    ]
+
+
+def _start_server(workers: int, port: int, mock_port: int, state_dir: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "MISTRAL_API_KEY": env.get("MISTRAL_API_KEY", "bench"),
+        "MISTRAL_SERVER_URL": f"http://127.0.0.1:{mock_port}",
+        "WEB_CONCURRENCY": str(workers),
+        "OCR_CACHE_DIR": os.path.join(state_dir, "ocr"),
+        "IDEMPOTENCY_DB_PATH": os.path.join(state_dir, "idempotency", "responses.sqlite3"),
+        "ADMISSION_STATE_PATH": os.path.join(state_dir, "admission", "workers.sqlite3"),
+        "JOBS_DB_PATH": os.path.join(state_dir, "jobs", "jobs.sqlite3"),
+        "JOBS_FILES_DIR": os.path.join(state_dir, "jobs", "files"),
+    })
+    cmd = [
+        sys.executable, "-m", "uvicorn", "ocr_service.api.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers),
+        "--log-level", "warning",
+    ]
+    proc = subprocess.Popen(cmd, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                time.sleep(1.0)  # let every worker finish its lifespan startup
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+async def _fire(port: int, payloads: List[bytes], concurrency: int) -> Tuple[float, List[float], Counter]:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+        async def one(i: int, data: bytes) -> None:
+            async with sem:
+                started = time.perf_counter()
+                resp = await client.post(
+                    "/v1/process",
+                    data={"uid": f"bench-{i}", "doc_type": "ID_FRONT"},
+                    files={"file": (f"doc-{i}.png", data, "image/png")},
+                )
+                latencies.append(time.perf_counter() - started)
+                statuses[resp.status_code] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i, d) for i, d in enumerate(payloads)))
+        return time.perf_counter() - started, latencies, statuses
+
+
+def _pct(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--latency", type=float, default=0.3, help="mock provider latency (s)")
+    ap.add_argument("--dup", type=float, default=0.5, help="fraction of requests reusing a cached image")
+    args = ap.parse_args()
+
+    payloads = _payloads(args.requests, args.dup)
+    distinct = len(set(payloads))
+    mock = _MockOCR(args.latency)
+    print(f"{args.requests} requests ({distinct} distinct images), concurrency {args.concurrency}, "
+          f"provider latency {args.latency * 1000:.0f} ms")
+    print(f"{'workers':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'provider calls':>15}  statuses")
+
+    results: Dict[int, float] = {}
+    try:
+        for workers in args.workers:
+            state_dir = tempfile.mkdtemp(prefix="bench-workers-")
+            port = _free_port()
+            proc = _start_server(workers, port, mock.port, state_dir)
+            mock.reset()
+            try:
+                elapsed, latencies, statuses = asyncio.run(_fire(port, payloads, args.concurrency))
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+                shutil.rmtree(state_dir, ignore_errors=True)
+            results[workers] = args.requests / elapsed
+            print(f"{workers:>7} {results[workers]:>8.1f} {_pct(latencies, 0.5) * 1000:>8.0f} "
+                  f"{_pct(latencies, 0.95) * 1000:>8.0f} {mock.calls:>15}  {dict(statuses)}")
+    finally:
+        mock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Cold-start guard: import time and heavy-module budget of the service entry points.
+
+    python benchmarks/import_budget.py [--budget-ms 900] [--runs 3]
+
+Each entry point is imported in a fresh interpreter (best of --runs, via
+-X importtime). Exits non-zero when an import exceeds the budget or pulls
+in a module that must stay lazy (the OCR SDK, OpenCV / NumPy, document
+processors) - those are loaded by warm-up / first use instead.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Set, Tuple
+
+ENTRY_POINTS = (
+    "ocr_service.api.main",
+    "ocr_service.cli.process",
+)
+
+# top-level module prefixes that must not be imported at startup
+LAZY = (
+    "mistralai",
+    "cv2",
+    "numpy",
+    "ocr_service.documents.id_front",
+    "ocr_service.documents.id_back",
+    "ocr_service.documents.id_old_front",
+    "ocr_service.documents.id_old_back",
+    "ocr_service.documents.driving_license",
+    "ocr_service.documents.address_card",
+    "ocr_service.documents.passport",
+    "ocr_service.documents.registration",
+)
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def _import(module: str) -> Tuple[float, Set[str]]:
+    """
+    (cumulative import seconds of `module`, every module imported) in a fresh interpreter.
+    """
+    env = dict(os.environ)
+    env.setdefault("MISTRAL_API_KEY", "import-budget")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total_us = 0
+    modules: Set[str] = set()
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        modules.add(m.group(4))
+        if m.group(4) == module:
+            total_us = int(m.group(2))
+    return total_us / 1e6, modules
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--budget-ms", type=float, default=900.0)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    failures: List[str] = []
+    for module in ENTRY_POINTS:
+        _import(module)  # first run writes .pyc files; not representative
+        best = float("inf")
+        seen: Set[str] = set()
+        for _ in range(args.runs):
+            seconds, modules = _import(module)
+            best = min(best, seconds)
+            seen |= modules
+
+        lazy_hits: Dict[str, List[str]] = {}
+        for name in sorted(seen):
+            for prefix in LAZY:
+                if name == prefix or name.startswith(prefix + "."):
+                    lazy_hits.setdefault(prefix, []).append(name)
+
+        status = "ok"
+        if best * 1000 > args.budget_ms:
+            status = "OVER BUDGET"
+            failures.append(f"{module}: {best * 1000:.0f} ms > {args.budget_ms:.0f} ms")
+        for prefix in lazy_hits:
+            status = "EAGER IMPORT"
+            failures.append(f"{module}: imports {prefix} at startup")
+        print(f"{module:<28} {best * 1000:>7.0f} ms  {len(seen):>4} modules  {status}")
+
+    if failures:
+        print("\n".join(["", "FAILED:"] + failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
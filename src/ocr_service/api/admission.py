@@ -0,0 +1,634 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from ocr_service.core.tenants import Tenant, current_tenant
+from ocr_service.core.types import DocType
+from ocr_service.core.utils.sqlite import connect
+from ocr_service.pipeline.preflight import PreflightInfo
+
+# Cost-based admission control for the processing routes.
+#
+# Cost unit: roughly one single-page image through OCR + extraction.
+# Requests are admitted while the summed cost of in-flight requests stays
+# within ADMISSION_MAX_COST; otherwise they get 429 with a Retry-After derived
+# from the observed drain rate (cost completed per second), before the body
+# is read.
+#
+# With several uvicorn workers the budget is host-wide: every worker publishes
+# its in-flight cost, active count and drain rate to a shared SQLite (WAL)
+# table every ADMISSION_SYNC_SECONDS and admits against its own load plus the
+# latest totals of its peers (rows from dead workers age out).
+#
+# Admission uses a provisional cost (one page plus the declared body size);
+# handlers refine it once preflight knows the page count. A refined cost that
+# no longer fits the budget gets the same 429 while other requests are in
+# flight, so the budget holds for what actually runs.
+#
+# Tenant quotas (core/tenants.py) are checked first: admitted requests in
+# flight (max_concurrent) and pages sent to OCR over the last minute
+# (pages_per_minute, a sliding window of 1 s buckets). A request is charged
+# one page on admission and its real page count once preflight knows it
+# (cached OCR: none); one rejected or failed before that (cost budget,
+# 400 / 413, preflight) is charged nothing. With a shared budget the per-tenant usage is synced
+# through the same table, so quotas are host-wide too.
+#
+# Async jobs (POST /v1/jobs) are charged their preflight page count when
+# submitted and rejected with the same 429 once over pages_per_minute; a
+# queued job holds no concurrency slot (the job workers bound that).
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_MAX_COST = float(os.getenv("ADMISSION_MAX_COST", "48"))
+ADMISSION_MAX_RETRY_AFTER = int(os.getenv("ADMISSION_MAX_RETRY_AFTER", "60"))
+ADMISSION_SHARED = os.getenv(
+    "ADMISSION_SHARED", "1" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "0"
+) == "1"
+ADMISSION_STATE_PATH = os.getenv("ADMISSION_STATE_PATH", "cache/admission/workers.sqlite3")
+ADMISSION_SYNC_SECONDS = float(os.getenv("ADMISSION_SYNC_SECONDS", "0.25"))
+_PEER_STALE_SECONDS = 5.0     # peers not seen for this long are ignored
+_PEER_PURGE_SECONDS = 300.0   # ... and removed after this long
+ADMISSION_PATHS = (
+    "/v1/process",
+    "/v1/process_base64",
+    "/v1/process_raw",
+    "/v1/process_batch",
+    "/v1/process_bundle",
+)
+# metered routes with one path parameter (matched by prefix and suffix)
+ADMISSION_PATH_TEMPLATES = ("/v1/uploads/{upload_id}/process",)
+
+PAGE_COST = 1.0   # per page OCR'd
+MB_COST = 0.2     # per MB uploaded (decode, base64, transfer to the provider)
+
+# Extraction weight per doc type (registration/CoC run the largest rule sets)
+_DOC_WEIGHT: Dict[DocType, float] = {
+    DocType.PASSPORT: 0.3,
+    DocType.REGISTRATION: 0.5,
+    DocType.COC: 0.5,
+}
+_DEFAULT_DOC_WEIGHT = 0.2
+
+_BUSY_DETAIL = "Too many requests in progress. Retry later."
+
+_EWMA_ALPHA = 0.3
+_RATE_SAMPLE_SECONDS = 1.0
+_QUOTA_WINDOW_SECONDS = 60  # pages_per_minute window
+
+
+def admission_route(path: str, paths: Iterable[str] = ADMISSION_PATHS) -> Optional[str]:
+    """
+    The metered route (path or template) a request path belongs to, else None.
+    """
+    if path in paths:
+        return path
+    for template in ADMISSION_PATH_TEMPLATES:
+        prefix, _, rest = template.partition("{")
+        suffix = rest.partition("}")[2]
+        param = path[len(prefix):len(path) - len(suffix)]
+        if path.startswith(prefix) and path.endswith(suffix) and param and "/" not in param:
+            return template
+    return None
+
+
+def estimate_cost(doc_type: Optional[DocType], info: PreflightInfo, *, ocr_cached: bool = False) -> float:
+    """
+    Cost of one document from its preflight info. doc_type=None (bundle or
+    detected type) assumes every page is a document of average weight; ocr_cached=True
+    (OCR served from the disk cache) leaves only the extraction.
+    """
+    pages = info.page_count or 1
+    weight = _DOC_WEIGHT.get(doc_type, _DEFAULT_DOC_WEIGHT) if doc_type else _DEFAULT_DOC_WEIGHT * pages
+    if ocr_cached:
+        return weight
+    return pages * PAGE_COST + info.size / 1_000_000 * MB_COST + weight
+
+
+def estimate_body_cost(content_length: Optional[int]) -> float:
+    """
+    Provisional cost before the body is read: one page plus transfer size.
+    """
+    size_mb = (content_length or 0) / 1_000_000
+    return PAGE_COST + size_mb * MB_COST + _DEFAULT_DOC_WEIGHT
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: int, in_flight: float) -> None:
+        super().__init__(f"Over admission budget ({in_flight:.1f} cost units in flight).")
+        self.retry_after = retry_after
+        self.in_flight = in_flight
+
+
+@dataclass
+class Ticket:
+    cost: float
+    admitted_at: float
+
+
+@dataclass
+class AdmissionStats:
+    budget: float
+    in_flight: float
+    active: int
+    admitted: int
+    rejected: int
+    drain_rate: float  # cost units per second (EWMA)
+    peer_in_flight: float = 0.0
+    peer_active: int = 0
+    peer_drain_rate: float = 0.0
+
+
+class AdmissionController:
+    """
+    Tracks in-flight cost against a budget. Not thread-safe by design: it is
+    only touched from the event loop.
+
+    A request is always admitted when nothing is in flight, so a single
+    request larger than the budget still runs (alone). peer_* hold the other
+    workers' load when the budget is shared (see WorkerStateStore).
+    """
+    def __init__(self, budget: float = ADMISSION_MAX_COST) -> None:
+        self.budget = budget
+        self.in_flight = 0.0
+        self.active = 0  # admitted requests not yet released
+        self.admitted = 0
+        self.rejected = 0
+        self.drain_rate = 0.0
+        self.peer_in_flight = 0.0
+        self.peer_active = 0
+        self.peer_drain_rate = 0.0
+        self._drained = 0.0
+        self._sample_start = time.monotonic()
+
+    def admit(self, cost: float) -> Ticket:
+        in_flight = self.in_flight + self.peer_in_flight
+        if self.active + self.peer_active > 0 and in_flight + cost > self.budget:
+            self.rejected += 1
+            raise AdmissionRejected(self.retry_after(cost), in_flight)
+        self.in_flight += cost
+        self.active += 1
+        self.admitted += 1
+        return Ticket(cost=cost, admitted_at=time.monotonic())
+
+    def refine(self, ticket: Ticket, cost: float) -> None:
+        """
+        Replace a provisional estimate with the real one once it is known.
+        Raises AdmissionRejected (the ticket keeps its provisional cost) when
+        the increase does not fit the budget; as in admit(), a request with
+        nothing else in flight always fits.
+        """
+        extra = cost - ticket.cost
+        in_flight = self.in_flight + self.peer_in_flight
+        if extra > 0 and self.active + self.peer_active > 1 and in_flight + extra > self.budget:
+            self.rejected += 1
+            raise AdmissionRejected(self.retry_after(extra), in_flight)
+        self.in_flight += extra
+        ticket.cost = cost
+
+    def release(self, ticket: Ticket) -> None:
+        self.active -= 1
+        self.in_flight = max(0.0, self.in_flight - ticket.cost) if self.active else 0.0
+        self._drained += ticket.cost
+        ticket.cost = 0.0
+        self._sample()
+
+    def retry_after(self, cost: float) -> int:
+        """
+        Seconds until enough in-flight cost should have drained for `cost` to fit.
+        """
+        self._sample()
+        excess = self.in_flight + self.peer_in_flight + cost - self.budget
+        drain_rate = self.drain_rate + self.peer_drain_rate
+        if drain_rate <= 0 or excess <= 0:
+            return 1
+        return max(1, min(ADMISSION_MAX_RETRY_AFTER, math.ceil(excess / drain_rate)))
+
+    def _sample(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._sample_start
+        if elapsed < _RATE_SAMPLE_SECONDS:
+            return
+        rate = self._drained / elapsed
+        if self.drain_rate == 0.0:
+            self.drain_rate = rate
+        elif rate > 0 or self.active > 0:
+            # idle periods (nothing in flight, nothing drained) say nothing about capacity
+            self.drain_rate = _EWMA_ALPHA * rate + (1 - _EWMA_ALPHA) * self.drain_rate
+        self._drained = 0.0
+        self._sample_start = now
+
+    def stats(self) -> AdmissionStats:
+        return AdmissionStats(
+            budget=self.budget,
+            in_flight=self.in_flight,
+            active=self.active,
+            admitted=self.admitted,
+            rejected=self.rejected,
+            drain_rate=self.drain_rate,
+            peer_in_flight=self.peer_in_flight,
+            peer_active=self.peer_active,
+            peer_drain_rate=self.peer_drain_rate,
+        )
+
+
+class TenantQuotaExceeded(Exception):
+    def __init__(self, tenant: str, quota: str, retry_after: int) -> None:
+        super().__init__(f"Tenant {tenant!r} is over its {quota} quota.")
+        self.tenant = tenant
+        self.quota = quota  # "concurrency" | "pages"
+        self.retry_after = retry_after
+        what = "requests in progress" if quota == "concurrency" else "pages per minute"
+        self.detail = f"Tenant quota exceeded ({what}). Retry later."
+
+
+@dataclass
+class TenantTicket:
+    tenant: Tenant
+    pages: int
+    final: bool = False  # real page count charged (not the provisional one)
+    job: bool = False    # an async job submission, not a request
+
+
+@dataclass
+class TenantUsage:
+    active: int = 0
+    requests: int = 0
+    pages: int = 0
+    rejected_concurrency: int = 0
+    rejected_pages: int = 0
+    jobs: int = 0
+    job_pages: int = 0
+    rejected_job_pages: int = 0
+    window: Deque[List[int]] = field(default_factory=deque)  # [second, pages], oldest first
+    peer_active: int = 0
+    peer_pages: int = 0
+
+    def window_pages(self, now: int) -> int:
+        while self.window and self.window[0][0] <= now - _QUOTA_WINDOW_SECONDS:
+            self.window.popleft()
+        return max(0, sum(pages for _, pages in self.window))
+
+    def add_pages(self, now: int, pages: int) -> None:
+        if self.window and self.window[-1][0] == now:
+            self.window[-1][1] += pages
+        else:
+            self.window.append([now, pages])
+
+
+@dataclass
+class TenantStats:
+    active: int
+    requests: int
+    pages: int
+    pages_last_minute: int
+    rejected_concurrency: int
+    rejected_pages: int
+    jobs: int
+    job_pages: int
+    rejected_job_pages: int
+    peer_active: int
+    peer_pages: int
+
+
+class TenantQuotas:
+    """
+    Per-tenant concurrency and pages-per-minute accounting. Like
+    AdmissionController, only touched from the event loop; peer_* usage is
+    the other workers' (see WorkerStateStore). A tenant with nothing in its
+    window is always admitted, so one document larger than its page quota
+    still runs.
+    """
+    def __init__(self) -> None:
+        self.usage: Dict[str, TenantUsage] = {}
+
+    def _usage(self, name: str) -> TenantUsage:
+        u = self.usage.get(name)
+        if u is None:
+            u = self.usage[name] = TenantUsage()
+        return u
+
+    def admit(self, tenant: Tenant, pages: int = 1, *, job: bool = False) -> TenantTicket:
+        """
+        job=True for an async job submission: its pages are known and final,
+        and only the pages quota applies.
+        """
+        u = self._usage(tenant.name)
+        now = int(time.monotonic())
+        if not job and tenant.max_concurrent and u.active + u.peer_active >= tenant.max_concurrent:
+            u.rejected_concurrency += 1
+            raise TenantQuotaExceeded(tenant.name, "concurrency", 1)
+        if tenant.pages_per_minute:
+            used = u.window_pages(now) + u.peer_pages
+            if used > 0 and used + pages > tenant.pages_per_minute:
+                if job:
+                    u.rejected_job_pages += 1
+                else:
+                    u.rejected_pages += 1
+                excess = used + pages - tenant.pages_per_minute
+                raise TenantQuotaExceeded(tenant.name, "pages", self._pages_retry_after(u, now, excess))
+        u.active += 1
+        u.add_pages(now, pages)
+        return TenantTicket(tenant=tenant, pages=pages, final=job, job=job)
+
+    @staticmethod
+    def _pages_retry_after(u: TenantUsage, now: int, excess: int) -> int:
+        """
+        Seconds until `excess` pages of this worker leave the window.
+        """
+        freed = 0
+        for second, pages in u.window:
+            freed += pages
+            if freed >= excess:
+                return max(1, min(ADMISSION_MAX_RETRY_AFTER, second + _QUOTA_WINDOW_SECONDS - now))
+        return min(ADMISSION_MAX_RETRY_AFTER, _QUOTA_WINDOW_SECONDS)
+
+    def charge(self, ticket: TenantTicket, pages: int) -> None:
+        """
+        Replace the provisional page count with the real one.
+        """
+        ticket.final = True
+        if pages != ticket.pages:
+            self._usage(ticket.tenant.name).add_pages(int(time.monotonic()), pages - ticket.pages)
+            ticket.pages = pages
+
+    def release(self, ticket: TenantTicket, *, admitted: bool = True) -> None:
+        """
+        End of the request; admitted=False for one refused by the cost
+        budget right after its quota check (not counted).
+        """
+        u = self._usage(ticket.tenant.name)
+        u.active = max(0, u.active - 1)
+        if admitted and ticket.job:
+            u.jobs += 1
+            u.job_pages += ticket.pages
+        elif admitted:
+            u.requests += 1
+            u.pages += ticket.pages
+
+    def local_usage(self) -> Dict[str, Tuple[int, int]]:
+        """
+        tenant -> (active, pages in the window), for the shared state table.
+        """
+        now = int(time.monotonic())
+        return {name: (u.active, u.window_pages(now)) for name, u in self.usage.items()}
+
+    def set_peer_usage(self, peers: Dict[str, Tuple[int, int]]) -> None:
+        for name in self.usage.keys() | peers.keys():
+            u = self._usage(name)
+            u.peer_active, u.peer_pages = peers.get(name, (0, 0))
+
+    def stats(self) -> Dict[str, TenantStats]:
+        now = int(time.monotonic())
+        return {
+            name: TenantStats(
+                active=u.active,
+                requests=u.requests,
+                pages=u.pages,
+                pages_last_minute=u.window_pages(now),
+                rejected_concurrency=u.rejected_concurrency,
+                rejected_pages=u.rejected_pages,
+                jobs=u.jobs,
+                job_pages=u.job_pages,
+                rejected_job_pages=u.rejected_job_pages,
+                peer_active=u.peer_active,
+                peer_pages=u.peer_pages,
+            )
+            for name, u in self.usage.items()
+        }
+
+
+_STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    pid INTEGER PRIMARY KEY,
+    in_flight REAL NOT NULL,
+    active INTEGER NOT NULL,
+    drain_rate REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tenants (
+    pid INTEGER NOT NULL,
+    tenant TEXT NOT NULL,
+    active INTEGER NOT NULL,
+    pages INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (pid, tenant)
+);
+"""
+
+
+class WorkerStateStore:
+    """
+    Per-worker admission load in a SQLite table shared by the workers on one host.
+    """
+    def __init__(self, db_path: str = ADMISSION_STATE_PATH) -> None:
+        self.db_path = db_path
+        self.pid = os.getpid()
+        self._conn = connect(db_path)
+        self._conn.executescript(_STATE_SCHEMA)
+
+    def sync(self, in_flight: float, active: int, drain_rate: float) -> Tuple[float, int, float]:
+        """
+        Publish this worker's load; return the peers' (in_flight, active, drain_rate).
+        """
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO workers (pid, in_flight, active, drain_rate, updated_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (self.pid, in_flight, active, drain_rate, now),
+        )
+        row = self._conn.execute(
+            "SELECT COALESCE(SUM(in_flight), 0), COALESCE(SUM(active), 0),"
+            " COALESCE(SUM(drain_rate), 0) FROM workers WHERE pid != ? AND updated_at >= ?",
+            (self.pid, now - _PEER_STALE_SECONDS),
+        ).fetchone()
+        return float(row[0]), int(row[1]), float(row[2])
+
+    def sync_tenants(self, usage: Dict[str, Tuple[int, int]]) -> Dict[str, Tuple[int, int]]:
+        """
+        Publish this worker's per-tenant (active, pages); return the peers' totals.
+        """
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO tenants (pid, tenant, active, pages, updated_at) VALUES (?, ?, ?, ?, ?)",
+            [(self.pid, name, active, pages, now) for name, (active, pages) in usage.items()],
+        )
+        rows = self._conn.execute(
+            "SELECT tenant, SUM(active), SUM(pages) FROM tenants"
+            " WHERE pid != ? AND updated_at >= ? GROUP BY tenant",
+            (self.pid, now - _PEER_STALE_SECONDS),
+        ).fetchall()
+        return {str(r[0]): (int(r[1]), int(r[2])) for r in rows}
+
+    def purge(self) -> None:
+        cutoff = time.time() - _PEER_PURGE_SECONDS
+        self._conn.execute("DELETE FROM workers WHERE updated_at < ?", (cutoff,))
+        self._conn.execute("DELETE FROM tenants WHERE updated_at < ?", (cutoff,))
+
+    def remove(self) -> None:
+        self._conn.execute("DELETE FROM workers WHERE pid = ?", (self.pid,))
+        self._conn.execute("DELETE FROM tenants WHERE pid = ?", (self.pid,))
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+_controller: Optional[AdmissionController] = None
+_quotas: Optional[TenantQuotas] = None
+
+
+def get_admission() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
+
+
+def get_tenant_quotas() -> TenantQuotas:
+    global _quotas
+    if _quotas is None:
+        _quotas = TenantQuotas()
+    return _quotas
+
+
+_sync_task: Optional[asyncio.Task[None]] = None
+
+
+async def _sync_loop(controller: AdmissionController, quotas: TenantQuotas, store: WorkerStateStore) -> None:
+    await asyncio.to_thread(store.purge)
+    try:
+        while True:
+            load = (controller.in_flight, controller.active, controller.drain_rate)
+            usage = quotas.local_usage()
+
+            def _sync(
+                load: Tuple[float, int, float], usage: Dict[str, Tuple[int, int]]
+            ) -> Tuple[Tuple[float, int, float], Dict[str, Tuple[int, int]]]:
+                return store.sync(*load), store.sync_tenants(usage)
+
+            try:
+                peers, tenant_peers = await asyncio.to_thread(_sync, load, usage)
+            except Exception:
+                logger.exception("admission state sync failed")
+            else:
+                controller.peer_in_flight, controller.peer_active, controller.peer_drain_rate = peers
+                quotas.set_peer_usage(tenant_peers)
+            await asyncio.sleep(ADMISSION_SYNC_SECONDS)
+    finally:
+        await asyncio.shield(asyncio.to_thread(store.remove))
+        store.close()
+
+
+def start_admission_sync() -> None:
+    """
+    Share the admission budget with the other workers (ADMISSION_SHARED=1).
+    """
+    global _sync_task
+    if not (ADMISSION_ENABLED and ADMISSION_SHARED) or _sync_task is not None:
+        return
+    _sync_task = asyncio.create_task(_sync_loop(get_admission(), get_tenant_quotas(), WorkerStateStore()))
+
+
+async def stop_admission_sync() -> None:
+    global _sync_task
+    if _sync_task is not None:
+        _sync_task.cancel()
+        try:
+            await _sync_task
+        except asyncio.CancelledError:
+            pass
+        _sync_task = None
+
+
+def refine_admission(request: Request, cost: float, pages: Optional[int] = None) -> None:
+    """
+    Called by handlers once preflight knows the real size / page count;
+    `pages` (to be OCR'd, 0 when cached) is charged to the tenant's quota.
+    Raises 429 when the real cost no longer fits the budget (nothing is
+    charged to the tenant then).
+    """
+    ticket: Optional[Ticket] = request.scope.get("admission_ticket")
+    if ticket is not None:
+        try:
+            get_admission().refine(ticket, cost)
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=429,
+                detail=_BUSY_DETAIL,
+                headers={"Retry-After": str(e.retry_after)},
+            ) from e
+    tenant_ticket: Optional[TenantTicket] = request.scope.get("admission_tenant_ticket")
+    if tenant_ticket is not None and pages is not None:
+        get_tenant_quotas().charge(tenant_ticket, pages)
+
+
+def tenant_rejected_response(e: TenantQuotaExceeded) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"detail": e.detail},
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware (streaming responses keep their ticket until the
+    last byte is sent). Only POSTs to ADMISSION_PATHS and
+    ADMISSION_PATH_TEMPLATES are metered.
+    """
+    def __init__(self, app: ASGIApp, paths: Iterable[str] = ADMISSION_PATHS) -> None:
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            not ADMISSION_ENABLED
+            or scope["type"] != "http"
+            or scope["method"] != "POST"
+            or admission_route(scope["path"], self.paths) is None
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        declared = Request(scope).headers.get("content-length", "")
+        controller = get_admission()
+        quotas = get_tenant_quotas()
+        try:
+            tenant_ticket = quotas.admit(current_tenant())
+        except TenantQuotaExceeded as e:
+            await tenant_rejected_response(e)(scope, receive, send)
+            return
+        try:
+            ticket = controller.admit(estimate_body_cost(int(declared) if declared.isdigit() else None))
+        except AdmissionRejected as e:
+            quotas.charge(tenant_ticket, 0)  # nothing was OCR'd
+            quotas.release(tenant_ticket, admitted=False)
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": _BUSY_DETAIL},
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        scope["admission_ticket"] = ticket
+        scope["admission_tenant_ticket"] = tenant_ticket
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(ticket)
+            if not tenant_ticket.final:
+                quotas.charge(tenant_ticket, 0)  # failed before preflight: nothing was OCR'd
+            quotas.release(tenant_ticket)
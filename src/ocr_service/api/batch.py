@@ -0,0 +1,496 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from dataclasses import dataclass
+from tempfile import SpooledTemporaryFile
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from starlette.datastructures import UploadFile
+from starlette.types import Message
+
+from ocr_service.api.admission import estimate_cost, refine_admission
+from ocr_service.api.common import (
+    MAX_IMAGE_BYTES,
+    MAX_PDF_BYTES,
+    SPILL_BYTES,
+    build_response,
+    choose_ext,
+    content_hash,
+    max_bytes_for_ext,
+    read_upload,
+    run_extract,
+    run_ocr,
+    run_preflight,
+)
+from ocr_service.api.ingest import Base64StreamDecoder, IngestError, JSONFieldStream
+from ocr_service.api.memory import refine_memory
+from ocr_service.api.models import (
+    BatchRequest,
+    BatchRequestMeta,
+    BatchResponse,
+    ProcessRequestMeta,
+    RequestDocType,
+    requested_doc_type,
+)
+from ocr_service.api.serialization import COMPACT_DEFAULT, compact_result, json_response
+from ocr_service.api.streaming import (
+    STREAM_RESPONSES,
+    Event,
+    event_response,
+    stream_mode,
+    stream_ocr,
+)
+from ocr_service.core.deadline import DeadlineExceeded, remaining_seconds
+from ocr_service.core.metrics import stage
+from ocr_service.core.types import DocType, ExtractionResult, OCRResult
+
+router = APIRouter()
+
+MAX_BATCH_ITEMS = int(os.getenv("API_MAX_BATCH_ITEMS", "10"))
+MAX_BATCH_BYTES = int(os.getenv("API_MAX_BATCH_BYTES", "60000000"))  # whole request body
+BATCH_DEADLINE_SECONDS = float(os.getenv("API_BATCH_DEADLINE_SECONDS", "60"))
+
+
+@dataclass
+class _Item:
+    index: int
+    uid: str
+    doc_type: Optional[DocType] = None  # None: AUTO
+    spool: Optional[SpooledTemporaryFile] = None
+    ext: Optional[str] = None
+    digest: Optional[str] = None
+    pages: int = 1
+    size: int = 0
+    cost: float = 0.0
+    error: Optional[HTTPException] = None
+
+
+def _validated_uid(raw: Optional[str]) -> str:
+    uid = (raw or "").strip()
+    if not uid:
+        raise HTTPException(status_code=422, detail="uid must not be empty.")
+    return uid
+
+
+async def _finish_item(item: _Item, size: int) -> None:
+    """
+    Common tail for both input formats: size limit, preflight, content hash
+    (off the event loop; OCR reuses it for its cache key).
+    """
+    assert item.spool is not None and item.ext is not None
+    limit = max_bytes_for_ext(item.ext)
+    if size > limit:
+        raise HTTPException(status_code=413, detail=f"File too large. Max bytes for .{item.ext} = {limit}.")
+    info = await run_preflight(item.doc_type, item.ext, item.spool)
+    item.pages = info.page_count or 1
+    item.size = size
+    item.cost = estimate_cost(item.doc_type, info)
+    item.digest = await asyncio.to_thread(content_hash, item.spool)
+
+
+def _capped(request: Request, limit: int) -> Request:
+    """
+    The request with a body that fails with 413 once more than `limit` bytes
+    arrive (chunked bodies have no Content-Length to check up front).
+    """
+    received = 0
+
+    async def receive() -> Message:
+        nonlocal received
+        message = await request.receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                raise HTTPException(status_code=413, detail=f"Request body too large. Max bytes = {limit}.")
+        return message
+
+    return Request(request.scope, receive)
+
+
+async def _items_from_form(request: Request) -> List[_Item]:
+    form = await _capped(request, MAX_BATCH_BYTES).form(
+        max_files=MAX_BATCH_ITEMS, max_fields=3 * MAX_BATCH_ITEMS
+    )
+    try:
+        uids = form.getlist("uid")
+        doc_types = form.getlist("doc_type")
+        files = form.getlist("file")
+
+        if not files:
+            raise HTTPException(status_code=422, detail="At least one 'file' part is required.")
+        if not (len(uids) == len(doc_types) == len(files)):
+            raise HTTPException(
+                status_code=422,
+                detail="Provide one 'uid' and one 'doc_type' part per 'file' part, in the same order.",
+            )
+
+        items: List[_Item] = []
+        for i, (uid, dt, file) in enumerate(zip(uids, doc_types, files, strict=True)):
+            item = _Item(index=i, uid=str(uid).strip())
+            items.append(item)
+            try:
+                if not isinstance(file, UploadFile):
+                    raise HTTPException(status_code=422, detail="'file' part must be a file upload.")
+                item.uid = _validated_uid(str(uid))
+                try:
+                    item.doc_type = requested_doc_type(RequestDocType(str(dt)))
+                except ValueError:
+                    raise HTTPException(status_code=422, detail=f"Unknown doc_type: {dt}") from None
+
+                prefix = await file.read(64)
+                await file.seek(0)
+                item.ext = choose_ext(
+                    req_ext=None,
+                    blob=prefix,
+                    filename=file.filename,
+                    content_type=file.content_type,
+                )
+                item.spool = await read_upload(file, item.ext)
+                item.spool.seek(0, os.SEEK_END)
+                size = item.spool.tell()
+                item.spool.seek(0)
+                await _finish_item(item, size)
+            except HTTPException as e:
+                item.error = e
+        return items
+    finally:
+        await form.close()  # the parts were copied into the items' spools
+
+
+class _JSONItem:
+    """
+    One element of a JSON batch while the body is being parsed: its
+    file_base64 is decoded straight into a spool. A decoding error fails
+    only this item (the rest of its base64 is skipped), not the batch.
+    """
+    def __init__(self) -> None:
+        self.decoder = Base64StreamDecoder(max_bytes=max(MAX_IMAGE_BYTES, MAX_PDF_BYTES), spill_bytes=SPILL_BYTES)
+        self.parser = JSONFieldStream({"file_base64": self.feed})
+        self.error: Optional[HTTPException] = None
+
+    def feed(self, chunk: bytes) -> None:
+        if self.error is not None:
+            return
+        try:
+            self.decoder.feed(chunk)
+        except IngestError as e:
+            self.decoder.discard()
+            self.error = HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+def _json_errors(parser: JSONFieldStream, model: Type[BaseModel], loc: Tuple[Any, ...], streamed: str) -> List[dict]:
+    errors = []
+    if streamed not in parser.streamed:
+        errors.append({"type": "missing", "loc": (*loc, streamed), "msg": "Field required", "input": None})
+    try:
+        model.model_validate(parser.fields)
+    except ValidationError as e:
+        errors.extend({**err, "loc": (*loc, *err["loc"])} for err in e.errors(include_url=False))
+    return errors
+
+
+async def _items_from_json(request: Request) -> Tuple[List[_Item], Optional[float]]:
+    """
+    Stream-parse a BatchRequest body: each item's file_base64 is decoded
+    into its own spool as it arrives, so neither the body nor the encoded
+    strings are ever held in memory.
+    """
+    parsed: List[_JSONItem] = []
+
+    def next_item() -> JSONFieldStream:
+        if len(parsed) >= MAX_BATCH_ITEMS:
+            raise IngestError(413, f"Too many items. Max = {MAX_BATCH_ITEMS}.")
+        parsed.append(_JSONItem())
+        return parsed[-1].parser
+
+    parser = JSONFieldStream({}, object_arrays={"items": next_item})
+    received = 0
+    try:
+        try:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > MAX_BATCH_BYTES:
+                    raise IngestError(413, f"Request body too large. Max bytes = {MAX_BATCH_BYTES}.")
+                parser.feed(chunk)
+            parser.close()
+        except IngestError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail) from e
+
+        errors = _json_errors(parser, BatchRequestMeta, ("body",), "items")
+        if "items" in parser.streamed and not parsed:
+            errors.append({
+                "type": "too_short",
+                "loc": ("body", "items"),
+                "msg": "List should have at least 1 item after validation, not 0",
+                "input": [],
+            })
+        for i, p in enumerate(parsed):
+            errors.extend(_json_errors(p.parser, ProcessRequestMeta, ("body", "items", i), "file_base64"))
+        if errors:
+            raise RequestValidationError(errors)
+        meta = BatchRequestMeta.model_validate(parser.fields)
+
+        items: List[_Item] = []
+        for i, p in enumerate(parsed):
+            r = ProcessRequestMeta.model_validate(p.parser.fields)
+            item = _Item(index=i, uid=r.uid.strip(), doc_type=requested_doc_type(r.doc_type))
+            items.append(item)
+            try:
+                item.uid = _validated_uid(r.uid)
+                if p.error is not None:
+                    raise p.error
+                try:
+                    item.spool = p.decoder.close()
+                except IngestError as e:
+                    p.decoder.discard()
+                    raise HTTPException(status_code=e.status_code, detail=e.detail) from e
+                if p.decoder.decoded == 0:
+                    raise HTTPException(status_code=400, detail="Decoded file is empty.")
+
+                prefix = item.spool.read(64)
+                item.spool.seek(0)
+                item.ext = choose_ext(req_ext=r.extension, blob=prefix, filename=None, content_type=None)
+                await _finish_item(item, p.decoder.decoded)
+            except HTTPException as e:
+                item.error = e
+    except BaseException:
+        for p in parsed:
+            p.decoder.discard()
+        raise
+    return items, meta.deadline_seconds
+
+
+async def _extract_after(ocr_task: asyncio.Task[OCRResult], doc_type: Optional[DocType]) -> ExtractionResult:
+    ocr = await ocr_task
+    return await run_extract(doc_type=doc_type, ocr=ocr)
+
+
+@dataclass
+class _Plan:
+    ocr_tasks: Dict[str, asyncio.Task[OCRResult]]
+    extract_tasks: Dict[Tuple[str, DocType], asyncio.Task[ExtractionResult]]
+    first_index: Dict[str, int]
+
+    async def cancel(self) -> None:
+        tasks = [*self.ocr_tasks.values(), *self.extract_tasks.values()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _schedule(items: List[_Item], on_page: Optional[Callable[[Event], Any]] = None) -> _Plan:
+    """
+    Start one OCR task per distinct file and one extraction task per
+    (file, doc_type). With on_page, each OCR'd page is reported as progress.
+    """
+    plan = _Plan(ocr_tasks={}, extract_tasks={}, first_index={})
+    for item in items:
+        if item.error is not None:
+            continue
+        assert item.digest is not None
+        if item.digest not in plan.ocr_tasks:
+            plan.first_index[item.digest] = item.index
+            if on_page is None:
+                ocr = run_ocr(data=item.spool, ext=item.ext, digest=item.digest)
+            else:
+                ocr = stream_ocr(
+                    data=item.spool,
+                    ext=item.ext,
+                    page_count=item.pages,
+                    digest=item.digest,
+                    on_page=lambda ev, i=item.index: on_page((ev[0], {"index": i, **ev[1]})),
+                )
+            plan.ocr_tasks[item.digest] = asyncio.create_task(ocr)
+        key = (item.digest, item.doc_type)
+        if key not in plan.extract_tasks:
+            plan.extract_tasks[key] = asyncio.create_task(
+                _extract_after(plan.ocr_tasks[item.digest], item.doc_type)
+            )
+    return plan
+
+
+def _error(item: _Item, status_code: int, detail) -> dict:
+    return {
+        "index": item.index,
+        "uid": item.uid,
+        "ok": False,
+        "duplicate_of": None,
+        "result": None,
+        "error": {"status_code": status_code, "detail": detail},
+    }
+
+
+def _outcome(item: _Item, plan: _Plan, compact: bool = False) -> dict:
+    """
+    Per-item result (or error) once its extraction task has settled.
+    """
+    if item.error is not None:
+        return _error(item, item.error.status_code, item.error.detail)
+
+    task = plan.extract_tasks[(item.digest, item.doc_type)]
+    if task.cancelled():
+        return _error(item, 504, "Batch deadline exceeded.")
+    exc = task.exception()
+    if isinstance(exc, HTTPException):
+        return _error(item, exc.status_code, exc.detail)
+    if isinstance(exc, DeadlineExceeded):
+        return _error(item, 504, f"{str(exc).capitalize()}.")
+    if exc is not None:
+        return _error(item, 500, "Internal error while processing this item.")
+
+    dup = plan.first_index[item.digest]
+    result = build_response(task.result(), item.uid)
+    return {
+        "index": item.index,
+        "uid": item.uid,
+        "ok": True,
+        "duplicate_of": dup if dup != item.index else None,
+        "result": compact_result(result) if compact else result,
+        "error": None,
+    }
+
+
+async def _batch_events(items: List[_Item], budget: float, compact: bool) -> AsyncIterator[Event]:
+    """
+    Streaming mode: page events as pages finish, one document event per item
+    as soon as its extraction settles (in completion order), then done.
+    """
+    queue: asyncio.Queue[Event] = asyncio.Queue()
+    ok = 0
+    for item in items:
+        if item.error is not None:
+            yield "document", _error(item, item.error.status_code, item.error.detail)
+
+    plan = _schedule(items, on_page=queue.put_nowait)
+    waiting: Dict[Tuple[str, DocType], List[_Item]] = {}
+    for item in items:
+        if item.error is None:
+            waiting.setdefault((item.digest, item.doc_type), []).append(item)
+    for key, task in plan.extract_tasks.items():
+        task.add_done_callback(lambda _t, key=key: queue.put_nowait(("_settled", {"key": key})))
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget
+    try:
+        while waiting:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                event, data = await asyncio.wait_for(queue.get(), timeout=remaining)
+            except TimeoutError:
+                break
+            if event != "_settled":
+                yield event, data
+                continue
+            for item in waiting.pop(data["key"], []):
+                out = _outcome(item, plan, compact)
+                ok += out["ok"]
+                yield "document", out
+
+        await plan.cancel()
+        for group in waiting.values():
+            for item in group:
+                yield "document", _outcome(item, plan, compact)
+    finally:
+        await plan.cancel()
+    yield "done", {"items": len(items), "ok": ok}
+
+
+def _close(items: List[_Item]) -> None:
+    for item in items:
+        if item.spool is not None:
+            item.spool.close()
+
+
+@router.post(
+    "/process_batch",
+    response_model=BatchResponse,
+    responses=STREAM_RESPONSES,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": BatchRequest.model_json_schema(ref_template="#/components/schemas/{model}"),
+                },
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {
+                            "uid": {"type": "array", "items": {"type": "string"}},
+                            "doc_type": {"type": "array", "items": {"$ref": "#/components/schemas/RequestDocType"}},
+                            "file": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                        },
+                        "required": ["uid", "doc_type", "file"],
+                    },
+                },
+            },
+        },
+    },
+)
+async def process_batch(
+    request: Request,
+    compact: bool = Query(COMPACT_DEFAULT, description="Omit null fields from personal_data / vehicle_data."),
+):
+    """
+    Process several documents in one call.
+
+    - multipart: repeated `uid`, `doc_type` and `file` parts, matched by position
+    - JSON: {"items": [ProcessRequest, ...], "deadline_seconds": optional}
+
+    Identical files are OCR'd once; all items run concurrently on the shared
+    executor. Results (or per-item errors) are returned in input order; items
+    not finished by the batch deadline fail with 504.
+
+    With `Accept: text/event-stream` or `application/x-ndjson`, per-page and
+    per-item events are streamed as they complete instead.
+    """
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > MAX_BATCH_BYTES:
+        raise HTTPException(status_code=413, detail=f"Request body too large. Max bytes = {MAX_BATCH_BYTES}.")
+
+    ctype = request.headers.get("content-type", "").lower()
+    deadline_seconds: Optional[float] = None
+    if ctype.startswith("multipart/form-data"):
+        items = await _items_from_form(request)
+    elif ctype.startswith("application/json"):
+        with stage("ingest"):
+            items, deadline_seconds = await _items_from_json(request)
+    else:
+        raise HTTPException(status_code=415, detail="Use multipart/form-data or application/json.")
+
+    budget = min(deadline_seconds or BATCH_DEADLINE_SECONDS, BATCH_DEADLINE_SECONDS)
+    remaining = remaining_seconds()
+    if remaining is not None:
+        budget = max(0.0, min(budget, remaining))  # X-Request-Timeout bounds the batch too
+
+    # identical files are OCR'd once
+    costs = {(item.digest, item.doc_type): item.cost for item in items if item.error is None}
+    pages = {item.digest: item.pages for item in items if item.error is None}
+    try:
+        refine_admission(request, sum(costs.values()), pages=sum(pages.values()))
+    except BaseException:
+        _close(items)
+        raise
+    sizes = {item.digest: item.size for item in items if item.error is None}
+    refine_memory(request, sum(sizes.values()))
+
+    mode = stream_mode(request)
+    if mode is not None:
+        return event_response(mode, _batch_events(items, budget, compact), cleanup=lambda: _close(items))
+
+    plan = _schedule(items)
+    try:
+        if plan.extract_tasks:
+            _, pending = await asyncio.wait(plan.extract_tasks.values(), timeout=budget)
+            if pending:
+                await plan.cancel()
+        return json_response({"items": [_outcome(item, plan, compact) for item in items]})
+    finally:
+        await plan.cancel()
+        _close(items)
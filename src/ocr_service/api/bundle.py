@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+
+from fastapi import APIRouter, File, Form, HTTPException, Query, Request, UploadFile
+
+from ocr_service.api.admission import estimate_cost, refine_admission
+from ocr_service.api.common import (
+    build_response,
+    choose_ext,
+    read_upload,
+    run_extract,
+    run_ocr,
+    run_preflight,
+    run_split_bundle,
+)
+from ocr_service.api.memory import refine_memory
+from ocr_service.api.models import BundleResponse
+from ocr_service.api.serialization import COMPACT_DEFAULT, compact_result, json_response
+
+router = APIRouter()
+
+FilePart = File(...)
+
+
+@router.post("/process_bundle", response_model=BundleResponse)
+async def process_bundle(
+    request: Request,
+    uid: str = Form(...),
+    file: UploadFile = FilePart,
+    compact: bool = Query(COMPACT_DEFAULT, description="Omit null fields from personal_data / vehicle_data."),
+):
+    """
+    Process a scan containing several documents (e.g. ID front + back,
+    address card and registration in one PDF).
+
+    The upload is OCR'd once; every page is classified by keyword signatures
+    and consecutive pages of the same document are grouped, then each
+    document is dispatched to its processor. Pages that match no document
+    type are listed in unclassified_pages.
+    """
+    uid = (uid or "").strip()
+    if not uid:
+        raise HTTPException(status_code=422, detail="uid must not be empty.")
+
+    prefix = await file.read(64)
+    await file.seek(0)
+
+    ext = choose_ext(
+        req_ext=None,
+        blob=prefix,
+        filename=file.filename,
+        content_type=file.content_type,
+    )
+
+    spool = await read_upload(file, ext)
+    try:
+        info = await run_preflight(None, ext, spool)
+        refine_admission(request, estimate_cost(None, info), pages=info.page_count or 1)
+        refine_memory(request, info.size)
+        ocr = await run_ocr(data=spool, ext=ext)
+    finally:
+        spool.close()
+
+    documents, unclassified = await run_split_bundle(ocr)
+    results = await asyncio.gather(
+        *(run_extract(doc_type=group.doc_type, ocr=doc_ocr) for group, doc_ocr in documents)
+    )
+
+    bodies = [build_response(res, uid) for res in results]
+    return json_response({
+        "uid": uid,
+        "page_count": len(ocr.raw.get("pages", [])),
+        "documents": [
+            {
+                "doc_type": group.doc_type,
+                "pages": group.pages,
+                "classification_score": group.score,
+                "result": compact_result(body) if compact else body,
+            }
+            for (group, _), body in zip(documents, bodies, strict=True)
+        ],
+        "unclassified_pages": unclassified,
+    })
@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+
+from ocr_service.api.admission import (
+    ADMISSION_ENABLED,
+    AdmissionRejected,
+    TenantQuotaExceeded,
+    estimate_cost,
+    get_admission,
+    get_tenant_quotas,
+)
+from ocr_service.api.common import (
+    content_hash,
+    inspect_upload,
+    max_bytes_for_ext,
+    run_pipeline_idempotent,
+    sniff_ext,
+)
+from ocr_service.api.memory import MemoryBudgetExceeded, reserve_memory
+from ocr_service.api.models import RequestDocType, requested_doc_type
+from ocr_service.api.serialization import dumps
+from ocr_service.core.deadline import (
+    REQUEST_TIMEOUT_SECONDS,
+    Deadline,
+    DeadlineExceeded,
+    set_deadline,
+)
+from ocr_service.core.tenants import current_tenant
+from ocr_service.core.types import DocType
+from ocr_service.pipeline.executor import CPU_POOL, QueueFullError, get_executor
+from ocr_service.pipeline.preflight import PreflightInfo
+from ocr_service.pipeline.service import ocr_cached
+
+# Live capture over a WebSocket: /v1/capture?uid=...&doc_type=...[&auto=true]
+#
+# client -> server
+#   binary                 a downscaled preview frame (JPEG / PNG / WebP)
+#   {"type": "still"}      the next binary message is the full-resolution still
+#   {"type": "finish"}     process the best preview frame seen so far
+# server -> client
+#   {"type": "frame", ...}     per-frame scores and a hint for the UI
+#                              (ok, blurry, glare, no_document, too_dark, busy)
+#   {"type": "capture", ...}   a good frame was seen with the camera held
+#                              steady: send the still (or "finish")
+#   {"type": "result", ...}    the /v1/process response; the socket then closes
+#   {"type": "error", ...}     status + detail; the session stays open
+#
+# Frames are scored on the CPU pool (pipeline/capture.py); only the best frame
+# (or the still) goes through OCR and extraction, under the same admission
+# budget, memory budget, deadline and idempotency as /v1/process. With auto=true the best
+# preview frame is processed as soon as the capture prompt would be sent.
+
+router = APIRouter()
+
+CAPTURE_MAX_FRAME_BYTES = int(os.getenv("CAPTURE_MAX_FRAME_BYTES", "1500000"))
+CAPTURE_MAX_FRAMES = int(os.getenv("CAPTURE_MAX_FRAMES", "900"))
+CAPTURE_MAX_SECONDS = float(os.getenv("CAPTURE_MAX_SECONDS", "180"))
+
+
+async def _send(websocket: WebSocket, message: Dict[str, Any]) -> None:
+    await websocket.send_text(dumps(message).decode("utf-8"))
+
+
+async def _error(websocket: WebSocket, status: int, detail: str) -> None:
+    await _send(websocket, {"type": "error", "status": status, "detail": detail})
+
+
+def _inspect(doc_type: Optional[DocType], ext: str, data: bytes) -> Tuple[PreflightInfo, str, bool]:
+    """
+    Preflight, content hash and OCR cache check of a full-resolution still
+    (CPU pool: hashing, SQLite and a file stat).
+    """
+    info = inspect_upload(doc_type, ext, data)
+    digest = content_hash(data)
+    return info, digest, ocr_cached(digest, ext)
+
+
+async def _process(*, uid: str, doc_type: Optional[DocType], data: bytes) -> Dict[str, Any]:
+    """
+    OCR + extraction of one image, like /v1/process. Raises HTTPException.
+    """
+    ext = sniff_ext(data[:64])
+    if ext is None:
+        raise HTTPException(status_code=400, detail="Could not determine file type of the image.")
+    limit = max_bytes_for_ext(ext)
+    if len(data) > limit:
+        raise HTTPException(status_code=413, detail=f"File too large. Max bytes for .{ext} = {limit}.")
+    try:
+        info, digest, cached = await get_executor().run(CPU_POOL, _inspect, doc_type, ext, data)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy ({e.depth} requests queued). Retry later.",
+            headers={"Retry-After": "1"},
+        ) from e
+
+    controller = get_admission() if ADMISSION_ENABLED else None
+    quotas = get_tenant_quotas() if ADMISSION_ENABLED else None
+    ticket = tenant_ticket = None
+    if controller is not None and quotas is not None:
+        try:
+            tenant_ticket = quotas.admit(current_tenant(), 0 if cached else info.page_count or 1)
+        except TenantQuotaExceeded as e:
+            raise HTTPException(
+                status_code=429,
+                detail=e.detail,
+                headers={"Retry-After": str(e.retry_after)},
+            ) from e
+        try:
+            ticket = controller.admit(estimate_cost(doc_type, info, ocr_cached=cached))
+        except AdmissionRejected as e:
+            quotas.charge(tenant_ticket, 0)  # nothing was OCR'd
+            quotas.release(tenant_ticket, admitted=False)
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests in progress. Retry later.",
+                headers={"Retry-After": str(e.retry_after)},
+            ) from e
+    set_deadline(Deadline(REQUEST_TIMEOUT_SECONDS))
+    try:
+        async with reserve_memory(len(data)):
+            body, _ = await run_pipeline_idempotent(uid=uid, doc_type=doc_type, data=data, ext=ext, digest=digest)
+    except MemoryBudgetExceeded as e:
+        if tenant_ticket is not None:
+            quotas.charge(tenant_ticket, 0)  # refused before OCR
+        raise HTTPException(
+            status_code=503,
+            detail="Server memory budget exhausted. Retry later.",
+            headers={"Retry-After": str(e.retry_after)},
+        ) from e
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=f"{str(e).capitalize()}.") from e
+    finally:
+        set_deadline(None)
+        if ticket is not None:
+            controller.release(ticket)
+        if tenant_ticket is not None:
+            quotas.release(tenant_ticket)
+    return body
+
+
+@router.websocket("/capture")
+async def capture(websocket: WebSocket) -> None:
+    uid = websocket.query_params.get("uid", "").strip()
+    try:
+        requested: Optional[RequestDocType] = RequestDocType(websocket.query_params.get("doc_type", ""))
+    except ValueError:
+        requested = None
+    if not uid or requested is None:
+        await websocket.close(code=1008, reason="uid and doc_type query parameters are required.")
+        return
+    doc_type = requested_doc_type(requested)
+    auto = websocket.query_params.get("auto", "").lower() in ("1", "true")
+    await websocket.accept()
+
+    # NumPy: imported on first use, not at startup
+    from ocr_service.pipeline.capture import CaptureSession, FrameError, analyze_frame
+
+    session = CaptureSession()
+    executor = get_executor()
+    expires_at = time.monotonic() + CAPTURE_MAX_SECONDS
+    expect_still = False
+    prompted = False
+
+    async def finish(data: bytes, source: str, seq: Optional[int]) -> bool:
+        try:
+            body = await _process(uid=uid, doc_type=doc_type, data=data)
+        except HTTPException as e:
+            await _error(websocket, e.status_code, str(e.detail))
+            return False
+        await _send(websocket, {
+            "type": "result",
+            "source": source,
+            "seq": seq,
+            "frames": session.frames,
+            "result": body,
+        })
+        await websocket.close(code=1000)
+        return True
+
+    try:
+        while True:
+            remaining = expires_at - time.monotonic()
+            try:
+                message = await asyncio.wait_for(websocket.receive(), timeout=max(remaining, 0.0))
+            except TimeoutError:
+                await _error(websocket, 408, f"Capture session exceeded {CAPTURE_MAX_SECONDS:.0f}s.")
+                await websocket.close(code=1008)
+                return
+            if message["type"] == "websocket.disconnect":
+                return
+
+            data = message.get("bytes")
+            if data is not None:
+                if expect_still:
+                    expect_still = False
+                    if await finish(data, "still", None):
+                        return
+                    continue
+                if len(data) > CAPTURE_MAX_FRAME_BYTES:
+                    await _error(websocket, 413, f"Frame too large. Max bytes = {CAPTURE_MAX_FRAME_BYTES}.")
+                    continue
+                if session.frames >= CAPTURE_MAX_FRAMES:
+                    await _error(websocket, 429, f"Frame limit reached ({CAPTURE_MAX_FRAMES}); send finish or a still.")
+                    continue
+
+                seq = session.frames
+                try:
+                    score = await executor.run(CPU_POOL, analyze_frame, data, seq, session.previous)
+                except QueueFullError:
+                    await _send(websocket, {"type": "frame", "seq": seq, "hint": "busy"})
+                    continue
+                except FrameError as e:
+                    await _error(websocket, 400, str(e))
+                    continue
+                session.add(score, data)
+                await _send(websocket, {
+                    "type": "frame",
+                    "seq": seq,
+                    "quality": score.quality,
+                    "sharpness": score.sharpness,
+                    "glare": score.glare,
+                    "presence": score.presence,
+                    "duplicate": score.duplicate,
+                    "steady": session.steady,
+                    "best_seq": session.best.seq if session.best else None,
+                    "hint": score.hint(),
+                })
+
+                if session.ready and not prompted:
+                    prompted = True
+                    best = session.best
+                    if auto:
+                        if await finish(session.best_data, "frame", best.seq):
+                            return
+                    else:
+                        await _send(websocket, {"type": "capture", "seq": best.seq, "quality": best.quality})
+                continue
+
+            try:
+                command = json.loads(message.get("text") or "")
+                kind = command.get("type") if isinstance(command, dict) else None
+            except ValueError:
+                kind = None
+            if kind == "still":
+                expect_still = True
+            elif kind == "finish":
+                if session.best is None:
+                    await _error(websocket, 409, "No usable frame yet.")
+                elif await finish(session.best_data, "frame", session.best.seq):
+                    return
+            else:
+                await _error(websocket, 400, 'Unknown message; expected {"type": "still"} or {"type": "finish"}.')
+    except WebSocketDisconnect:
+        return
@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from tempfile import SpooledTemporaryFile
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+
+from ocr_service.api.idempotency import get_idempotency, idempotency_key
+from ocr_service.config.mistral_client import get_mistral_client
+from ocr_service.config.settings import get_settings
+from ocr_service.core.metrics import cache_lookup, observe_stage, stage
+from ocr_service.core.types import DocType, ExtractionResult, OCRResult
+from ocr_service.core.utils.image import (
+    BinarySource,
+    StreamEncoder,
+    normalize_ext,
+    source_sha256,
+)
+from ocr_service.pipeline.classify import PageGroup
+from ocr_service.pipeline.executor import CPU_POOL, OCR_POOL, QueueFullError, get_executor
+from ocr_service.pipeline.preflight import (
+    PreflightError,
+    PreflightInfo,
+    enforce_limits,
+    inspect_bytes,
+    inspect_stream,
+)
+from ocr_service.pipeline.service import (
+    extract_document,
+    extraction_payload,
+    ocr_document_bytes,
+    split_bundle,
+)
+
+# Shared request-handling helpers for the /v1 routers.
+
+# Size limits (bytes)
+MAX_IMAGE_BYTES = int(os.getenv("API_MAX_IMAGE_BYTES", "6000000"))   # 6 MB
+MAX_PDF_BYTES = int(os.getenv("API_MAX_PDF_BYTES", "20000000"))      # 20 MB
+MAX_UPLOAD_BYTES = max(MAX_IMAGE_BYTES, MAX_PDF_BYTES)  # before the file type is known
+ALLOWED_EXT = {"jpg", "jpeg", "png", "webp", "pdf"}
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+SPILL_BYTES = int(os.getenv("API_SPILL_BYTES", "8000000"))  # uploads above this spool to disk
+# base64-encode uploads for the OCR request while they are received (hashing always is)
+PREENCODE = os.getenv("API_PREENCODE", "1") == "1"
+# base64 of the largest allowed file + room for the data URL prefix and scalar fields
+MAX_BASE64_BODY_BYTES = (MAX_UPLOAD_BYTES + 2) // 3 * 4 + 64 * 1024
+
+
+def sniff_ext(blob: bytes) -> Optional[str]:
+    if len(blob) >= 4 and blob[:4] == b"%PDF":
+        return "pdf"
+    if len(blob) >= 3 and blob[0:3] == b"\xFF\xD8\xFF":
+        return "jpg"
+    if len(blob) >= 8 and blob[0:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if len(blob) >= 12 and blob[0:4] == b"RIFF" and blob[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def choose_ext(
+    req_ext: Optional[str],
+    blob: Optional[bytes],
+    filename: Optional[str],
+    content_type: Optional[str],
+) -> str:
+    # 1) explicit extension wins
+    if req_ext:
+        ext = normalize_ext(req_ext)
+        if ext not in ALLOWED_EXT:
+            raise HTTPException(status_code=400, detail=f"Unsupported extension: {req_ext}")
+        return ext
+
+    # 2) content-type
+    ct = (content_type or "").lower().strip()
+    if ct == "application/pdf":
+        return "pdf"
+    if ct in ("image/jpeg", "image/jpg"):
+        return "jpg"
+    if ct == "image/png":
+        return "png"
+    if ct == "image/webp":
+        return "webp"
+
+    # 3) filename suffix
+    if filename and "." in filename:
+        ext = normalize_ext(filename.rsplit(".", 1)[-1])
+        if ext in ALLOWED_EXT:
+            return ext
+
+    # 4) sniff (needs bytes)
+    if blob:
+        sniffed = sniff_ext(blob)
+        if sniffed:
+            return sniffed
+
+    raise HTTPException(
+        status_code=400,
+        detail="Could not determine file type. Provide extension or upload a valid jpg/png/webp/pdf.",
+    )
+
+
+def max_bytes_for_ext(ext: str) -> int:
+    return MAX_PDF_BYTES if ext == "pdf" else MAX_IMAGE_BYTES
+
+
+def new_encoder() -> StreamEncoder:
+    """
+    Hash (and, with PREENCODE, base64-encode) an upload while it is received.
+    """
+    return StreamEncoder(encode=PREENCODE, batch_bytes=CHUNK_SIZE)
+
+
+async def drain_encoder(encoder: Optional[StreamEncoder], *, final: bool = False) -> None:
+    """
+    Hash / encode the chunks queued on `encoder` in a worker thread once a
+    batch is due (final=True: whatever is left), so the event loop only
+    queues references while the body streams in.
+    """
+    if encoder is not None and (encoder.due() or (final and encoder.pending)):
+        await asyncio.to_thread(encoder.flush)
+
+
+async def read_upload(
+    file: UploadFile,
+    ext: str,
+    encoder: Optional[StreamEncoder] = None,
+) -> SpooledTemporaryFile:
+    """
+    Copy the upload into a spool that stays in memory up to SPILL_BYTES
+    and only rolls over to an (already unlinked) temp file above that.
+    Chunks are also fed to `encoder`, if given (fully flushed on return).
+    """
+    limit = max_bytes_for_ext(ext)
+    spool = SpooledTemporaryFile(max_size=SPILL_BYTES)
+
+    total = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > limit:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File too large. Max bytes for .{ext} = {limit}.",
+                )
+            spool.write(chunk)
+            if encoder is not None:
+                encoder.feed(chunk)
+                await drain_encoder(encoder)
+
+        if total == 0:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+
+        await drain_encoder(encoder, final=True)
+        spool.seek(0)
+        observe_stage("ingest", time.perf_counter() - started)
+        return spool
+
+    except HTTPException:
+        spool.close()
+        raise
+
+
+def inspect_upload(doc_type: Optional[DocType], ext: str, data: BinarySource) -> PreflightInfo:
+    """
+    Run header-only inspection and per-doc-type limits (doc_type=None: type
+    unknown up front, bundle limits); map failures to HTTP errors. Blocking: a PDF's xref streams are
+    inflated, so handlers go through run_preflight().
+    """
+    try:
+        with stage("preflight"):
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                info = inspect_bytes(bytes(data), ext)
+            else:
+                info = inspect_stream(data, ext)
+            enforce_limits(info, doc_type)
+    except PreflightError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail) from e
+    return info
+
+
+def _busy(e: QueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=f"Server busy ({e.depth} requests queued). Retry later.",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def run_preflight(doc_type: Optional[DocType], ext: str, data: BinarySource) -> PreflightInfo:
+    """
+    inspect_upload() on the shared executor's CPU pool.
+    """
+    try:
+        return await get_executor().run(CPU_POOL, inspect_upload, doc_type, ext, data)
+    except QueueFullError as e:
+        raise _busy(e) from e
+
+
+async def run_ocr(
+    *,
+    data: BinarySource,
+    ext: str,
+    digest: Optional[str] = None,
+    data_url: Optional[str] = None,
+) -> OCRResult:
+    """
+    OCR stage on the shared executor's OCR-wait pool.
+    """
+    try:
+        client = get_mistral_client()
+        return await get_executor().run(
+            OCR_POOL, ocr_document_bytes, client=client, data=data, ext=ext, digest=digest, data_url=data_url
+        )
+    except QueueFullError as e:
+        raise _busy(e) from e
+
+
+async def run_extract(*, doc_type: Optional[DocType], ocr: OCRResult) -> ExtractionResult:
+    """
+    Extraction stage on the shared executor's CPU pool.
+    """
+    try:
+        return await get_executor().run(CPU_POOL, extract_document, doc_type=doc_type, ocr=ocr)
+    except QueueFullError as e:
+        raise _busy(e) from e
+
+
+async def run_split_bundle(ocr: OCRResult) -> Tuple[List[Tuple[PageGroup, OCRResult]], List[int]]:
+    """
+    Page classification of a bundle on the CPU pool (the first call also
+    imports every rules module).
+    """
+    try:
+        return await get_executor().run(CPU_POOL, split_bundle, ocr)
+    except QueueFullError as e:
+        raise _busy(e) from e
+
+
+async def run_pipeline(
+    *,
+    doc_type: Optional[DocType],
+    data: BinarySource,
+    ext: str,
+    digest: Optional[str] = None,
+    data_url: Optional[str] = None,
+) -> ExtractionResult:
+    """
+    Run the synchronous pipeline stages on the shared executor, off the event loop.
+    """
+    ocr = await run_ocr(data=data, ext=ext, digest=digest, data_url=data_url)
+    return await run_extract(doc_type=doc_type, ocr=ocr)
+
+
+async def run_pipeline_idempotent(
+    *,
+    uid: str,
+    doc_type: Optional[DocType],
+    data: BinarySource,
+    ext: str,
+    digest: Optional[str] = None,
+    data_url: Optional[str] = None,
+    cleanup: Optional[Callable[[], None]] = None,
+) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    run_pipeline + build_response, deduplicated by (uid, content hash,
+    doc_type, rules version). Returns (response, replay marker or None).
+    `digest` / `data_url` are the content hash and OCR encoding when the
+    caller already has them. With `cleanup` (e.g. closing a spool) this
+    takes ownership of `data`: the shared computation can outlive the
+    caller that started it, so the data is released when that computation
+    is done.
+    """
+    async def compute() -> Dict[str, Any]:
+        res = await run_pipeline(doc_type=doc_type, data=data, ext=ext, digest=digest, data_url=data_url)
+        return build_response(res, uid)
+
+    coordinator = get_idempotency()
+    if coordinator is None:
+        try:
+            return await compute(), None
+        finally:
+            if cleanup is not None:
+                cleanup()
+
+    try:
+        if digest is None:
+            digest = content_hash(data)  # hashed once, for the key and the OCR cache
+        key = idempotency_key(
+            uid=uid,
+            digest=digest,
+            doc_type=doc_type,
+            model=get_settings().ocr_model,
+        )
+    except BaseException:
+        if cleanup is not None:
+            cleanup()
+        raise
+    response, replay = await coordinator.run(key, compute, cleanup)
+    cache_lookup("idempotency", hit=replay is not None)
+    return response, replay
+
+
+def build_response(res, uid: str) -> dict:
+    # same key set as ProcessResponse, so the dict can be encoded without re-validation
+    return {"uid": uid, **extraction_payload(res)}
+
+
+def content_hash(data: BinarySource) -> str:
+    """
+    sha256 hex digest of bytes or a file object (read from the start, position restored).
+    """
+    return source_sha256(data)
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Iterable
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ocr_service.api.admission import ADMISSION_PATHS, admission_route
+from ocr_service.core.deadline import TIMEOUT_HEADER, Deadline, DeadlineExceeded, set_deadline
+
+# Request deadlines and client-disconnect cancellation for the processing routes.
+#
+# Every request gets a Deadline (X-Request-Timeout seconds, or
+# REQUEST_TIMEOUT_SECONDS) that the pipeline checks before each stage
+# (core/deadline.py). Once the body has been read, the connection is watched:
+# if the client goes away before the response is complete, the deadline is
+# cancelled and the handler task with it, so queued OCR calls and extractions
+# are dropped and the provider is not called for a response nobody will read.
+
+CLIENT_CLOSED_KEY = "deadline.client_closed"  # scope flag, reported as status 499
+
+
+class DeadlineMiddleware:
+    """
+    Pure ASGI middleware. DeadlineExceeded escaping the handler becomes 504
+    (when the response has not started yet).
+    """
+    def __init__(self, app: ASGIApp, paths: Iterable[str] = ADMISSION_PATHS) -> None:
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or admission_route(scope["path"], self.paths) is None
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            deadline = Deadline.from_header(Request(scope).headers.get(TIMEOUT_HEADER))
+        except ValueError as e:
+            await JSONResponse(status_code=400, content={"detail": str(e)})(scope, receive, send)
+            return
+        set_deadline(deadline)  # copied into the handler task below
+
+        body_read = asyncio.Event()
+        started = False
+        finished = False
+
+        async def _receive() -> Message:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                deadline.cancel()
+            elif not message.get("more_body", False):
+                body_read.set()
+            return message
+
+        async def _send(message: Message) -> None:
+            nonlocal started, finished
+            if message["type"] == "http.response.start":
+                started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished = True
+            await send(message)
+
+        async def _watch() -> None:
+            # after the body, the server's next message is the disconnect
+            await body_read.wait()
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        handler = asyncio.create_task(self.app(scope, _receive, _send))
+        watcher = asyncio.create_task(_watch())
+        try:
+            await asyncio.wait((handler, watcher), return_when=asyncio.FIRST_COMPLETED)
+            if not handler.done() and not finished:
+                # client gone mid-request: stop the work, there is nobody to answer
+                deadline.cancel()
+                scope[CLIENT_CLOSED_KEY] = True
+                handler.cancel()
+                await asyncio.wait((handler,))
+                return
+            try:
+                await handler
+            except DeadlineExceeded as e:
+                if started:
+                    raise
+                await JSONResponse(status_code=504, content={"detail": f"{str(e).capitalize()}."})(
+                    scope, receive, send
+                )
+        finally:
+            watcher.cancel()
+            if not handler.done():
+                handler.cancel()
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Callable, Dict, List, Type, TypeVar
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+from ocr_service.api.models import (
+    BatchResponse,
+    ExtractBatchRequest,
+    ExtractRequest,
+    ProcessResponse,
+    requested_doc_type,
+)
+from ocr_service.api.serialization import COMPACT_DEFAULT, compact_result, json_response
+from ocr_service.core.metrics import stage
+from ocr_service.pipeline.executor import CPU_POOL, QueueFullError, get_executor
+from ocr_service.pipeline.service import extract_from_text
+
+# Text-in extraction: /v1/extract and /v1/extract_batch take OCR markdown
+# (typically OCR text an operator corrected in the review UI) instead of a
+# file and run only classification, the doc-type processor and unify_payload.
+# No OCR call, no OCR cache, no admission cost: an extraction takes
+# microseconds to a few milliseconds, so a whole batch runs as one task on the
+# CPU pool instead of one executor hop per item.
+
+router = APIRouter()
+
+M = TypeVar("M", bound=BaseModel)
+T = TypeVar("T")
+
+MAX_EXTRACT_TEXT_CHARS = int(os.getenv("API_MAX_EXTRACT_TEXT_CHARS", "200000"))
+MAX_EXTRACT_ITEMS = int(os.getenv("API_MAX_EXTRACT_ITEMS", "100"))
+MAX_EXTRACT_BYTES = int(os.getenv("API_MAX_EXTRACT_BYTES", "8000000"))  # whole request body
+
+CompactQuery = Query(COMPACT_DEFAULT, description="Omit null fields from personal_data / vehicle_data.")
+
+
+async def _read_json(request: Request, model: Type[M]) -> M:
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_EXTRACT_BYTES:
+            raise HTTPException(status_code=413, detail=f"Request body too large. Max bytes = {MAX_EXTRACT_BYTES}.")
+    try:
+        return model.model_validate_json(bytes(body))
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+        ) from e
+
+
+def _check_item(item: ExtractRequest) -> None:
+    if not item.uid.strip():
+        raise HTTPException(status_code=422, detail="uid must not be empty.")
+    if len(item.text) > MAX_EXTRACT_TEXT_CHARS:
+        raise HTTPException(status_code=413, detail=f"Text too long. Max characters = {MAX_EXTRACT_TEXT_CHARS}.")
+
+
+def _extract_one(item: ExtractRequest, compact: bool) -> Dict[str, Any]:
+    body = {"uid": item.uid.strip(), **extract_from_text(requested_doc_type(item.doc_type), item.text)}
+    return compact_result(body) if compact else body
+
+
+def _extract_many(items: List[ExtractRequest], compact: bool) -> List[Dict[str, Any]]:
+    """
+    Per-item results (or errors) in input order; runs in one CPU pool task.
+    """
+    out: List[Dict[str, Any]] = []
+    for index, item in enumerate(items):
+        entry: Dict[str, Any] = {"index": index, "uid": item.uid, "ok": False, "duplicate_of": None}
+        try:
+            _check_item(item)
+            entry.update(ok=True, result=_extract_one(item, compact), error=None)
+        except HTTPException as e:
+            entry.update(result=None, error={"status_code": e.status_code, "detail": e.detail})
+        except Exception:
+            entry.update(result=None, error={"status_code": 500, "detail": "Internal error while processing this item."})
+        out.append(entry)
+    return out
+
+
+async def _on_cpu_pool(fn: Callable[..., T], *args: Any) -> T:
+    try:
+        return await get_executor().run(CPU_POOL, fn, *args)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy ({e.depth} requests queued). Retry later.",
+            headers={"Retry-After": "1"},
+        ) from e
+
+
+@router.post(
+    "/extract",
+    response_model=ProcessResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": ExtractRequest.model_json_schema(ref_template="#/components/schemas/{model}"),
+                },
+            },
+        },
+    },
+)
+async def extract(request: Request, compact: bool = CompactQuery):
+    """
+    Extract fields from OCR markdown ({"uid", "doc_type", "text"}) without OCR.
+
+    Returns the same body as /v1/process for a document whose OCR produced
+    this text; doc_type may be AUTO.
+    """
+    with stage("ingest"):
+        item = await _read_json(request, ExtractRequest)
+    _check_item(item)
+    return json_response(await _on_cpu_pool(_extract_one, item, compact))
+
+
+@router.post(
+    "/extract_batch",
+    response_model=BatchResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": ExtractBatchRequest.model_json_schema(ref_template="#/components/schemas/{model}"),
+                },
+            },
+        },
+    },
+)
+async def extract_batch(request: Request, compact: bool = CompactQuery):
+    """
+    Extract fields from several OCR texts: {"items": [ExtractRequest, ...]}.
+
+    Results (or per-item errors) are returned in input order, in the
+    /v1/process_batch response shape.
+    """
+    with stage("ingest"):
+        req = await _read_json(request, ExtractBatchRequest)
+    if len(req.items) > MAX_EXTRACT_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many items. Max = {MAX_EXTRACT_ITEMS}.")
+    return json_response({"items": await _on_cpu_pool(_extract_many, req.items, compact)})
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ocr_service.api.models import RequestDocType
+from ocr_service.core.deadline import DeadlineExceeded, check_deadline, current_deadline
+from ocr_service.core.types import DocType
+from ocr_service.core.utils.sqlite import connect, transaction
+from ocr_service.documents.registry import rules_version
+
+# Idempotent /v1/process: (uid, content hash, doc_type, rules version) -> final
+# response. Repeats within the TTL get the stored response, or wait for the
+# computation already running (in this process or another uvicorn worker).
+
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "1") == "1"
+IDEMPOTENCY_DB_PATH = os.getenv("IDEMPOTENCY_DB_PATH", "cache/idempotency/responses.sqlite3")
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600"))
+# a worker that died mid-computation blocks the key for at most this long
+IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "300"))
+IDEMPOTENCY_POLL_SECONDS = float(os.getenv("IDEMPOTENCY_POLL_SECONDS", "0.2"))
+_PURGE_EVERY = 500  # claims between expired-row sweeps
+
+# Replay markers (X-Idempotent-Replay response header)
+STORED = "stored"      # served from a previously completed computation
+ATTACHED = "attached"  # waited for an identical request already in flight
+
+# claim() outcomes
+_DONE = "done"
+_CLAIMED = "claimed"
+_PENDING = "pending"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    status TEXT NOT NULL,          -- pending | done
+    owner TEXT,
+    lease_until REAL,
+    response TEXT,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires_at);
+"""
+
+
+def idempotency_key(*, uid: str, digest: str, doc_type: Optional[DocType], model: str = "") -> str:
+    requested = doc_type.value if doc_type is not None else RequestDocType.AUTO.value
+    parts = (uid, digest, requested, rules_version(), model)
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseStore:
+    """
+    SQLite (WAL) table of final responses plus 'pending' claims, shared by
+    all workers on the host. A claim is a lease: if its owner dies, another
+    worker takes the key over once the lease expires.
+    """
+    def __init__(self, db_path: str = IDEMPOTENCY_DB_PATH) -> None:
+        self.db_path = db_path
+        self._claims = 0
+        conn = connect(db_path)
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def claim(self, key: str, owner: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        now = time.time()
+        self._claims += 1
+        conn = connect(self.db_path)
+        try:
+            if self._claims % _PURGE_EVERY == 0:
+                conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+
+            with transaction(conn):
+                row = conn.execute("SELECT * FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and row["status"] == _DONE and row["expires_at"] >= now:
+                    return _DONE, json.loads(row["response"])
+                if row is not None and row["status"] == _PENDING and row["lease_until"] >= now:
+                    return _PENDING, None
+
+                # missing, expired, or abandoned by its owner
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, status, owner, lease_until, response,"
+                    " created_at, expires_at) VALUES (?, ?, ?, ?, NULL, ?, ?)",
+                    (key, _PENDING, owner, now + IDEMPOTENCY_LEASE_SECONDS, now,
+                     now + IDEMPOTENCY_LEASE_SECONDS),
+                )
+                return _CLAIMED, None
+        finally:
+            conn.close()
+
+    def complete(self, key: str, owner: str, response: Dict[str, Any], ttl: float) -> None:
+        now = time.time()
+        conn = connect(self.db_path)
+        try:
+            conn.execute(
+                "UPDATE responses SET status = ?, response = ?, owner = NULL, lease_until = NULL,"
+                " created_at = ?, expires_at = ? WHERE key = ? AND owner = ?",
+                (_DONE, json.dumps(response), now, now + ttl, key, owner),
+            )
+        finally:
+            conn.close()
+
+    def release(self, key: str, owner: str) -> None:
+        """
+        Drop a claim whose computation failed, so the next attempt recomputes.
+        """
+        conn = connect(self.db_path)
+        try:
+            conn.execute(
+                "DELETE FROM responses WHERE key = ? AND owner = ? AND status = ?",
+                (key, owner, _PENDING),
+            )
+        finally:
+            conn.close()
+
+
+class IdempotencyCoordinator:
+    """
+    Single-flight in front of ResponseStore: identical requests within this
+    process share one asyncio task; across processes they coordinate through
+    the store's claims. The computation runs as its own task, so it still
+    completes for the others if the first caller goes away; once every
+    caller waiting on it has gone (disconnected), it is cancelled.
+    Failures are not stored.
+
+    The computation runs under the deadline of the caller that started it;
+    an attached caller with time left starts over if that deadline passes.
+    A caller's `cleanup` (e.g. closing the file its compute reads) runs
+    when the computation it started finishes, not when the caller leaves,
+    or on return when it only attached to another caller's.
+    """
+    def __init__(self, store: ResponseStore, ttl: float = IDEMPOTENCY_TTL_SECONDS) -> None:
+        self.store = store
+        self.ttl = ttl
+        self._inflight: Dict[str, asyncio.Task[Tuple[Dict[str, Any], Optional[str]]]] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+
+    async def run(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        cleanup: Optional[Callable[[], None]] = None,
+    ) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Return (response, replay) where replay is None (computed now),
+        STORED or ATTACHED.
+        """
+        started: Optional[asyncio.Task] = None
+        try:
+            while True:
+                task = self._inflight.get(key)
+                attached = task is not None and task.get_loop() is asyncio.get_running_loop()
+                if not attached:
+                    task = started = asyncio.create_task(self._resolve(key, compute))
+                    self._inflight[key] = task
+                    task.add_done_callback(lambda t: self._done(key, t))
+                assert task is not None
+                try:
+                    response, replay = await self._wait(task)
+                except DeadlineExceeded:
+                    deadline = current_deadline()
+                    if attached and deadline is not None and not deadline.cancelled and deadline.remaining() > 0:
+                        continue  # the starting caller ran out of time (or left); this one has not
+                    raise
+                return response, ATTACHED if attached else replay
+        finally:
+            if cleanup is not None:
+                if started is None:
+                    cleanup()
+                else:
+                    started.add_done_callback(lambda _: cleanup())
+
+    async def _wait(self, task: asyncio.Task) -> Tuple[Dict[str, Any], Optional[str]]:
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and not task.done():
+                task.cancel()  # nobody is left to read the result
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved: callers may have gone away
+
+    async def _resolve(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Tuple[Dict[str, Any], Optional[str]]:
+        owner = uuid.uuid4().hex
+        waited = False
+        while True:
+            state, response = await asyncio.to_thread(self.store.claim, key, owner)
+            if state == _DONE:
+                assert response is not None
+                return response, ATTACHED if waited else STORED
+            if state == _CLAIMED:
+                break
+            waited = True
+            check_deadline("idempotency wait")
+            await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+        try:
+            response = await compute()
+        except BaseException:
+            await asyncio.shield(asyncio.to_thread(self.store.release, key, owner))
+            raise
+        await asyncio.to_thread(self.store.complete, key, owner, response, self.ttl)
+        return response, None
+
+
+_coordinator: Optional[IdempotencyCoordinator] = None
+_coordinator_lock = threading.Lock()
+
+
+def get_idempotency() -> Optional[IdempotencyCoordinator]:
+    """
+    Process-wide coordinator, or None when IDEMPOTENCY_ENABLED=0.
+    """
+    global _coordinator
+    if not IDEMPOTENCY_ENABLED:
+        return None
+    if _coordinator is None:
+        with _coordinator_lock:
+            if _coordinator is None:
+                _coordinator = IdempotencyCoordinator(ResponseStore())
+    return _coordinator
@@ -0,0 +1,528 @@
+"""
+Incremental ingestion helpers for JSON bodies carrying base64 files.
+
+JSONFieldStream parses a flat JSON object chunk by chunk and routes selected
+string fields to a sink as they arrive; Base64StreamDecoder decodes such a
+field into a bounded spool. Together they let /v1/process_base64 reject
+oversized payloads early and never hold the full encoded string in memory.
+An array of such objects (the items of /v1/process_batch) is parsed the same
+way, one JSONFieldStream per element.
+
+RawBodyDecoder does the same for raw (optionally gzip / zstd encoded)
+request bodies of /v1/process_raw.
+"""
+from __future__ import annotations
+
+import binascii
+import json
+import re
+import zlib
+from tempfile import SpooledTemporaryFile
+from typing import Any, Callable, Dict, Optional
+
+from ocr_service.core.utils.image import StreamEncoder
+
+try:
+    import zstandard
+except ImportError:  # optional: pip install "ocr-service[zstd]"
+    zstandard = None  # type: ignore[assignment]
+
+_WS = b" \t\r\n"
+_STRING_SPECIAL = re.compile(rb'["\\]')
+_B64_WS = re.compile(rb"\s+")
+_SIMPLE_ESCAPES = {
+    ord('"'): b'"',
+    ord("\\"): b"\\",
+    ord("/"): b"/",
+    ord("b"): b"\b",
+    ord("f"): b"\f",
+    ord("n"): b"\n",
+    ord("r"): b"\r",
+    ord("t"): b"\t",
+}
+
+
+class IngestError(ValueError):
+    """
+    Raised for malformed or oversized request bodies; carries the HTTP status.
+    """
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+# -------------------------
+# base64 -> bounded spool
+# -------------------------
+class Base64StreamDecoder:
+    """
+    Decode base64 (optionally a data URL) fed in arbitrary chunks.
+    Output goes to a SpooledTemporaryFile that rolls to disk above `spill_bytes`
+    (and to `encoder`, if given); decoding stops with 413 as soon as
+    `max_bytes` would be exceeded.
+    """
+    _MAX_DATA_URL_PREFIX = 256
+
+    def __init__(self, *, max_bytes: int, spill_bytes: int, encoder: Optional[StreamEncoder] = None) -> None:
+        self.max_bytes = max_bytes
+        self.spool = SpooledTemporaryFile(max_size=spill_bytes)
+        self.encoder = encoder
+        self.decoded = 0
+        self.encoded = 0
+        self._carry = b""
+        self._prefix: Optional[bytes] = b""   # None once the data URL prefix is resolved
+        self._padded = False
+
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self.encoded += len(chunk)
+
+        if self._prefix is not None:
+            buf = self._prefix + chunk
+            head = buf.lstrip()
+            if len(head) < 5:
+                self._prefix = buf
+                return
+            if head.startswith(b"data:"):
+                comma = head.find(b",")
+                if comma == -1:
+                    if len(head) > self._MAX_DATA_URL_PREFIX:
+                        raise IngestError(400, "Invalid data URL prefix.")
+                    self._prefix = buf
+                    return
+                head = head[comma + 1 :]
+            self._prefix = None
+            chunk = head
+
+        self._consume(chunk)
+
+    def _consume(self, chunk: bytes) -> None:
+        data = self._carry + _B64_WS.sub(b"", chunk)
+        if not data:
+            return
+        if self._padded:
+            raise IngestError(400, "Invalid base64 payload.")
+
+        cut = len(data) - (len(data) % 4)
+        self._carry = data[cut:]
+        if not cut:
+            return
+
+        block = data[:cut]
+        if block.endswith(b"="):
+            self._padded = True
+        try:
+            out = binascii.a2b_base64(block, strict_mode=True)
+        except binascii.Error:
+            raise IngestError(400, "Invalid base64 payload.") from None
+
+        self.decoded += len(out)
+        if self.decoded > self.max_bytes:
+            raise IngestError(413, f"File too large. Max bytes = {self.max_bytes}.")
+        self.spool.write(out)
+        if self.encoder is not None:
+            self.encoder.feed(out)
+
+    def close(self) -> SpooledTemporaryFile:
+        """
+        Flush and return the spool (positioned at 0).
+        """
+        if self._prefix is not None:
+            # short payload that never resolved the data URL check
+            pending, self._prefix = self._prefix, None
+            if pending.lstrip().startswith(b"data:"):
+                raise IngestError(400, "Invalid data URL prefix.")
+            self._consume(pending)
+        if self._carry:
+            raise IngestError(400, "Invalid base64 payload.")
+        self.spool.seek(0)
+        return self.spool
+
+    def discard(self) -> None:
+        self.spool.close()
+
+
+# -------------------------
+# raw / compressed body -> bounded spool
+# -------------------------
+_INFLATE_CHUNK = 256 * 1024  # max decompressed bytes produced per step
+_DECODE_ERRORS = (zlib.error,) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+class _BoundedSpool:
+    """
+    Write target that enforces the decoded size limit (writer for zstandard).
+    """
+    def __init__(self, *, max_bytes: int, spill_bytes: int, encoder: Optional[StreamEncoder] = None) -> None:
+        self.max_bytes = max_bytes
+        self.spool = SpooledTemporaryFile(max_size=spill_bytes)
+        self.encoder = encoder
+        self.written = 0
+
+    def write(self, data: bytes) -> int:
+        self.written += len(data)
+        if self.written > self.max_bytes:
+            raise IngestError(413, f"File too large. Max bytes = {self.max_bytes}.")
+        self.spool.write(data)
+        if self.encoder is not None and data:
+            self.encoder.feed(data)
+        return len(data)
+
+
+class RawBodyDecoder:
+    """
+    Decode a request body fed in arbitrary chunks according to its
+    Content-Encoding (identity, gzip, zstd) into a bounded spool.
+    Decompression never produces more than a small step at a time, so
+    highly compressed bodies are stopped at `max_bytes` of output instead
+    of being inflated in memory first. Decoded output is also fed to
+    `encoder`, if given.
+    """
+    ENCODINGS = ("identity", "gzip", "x-gzip") + (("zstd",) if zstandard is not None else ())
+
+    def __init__(
+        self,
+        encoding: str,
+        *,
+        max_bytes: int,
+        spill_bytes: int,
+        encoder: Optional[StreamEncoder] = None,
+    ) -> None:
+        encoding = (encoding or "identity").strip().lower()
+        if encoding not in self.ENCODINGS:
+            raise IngestError(415, f"Unsupported Content-Encoding: {encoding}. Use one of {', '.join(self.ENCODINGS)}.")
+        self.encoding = encoding
+        self.out = _BoundedSpool(max_bytes=max_bytes, spill_bytes=spill_bytes, encoder=encoder)
+        self.received = 0
+        self._gzip = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS) if encoding in ("gzip", "x-gzip") else None
+        self._zstd = (
+            zstandard.ZstdDecompressor().stream_writer(self.out, write_size=_INFLATE_CHUNK, closefd=False)
+            if encoding == "zstd"
+            else None
+        )
+
+    @property
+    def decoded(self) -> int:
+        return self.out.written
+
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self.received += len(chunk)
+        try:
+            if self._gzip is not None:
+                self._inflate(chunk)
+            elif self._zstd is not None:
+                self._zstd.write(chunk)
+            else:
+                self.out.write(chunk)
+        except _DECODE_ERRORS as e:
+            raise IngestError(400, f"Invalid {self.encoding} body: {e}") from e
+
+    def _inflate(self, data: bytes) -> None:
+        d = self._gzip
+        assert d is not None
+        while data:
+            self.out.write(d.decompress(data, _INFLATE_CHUNK))
+            data = d.unconsumed_tail
+            if d.eof and d.unused_data:
+                # concatenated gzip members
+                data = d.unused_data + data
+                d = self._gzip = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+
+    def close(self) -> SpooledTemporaryFile:
+        """
+        Flush and return the spool (positioned at 0).
+        """
+        try:
+            if self._gzip is not None:
+                self.out.write(self._gzip.flush())
+                if not self._gzip.eof:
+                    raise IngestError(400, "Invalid gzip body: truncated.")
+            elif self._zstd is not None:
+                self._zstd.flush()
+        except _DECODE_ERRORS as e:
+            raise IngestError(400, f"Invalid {self.encoding} body: {e}") from e
+        self.out.spool.seek(0)
+        return self.out.spool
+
+    def discard(self) -> None:
+        self.out.spool.close()
+
+
+# -------------------------
+# Incremental flat-object JSON parser
+# -------------------------
+_S_START, _S_KEY_OR_END, _S_KEY, _S_COLON, _S_VALUE, _S_AFTER_VALUE, _S_DONE = range(7)
+_S_ARRAY_START, _S_ELEMENT, _S_AFTER_ELEMENT = range(7, 10)
+
+
+class JSONFieldStream:
+    """
+    Incremental parser for a flat JSON object of scalar values.
+
+    - String values of keys in `stream_fields` are passed (unescaped, in pieces)
+      to the given sink and never accumulated.
+    - Other values are collected into `fields`, each capped at `max_field_bytes`.
+    - Keys in `object_arrays` take an array of flat objects: each element is
+      fed to the JSONFieldStream its factory returns, and closed when it ends.
+    Other nested objects/arrays are rejected.
+    """
+    def __init__(
+        self,
+        stream_fields: Dict[str, Callable[[bytes], None]],
+        *,
+        object_arrays: Optional[Dict[str, Callable[[], JSONFieldStream]]] = None,
+        max_field_bytes: int = 64 * 1024,
+    ) -> None:
+        self.stream_fields = stream_fields
+        self.object_arrays = object_arrays or {}
+        self.max_field_bytes = max_field_bytes
+        self.fields: Dict[str, Any] = {}
+        self.streamed: set[str] = set()
+
+        self._state = _S_START
+        self._buf = b""             # raw bytes of current key / non-streamed value
+        self._in_string = False
+        self._escape = b""          # pending escape sequence split across chunks
+        self._key: Optional[str] = None
+        self._sink: Optional[Callable[[bytes], None]] = None
+        self._element: Optional[JSONFieldStream] = None  # array element being parsed
+
+    @property
+    def done(self) -> bool:
+        return self._state == _S_DONE
+
+    def feed(self, data: bytes) -> None:
+        self._run(data, 0, embedded=False)
+
+    def feed_object(self, data: bytes, start: int = 0) -> int:
+        """
+        Like feed(), for an object embedded in a larger document: stops
+        right after its closing brace and returns the offset of the next
+        byte (len(data) while the object is still open).
+        """
+        return self._run(data, start, embedded=True)
+
+    def _run(self, data: bytes, i: int, *, embedded: bool) -> int:
+        n = len(data)
+        while i < n:
+            if self._in_string:
+                i = self._feed_string(data, i)
+                continue
+            if self._element is not None:
+                i = self._element.feed_object(data, i)
+                if self._element.done:
+                    self._element.close()
+                    self._element = None
+                    self._state = _S_AFTER_ELEMENT
+                continue
+
+            c = data[i]
+            st = self._state
+
+            if st == _S_VALUE and self._buf:
+                # inside a bare scalar (number / true / false / null)
+                if c in _WS or c in b",}":
+                    self._finish_scalar()
+                    continue
+                self._append(data[i : i + 1])
+                i += 1
+                continue
+
+            if c in _WS:
+                i += 1
+                continue
+
+            if st == _S_START:
+                if c != ord("{"):
+                    raise IngestError(400, "Request body must be a JSON object.")
+                self._state = _S_KEY_OR_END
+            elif st in (_S_KEY_OR_END, _S_KEY):
+                if c == ord("}") and st == _S_KEY_OR_END:
+                    self._state = _S_DONE
+                    if embedded:
+                        return i + 1
+                elif c == ord('"'):
+                    self._in_string = True
+                    self._buf = b""
+                else:
+                    raise IngestError(400, "Malformed JSON: expected a key.")
+            elif st == _S_COLON:
+                if c != ord(":"):
+                    raise IngestError(400, "Malformed JSON: expected ':'.")
+                self._state = _S_VALUE
+            elif st == _S_VALUE and c == ord("[") and self._key in self.object_arrays:
+                if self._key in self.streamed:
+                    raise IngestError(400, f"Duplicate field: {self._key}.")
+                self.streamed.add(self._key)
+                self._state = _S_ARRAY_START
+            elif st in (_S_ARRAY_START, _S_ELEMENT):
+                if c == ord("]") and st == _S_ARRAY_START:
+                    self._state = _S_AFTER_VALUE
+                elif c == ord("{"):
+                    assert self._key is not None
+                    self._element = self.object_arrays[self._key]()
+                    continue  # the element parses its own opening brace
+                else:
+                    raise IngestError(422, f"Items of '{self._key}' must be objects.")
+            elif st == _S_AFTER_ELEMENT:
+                if c == ord(","):
+                    self._state = _S_ELEMENT
+                elif c == ord("]"):
+                    self._state = _S_AFTER_VALUE
+                else:
+                    raise IngestError(400, "Malformed JSON: expected ',' or ']'.")
+            elif st == _S_VALUE:
+                if c == ord('"'):
+                    self._in_string = True
+                    self._buf = b""
+                    if self._key in self.stream_fields:
+                        if self._key in self.streamed:
+                            raise IngestError(400, f"Duplicate field: {self._key}.")
+                        self.streamed.add(self._key)
+                        self._sink = self.stream_fields[self._key]
+                elif c in b"{[":
+                    raise IngestError(422, f"Field '{self._key}' must be a scalar.")
+                else:
+                    self._append(data[i : i + 1])
+            elif st == _S_AFTER_VALUE:
+                if c == ord(","):
+                    self._state = _S_KEY
+                elif c == ord("}"):
+                    self._state = _S_DONE
+                    if embedded:
+                        return i + 1
+                else:
+                    raise IngestError(400, "Malformed JSON: expected ',' or '}'.")
+            else:  # _S_DONE
+                raise IngestError(400, "Malformed JSON: trailing data after object.")
+            i += 1
+        return n
+
+    def close(self) -> Dict[str, Any]:
+        if self._state == _S_VALUE and self._buf and not self._in_string:
+            self._finish_scalar()
+        if self._state != _S_DONE:
+            raise IngestError(400, "Malformed JSON: unexpected end of body.")
+        return self.fields
+
+    # ---- internals ----
+    def _append(self, b: bytes) -> None:
+        self._buf += b
+        if len(self._buf) > self.max_field_bytes:
+            raise IngestError(413, f"Field '{self._key or '?'}' is too large.")
+
+    def _feed_string(self, data: bytes, i: int) -> int:
+        if self._sink is not None:
+            return self._feed_streamed(data, i)
+
+        # accumulate the raw (still escaped) string; json.loads decodes it at the end
+        if self._escape:
+            # previous chunk ended on a backslash: this byte is escaped
+            self._escape = b""
+            self._append(data[i : i + 1])
+            i += 1
+        while True:
+            m = _STRING_SPECIAL.search(data, i)
+            if m is None:
+                self._append(data[i:])
+                return len(data)
+            j = m.start()
+            if data[j] == ord("\\"):
+                if j + 1 >= len(data):
+                    self._append(data[i:])
+                    # escape split across chunks: the next byte is escaped, keep a marker
+                    self._escape = b"\\"
+                    return len(data)
+                self._append(data[i : j + 2])
+                i = j + 2
+                continue
+            self._append(data[i:j])
+            self._end_string()
+            return j + 1
+
+    def _feed_streamed(self, data: bytes, i: int) -> int:
+        sink = self._sink
+        assert sink is not None
+        n = len(data)
+        while i < n:
+            if self._escape:
+                need = 6 if self._escape[1:2] == b"u" else 2
+                take = min(need - len(self._escape), n - i)
+                self._escape += data[i : i + take]
+                i += take
+                if len(self._escape) < 2 or (self._escape[1:2] == b"u" and len(self._escape) < 6):
+                    continue
+                sink(_unescape(self._escape))
+                self._escape = b""
+                continue
+
+            m = _STRING_SPECIAL.search(data, i)
+            if m is None:
+                sink(data[i:])
+                return n
+            j = m.start()
+            if j > i:
+                sink(data[i:j])
+            if data[j] == ord("\\"):
+                self._escape = b"\\"
+                i = j + 1
+                continue
+            self._sink = None
+            self._end_string()
+            return j + 1
+        return n
+
+    def _end_string(self) -> None:
+        self._in_string = False
+        raw, self._buf, self._escape = self._buf, b"", b""
+
+        if self._state in (_S_KEY_OR_END, _S_KEY):
+            self._key = _loads_string(raw)
+            self._state = _S_COLON
+            return
+
+        if self._key not in self.streamed:
+            self._set(_loads_string(raw))
+        self._state = _S_AFTER_VALUE
+
+    def _finish_scalar(self) -> None:
+        raw, self._buf = self._buf, b""
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            raise IngestError(400, f"Malformed JSON value for '{self._key}'.") from None
+        self._set(value)
+        self._state = _S_AFTER_VALUE
+
+    def _set(self, value: Any) -> None:
+        key = self._key or ""
+        if key in self.stream_fields:
+            # a streamed field sent as null / number: let model validation report it
+            self.fields[key] = value
+        elif key in self.fields:
+            raise IngestError(400, f"Duplicate field: {key}.")
+        else:
+            self.fields[key] = value
+
+
+def _loads_string(raw: bytes) -> str:
+    try:
+        return json.loads(b'"' + raw + b'"')
+    except ValueError:
+        raise IngestError(400, "Malformed JSON string.") from None
+
+
+def _unescape(seq: bytes) -> bytes:
+    simple = _SIMPLE_ESCAPES.get(seq[1])
+    if simple is not None and len(seq) == 2:
+        return simple
+    if seq[1:2] == b"u" and len(seq) == 6:
+        try:
+            return chr(int(seq[2:], 16)).encode("utf-8", "surrogatepass")
+        except ValueError:
+            pass
+    raise IngestError(400, "Malformed JSON escape sequence.")
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Optional
+from urllib.parse import urlsplit
+
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+
+from ocr_service.api.admission import ADMISSION_ENABLED, TenantQuotaExceeded, get_tenant_quotas
+from ocr_service.api.common import choose_ext, read_upload, run_preflight
+from ocr_service.api.models import JobCreated, JobStatus, RequestDocType, requested_doc_type
+from ocr_service.api.serialization import json_response
+from ocr_service.core.tenants import current_tenant
+from ocr_service.jobs.store import get_job_store
+from ocr_service.jobs.worker import get_job_runner
+
+router = APIRouter()
+
+DocTypeForm = Form(...)
+FilePart = File(...)
+
+# comma-separated host allowlist for callback URLs; empty = any host
+CALLBACK_ALLOWED_HOSTS = {
+    h.strip().lower() for h in os.getenv("JOBS_CALLBACK_ALLOWED_HOSTS", "").split(",") if h.strip()
+}
+
+
+def _validated_callback(url: Optional[str]) -> Optional[str]:
+    url = (url or "").strip()
+    if not url:
+        return None
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise HTTPException(status_code=422, detail="callback_url must be an absolute http(s) URL.")
+    if CALLBACK_ALLOWED_HOSTS and parts.hostname.lower() not in CALLBACK_ALLOWED_HOSTS:
+        raise HTTPException(status_code=422, detail="callback_url host is not allowed.")
+    return url
+
+
+@router.post("/jobs", response_model=JobCreated, status_code=202)
+async def create_job(
+    uid: str = Form(...),
+    doc_type: RequestDocType = DocTypeForm,
+    file: UploadFile = FilePart,
+    callback_url: Optional[str] = Form(None),
+) -> dict:
+    """
+    Queue a document for asynchronous processing. Input is validated (type,
+    size, preflight limits) up front, so a 202 means the job will run; poll
+    status_url or pass callback_url to receive the result by webhook.
+    The job runs as the submitting tenant, whose pages quota it is charged
+    to now (429 when over it).
+    """
+    runner = get_job_runner()
+    if runner is None:
+        raise HTTPException(status_code=503, detail="Job processing is disabled.")
+
+    uid = (uid or "").strip()
+    if not uid:
+        raise HTTPException(status_code=422, detail="uid must not be empty.")
+    callback = _validated_callback(callback_url)
+
+    prefix = await file.read(64)
+    await file.seek(0)
+    ext = choose_ext(
+        req_ext=None,
+        blob=prefix,
+        filename=file.filename,
+        content_type=file.content_type,
+    )
+
+    spool = await read_upload(file, ext)
+    try:
+        info = await run_preflight(requested_doc_type(doc_type), ext, spool)
+        data = spool.read()
+    finally:
+        spool.close()
+
+    tenant = current_tenant()
+    quotas = get_tenant_quotas() if ADMISSION_ENABLED else None
+    ticket = None
+    if quotas is not None:
+        try:
+            ticket = quotas.admit(tenant, info.page_count or 1, job=True)
+        except TenantQuotaExceeded as e:
+            raise HTTPException(
+                status_code=429,
+                detail=e.detail,
+                headers={"Retry-After": str(e.retry_after)},
+            ) from e
+    queued = False
+    try:
+        job = await asyncio.to_thread(
+            get_job_store().create,
+            uid=uid,
+            doc_type=doc_type.value,
+            ext=ext,
+            data=data,
+            callback_url=callback,
+            tenant=tenant.name,
+        )
+        queued = True
+    finally:
+        if quotas is not None and ticket is not None:
+            if not queued:
+                quotas.charge(ticket, 0)  # nothing was queued
+            quotas.release(ticket, admitted=queued)
+    runner.notify()
+    return {"job_id": job.id, "status": job.status, "status_url": f"/v1/jobs/{job.id}"}
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(get_job_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return json_response({
+        "job_id": job.id,
+        "uid": job.uid,
+        "doc_type": job.doc_type,
+        "status": job.status,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "result": job.result,
+        "error": job.error,
+    })
@@ -1,16 +1,114 @@
-# FastAPI app + include router + health endpoint.
+# FastAPI app + include routers + health / readiness endpoints.
 from __future__ import annotations
 
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
 from fastapi import FastAPI, Response
+from ocr_service.api.admission import AdmissionMiddleware, start_admission_sync, stop_admission_sync
+from ocr_service.api.batch import router as batch_router
+from ocr_service.api.bundle import router as bundle_router
+from ocr_service.api.capture import router as capture_router
+from ocr_service.api.extract import router as extract_router
+from ocr_service.api.deadline import DeadlineMiddleware
+from ocr_service.api.jobs import router as jobs_router
+from ocr_service.api.memory import MemoryBudgetMiddleware
+from ocr_service.api.metrics import (
+    MetricsMiddleware,
+    router as metrics_router,
+    start_metrics_publisher,
+    stop_metrics_publisher,
+)
 from ocr_service.api.routes import router
+from ocr_service.api.serialization import FastJSONResponse
+from ocr_service.api.traffic import TrafficMiddleware
+from ocr_service.api.uploads import start_upload_janitor, stop_upload_janitor
+from ocr_service.core.tenants import get_tenants
+from ocr_service.jobs.worker import start_job_runner, stop_job_runner
+from ocr_service.pipeline.executor import get_executor, shutdown_executor
+from ocr_service.pipeline.warmup import WARMUP_ENABLED, WarmupReport, warm_up
+
+logger = logging.getLogger(__name__)
+
+# /ready state: set once warm-up (pipeline/warmup.py) has finished
+_warmup: Dict[str, Any] = {"ready": not WARMUP_ENABLED, "report": None, "error": None}
+
+
+async def _run_warmup() -> None:
+    try:
+        report: WarmupReport = await asyncio.to_thread(warm_up)
+    except Exception as e:
+        logger.exception("warm-up failed")
+        _warmup["error"] = f"{type(e).__name__}: {e}"
+        return
+    logger.info("warm-up done in %.2fs", report.seconds)
+    _warmup.update(ready=True, report=report)
 
-app = FastAPI(title="ocr_service", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_tenants()  # a malformed TENANTS_FILE fails startup, not the first request
+    warmup_task: Optional[asyncio.Task] = asyncio.create_task(_run_warmup()) if WARMUP_ENABLED else None
+    get_executor()
+    start_job_runner()
+    start_admission_sync()
+    start_metrics_publisher()
+    start_upload_janitor()
+    yield
+    await stop_upload_janitor()
+    await stop_metrics_publisher()
+    await stop_admission_sync()
+    await stop_job_runner()
+    if warmup_task is not None:
+        warmup_task.cancel()
+    shutdown_executor()
+
+
+app = FastAPI(
+    title="ocr_service",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
+app.add_middleware(MemoryBudgetMiddleware)  # innermost: the wait is bounded by the deadline
+app.add_middleware(DeadlineMiddleware)  # inside the admission ticket
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(TrafficMiddleware)  # outside admission (tenant quotas) and the deadline task
+app.add_middleware(MetricsMiddleware)  # outermost: also counts 429s from admission
 
 @app.get("/health")
 def health() -> dict:
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready() -> Response:
+    """
+    Readiness: 503 until warm-up has loaded every processor and connected
+    to the OCR provider (liveness stays on /health).
+    """
+    if not _warmup["ready"]:
+        status = "failed" if _warmup["error"] else "starting"
+        return FastJSONResponse({"status": status, "error": _warmup["error"]}, status_code=503)
+    report: Optional[WarmupReport] = _warmup["report"]
+    body: Dict[str, Any] = {"status": "ready"}
+    if report is not None:
+        body.update(
+            warmup_seconds=round(report.seconds, 3),
+            processors=report.processors,
+            rules_version=report.rules_version,
+            provider_error=report.provider_error,
+        )
+    return FastJSONResponse(body)
+
 app.include_router(router, prefix="/v1")
+app.include_router(batch_router, prefix="/v1")
+app.include_router(bundle_router, prefix="/v1")
+app.include_router(capture_router, prefix="/v1")
+app.include_router(extract_router, prefix="/v1")
+app.include_router(jobs_router, prefix="/v1")
+app.include_router(metrics_router)
 
 @app.get("/favicon.ico")
 def favicon():
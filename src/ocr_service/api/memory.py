@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import resource
+import sys
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Iterable, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from ocr_service.api.admission import ADMISSION_PATHS, admission_route
+from ocr_service.api.common import PREENCODE
+from ocr_service.core.deadline import remaining_seconds
+from ocr_service.core.metrics import observe_stage
+
+# Memory budget for the processing routes.
+#
+# Peak memory of a request is several times its file size: the upload spool,
+# the bytes read for OCR, the base64 data URL and the provider SDK's JSON body
+# all exist at once while the OCR call is in flight. Every metered request
+# reserves its estimated peak footprint (MEMORY_FOOTPRINT_FACTOR x file size
+# + MEMORY_REQUEST_BYTES) from a per-worker byte budget before its body is
+# read (sized from Content-Length) and returns it when the response is
+# complete; handlers refine the estimate once the real size is known. The
+# single-document routes base64-encode while receiving (API_PREENCODE), so
+# their encoded copy is held next to the spool from the start and is counted
+# on top (PREENCODED_PATHS). When the
+# budget is exhausted, requests wait in FIFO order for up to
+# MEMORY_WAIT_SECONDS and are then rejected with 503 + Retry-After.
+#
+# Admission (api/admission.py) bounds the work in flight; this bounds the
+# bytes, so a few concurrent 20 MB PDFs queue instead of OOM-killing the
+# worker. The process RSS and its peak are exported next to the reserved
+# bytes (/metrics) to tune the factor against reality.
+
+MEMORY_BUDGET_ENABLED = os.getenv("MEMORY_BUDGET_ENABLED", "1") == "1"
+MEMORY_BUDGET_FRACTION = float(os.getenv("MEMORY_BUDGET_FRACTION", "0.5"))  # of host / container memory
+MEMORY_FOOTPRINT_FACTOR = float(os.getenv("MEMORY_FOOTPRINT_FACTOR", "5"))
+MEMORY_REQUEST_BYTES = int(os.getenv("MEMORY_REQUEST_BYTES", "16000000"))  # fixed per-request overhead
+MEMORY_UNKNOWN_SIZE = int(os.getenv("MEMORY_UNKNOWN_SIZE", "6000000"))  # chunked bodies, until refined
+MEMORY_WAIT_SECONDS = float(os.getenv("MEMORY_WAIT_SECONDS", "10"))
+
+# routes that hold the encoded body from ingest on (api/routes.py, new_encoder)
+PREENCODED_PATHS = frozenset(
+    ("/v1/process", "/v1/process_base64", "/v1/process_raw") if PREENCODE else ()
+)
+
+_RESERVATION_KEY = "memory.reservation"
+_NO_LIMIT = 1 << 60  # cgroup "max" / unlimited
+
+
+def _memory_limit() -> Optional[int]:
+    """
+    Memory available to this container (cgroup v2 / v1 limit) or host, in bytes.
+    """
+    limits = []
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path, encoding="ascii") as f:
+                raw = f.read().strip()
+        except OSError:
+            continue
+        if raw.isdigit() and int(raw) < _NO_LIMIT:
+            limits.append(int(raw))
+        break
+    try:
+        limits.append(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES"))
+    except (ValueError, OSError, AttributeError):
+        pass
+    return min(limits) if limits else None
+
+
+def _default_budget() -> int:
+    explicit = os.getenv("MEMORY_BUDGET_BYTES")
+    if explicit:
+        return int(explicit)
+    limit = _memory_limit() or 2_000_000_000
+    workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    return int(limit * MEMORY_BUDGET_FRACTION / workers)
+
+
+def estimate_footprint(size: Optional[int], *, preencoded: bool = False) -> int:
+    """
+    Estimated peak memory of processing a file of `size` bytes (None:
+    unknown); preencoded adds the base64 copy built while receiving.
+    """
+    size = MEMORY_UNKNOWN_SIZE if size is None else size
+    factor = MEMORY_FOOTPRINT_FACTOR + (4 / 3 if preencoded else 0)
+    return int(size * factor) + MEMORY_REQUEST_BYTES
+
+
+def rss_bytes() -> int:
+    """
+    Current resident set size of this process (0 where /proc is unavailable).
+    """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def peak_rss_bytes() -> int:
+    """
+    Peak resident set size of this process since start.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # bytes on macOS, KiB elsewhere
+
+
+class MemoryBudgetExceeded(Exception):
+    def __init__(self, retry_after: int, reserved: int) -> None:
+        super().__init__(f"Memory budget exhausted ({reserved} bytes reserved).")
+        self.retry_after = retry_after
+        self.reserved = reserved
+
+
+@dataclass
+class Reservation:
+    nbytes: int
+
+
+@dataclass
+class MemoryStats:
+    budget: int
+    reserved: int
+    peak_reserved: int
+    active: int
+    waiting: int
+    granted: int
+    waited: int    # granted after queueing
+    rejected: int
+    wait_seconds_total: float
+
+
+class MemoryBudget:
+    """
+    Byte-weighted FIFO semaphore over the estimated peak memory of the
+    requests in flight. Like AdmissionController, only touched from the event
+    loop. A reservation is always granted when nothing is reserved, so a
+    single request larger than the budget still runs (alone); waiters are
+    served strictly in order so large files are not starved by small ones.
+    """
+    def __init__(self, budget: int) -> None:
+        self.budget = budget
+        self.reserved = 0
+        self.peak_reserved = 0
+        self.active = 0
+        self.granted = 0
+        self.waited = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self._waiters: Deque[Tuple[Reservation, asyncio.Future[None]]] = deque()
+
+    def _fits(self, nbytes: int) -> bool:
+        return self.active == 0 or self.reserved + nbytes <= self.budget
+
+    def _grant(self, reservation: Reservation) -> None:
+        self.reserved += reservation.nbytes
+        self.active += 1
+        self.granted += 1
+        if self.reserved > self.peak_reserved:
+            self.peak_reserved = self.reserved
+
+    def _wake(self) -> None:
+        while self._waiters:
+            reservation, fut = self._waiters[0]
+            if fut.done():  # timed out or cancelled
+                self._waiters.popleft()
+                continue
+            if not self._fits(reservation.nbytes):
+                return
+            self._waiters.popleft()
+            self._grant(reservation)
+            fut.set_result(None)
+
+    async def acquire(self, nbytes: int, timeout: Optional[float] = MEMORY_WAIT_SECONDS) -> Reservation:
+        """
+        Reserve `nbytes`, waiting up to `timeout` seconds (None: no limit)
+        behind earlier requests. Raises MemoryBudgetExceeded on timeout.
+        """
+        reservation = Reservation(nbytes)
+        if not self._waiters and self._fits(nbytes):
+            self._grant(reservation)
+            return reservation
+        if timeout is not None and timeout <= 0:
+            self.rejected += 1
+            raise MemoryBudgetExceeded(self.retry_after(), self.reserved)
+
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append((reservation, fut))
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except TimeoutError:
+            if not fut.done() or fut.cancelled():
+                self.rejected += 1
+                raise MemoryBudgetExceeded(self.retry_after(), self.reserved) from None
+            # granted as the timeout fired: keep it
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                self.release(reservation)  # granted just as the caller went away
+            raise
+        finally:
+            waited = time.monotonic() - started
+            self.wait_seconds_total += waited
+            observe_stage("memory_wait", waited)
+            self._wake()  # a timed-out head must not block the ones behind it
+        self.waited += 1
+        return reservation
+
+    def refine(self, reservation: Reservation, nbytes: int) -> None:
+        """
+        Replace the estimate with a better one (never waits: the request is
+        already running).
+        """
+        self.reserved += nbytes - reservation.nbytes
+        reservation.nbytes = nbytes
+        if self.reserved > self.peak_reserved:
+            self.peak_reserved = self.reserved
+        self._wake()
+
+    def release(self, reservation: Reservation) -> None:
+        self.active -= 1
+        self.reserved = max(0, self.reserved - reservation.nbytes) if self.active else 0
+        reservation.nbytes = 0
+        self._wake()
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(MEMORY_WAIT_SECONDS))
+
+    def stats(self) -> MemoryStats:
+        return MemoryStats(
+            budget=self.budget,
+            reserved=self.reserved,
+            peak_reserved=self.peak_reserved,
+            active=self.active,
+            waiting=sum(1 for _, fut in self._waiters if not fut.done()),
+            granted=self.granted,
+            waited=self.waited,
+            rejected=self.rejected,
+            wait_seconds_total=self.wait_seconds_total,
+        )
+
+
+_budget: Optional[MemoryBudget] = None
+
+
+def get_memory_budget() -> MemoryBudget:
+    global _budget
+    if _budget is None:
+        _budget = MemoryBudget(_default_budget())
+    return _budget
+
+
+def _wait_timeout() -> float:
+    remaining = remaining_seconds()
+    return MEMORY_WAIT_SECONDS if remaining is None else max(0.0, min(MEMORY_WAIT_SECONDS, remaining))
+
+
+@asynccontextmanager
+async def reserve_memory(size: Optional[int], *, bounded: bool = True) -> AsyncIterator[Optional[Reservation]]:
+    """
+    Hold the footprint of a `size`-byte file for the duration of the block,
+    for work outside the metered routes (capture, background jobs).
+    bounded=False queues without a time limit instead of MEMORY_WAIT_SECONDS
+    (or the request's deadline).
+    """
+    if not MEMORY_BUDGET_ENABLED:
+        yield None
+        return
+    budget = get_memory_budget()
+    reservation = await budget.acquire(estimate_footprint(size), _wait_timeout() if bounded else None)
+    try:
+        yield reservation
+    finally:
+        budget.release(reservation)
+
+
+def refine_memory(request: Request, size: int, *, preencoded: bool = False) -> None:
+    """
+    Called by handlers once the real file size is known (and whether its
+    encoded copy is kept).
+    """
+    reservation: Optional[Reservation] = request.scope.get(_RESERVATION_KEY)
+    if reservation is not None:
+        get_memory_budget().refine(reservation, estimate_footprint(size, preencoded=preencoded))
+
+
+class MemoryBudgetMiddleware:
+    """
+    Pure ASGI middleware: POSTs to the metered routes hold a reservation from
+    before the body is read until the last response byte is sent. Runs inside
+    DeadlineMiddleware, so the wait also ends with the request's deadline.
+    """
+    def __init__(self, app: ASGIApp, paths: Iterable[str] = ADMISSION_PATHS) -> None:
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        route = admission_route(scope["path"], self.paths) if scope["type"] == "http" else None
+        if not MEMORY_BUDGET_ENABLED or route is None or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        declared = Request(scope).headers.get("content-length", "")
+        budget = get_memory_budget()
+        try:
+            reservation = await budget.acquire(
+                estimate_footprint(
+                    int(declared) if declared.isdigit() else None, preencoded=route in PREENCODED_PATHS
+                ),
+                _wait_timeout(),
+            )
+        except MemoryBudgetExceeded as e:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server memory budget exhausted. Retry later."},
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        scope[_RESERVATION_KEY] = reservation
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            budget.release(reservation)
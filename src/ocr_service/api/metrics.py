@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ocr_service.api.admission import admission_route, get_admission, get_tenant_quotas
+from ocr_service.api.deadline import CLIENT_CLOSED_KEY
+from ocr_service.api.memory import get_memory_budget, peak_rss_bytes, rss_bytes
+from ocr_service.config.settings import get_settings
+from ocr_service.core.metrics import (
+    CACHE_LOOKUPS,
+    REQUEST_SECONDS,
+    REQUESTS,
+    Family,
+    register_collector,
+    render,
+    snapshot,
+    start_timings,
+)
+from ocr_service.jobs.store import get_job_store
+from ocr_service.jobs.worker import JOBS_ENABLED
+from ocr_service.pipeline.executor import get_executor
+from ocr_service.pipeline.ocr_cache import get_ocr_cache
+
+# GET /metrics (Prometheus text format) + request accounting middleware.
+#
+# With several uvicorn workers a scrape lands on any one of them, so each
+# worker publishes its snapshot to METRICS_DIR every METRICS_PUBLISH_SECONDS
+# and /metrics returns all live workers' series, labelled worker="<pid>".
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.getenv(
+    "METRICS_DIR", "cache/metrics" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else ""
+)
+METRICS_PUBLISH_SECONDS = float(os.getenv("METRICS_PUBLISH_SECONDS", "2"))
+_WORKER_STALE_SECONDS = 30.0  # snapshots older than this belong to exited workers
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+_DOC_TYPE_KEY = "metrics.doc_type"
+_PREFIX = "/v1"  # prefix the API routers are included under (api/main.py)
+
+router = APIRouter()
+
+
+def label_doc_type(request: Request, doc_type: str) -> None:
+    """
+    Attach the request's doc_type to its ocr_requests_total sample.
+    """
+    request.scope[_DOC_TYPE_KEY] = doc_type
+
+
+class MetricsMiddleware:
+    """
+    Counts /v1 requests by route template, doc_type and status, and times
+    them until the last response byte (so streamed responses are included).
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(_PREFIX + "/"):
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        start_timings()  # per-request stage breakdown (Server-Timing)
+        status = 500
+
+        async def _send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            # route templates keep label cardinality bounded (job ids etc.);
+            # requests shed by admission never reach the router
+            template = getattr(scope.get("route"), "path", None)
+            if template is not None:
+                path = _PREFIX + template  # included routers report their own path
+            else:
+                path = admission_route(scope["path"]) or "unmatched"
+            if scope.get(CLIENT_CLOSED_KEY):
+                status = 499  # client went away, nothing was sent
+            REQUESTS.inc(path, scope.get(_DOC_TYPE_KEY, "none"), str(status))
+            REQUEST_SECONDS.observe(time.perf_counter() - started, path)
+
+
+# -------------------------
+# Scrape-time gauges
+# -------------------------
+@register_collector
+def _executor_metrics():
+    stats = get_executor().stats()
+    yield ("ocr_executor_running", "gauge", "Tasks running per executor pool.",
+           [((("pool", name),), st.running) for name, st in stats.items()])
+    yield ("ocr_executor_queue_depth", "gauge", "Tasks waiting for a thread per executor pool.",
+           [((("pool", name),), st.waiting) for name, st in stats.items()])
+    yield ("ocr_executor_rejected_total", "counter", "Tasks shed because a pool queue was full.",
+           [((("pool", name),), st.rejected) for name, st in stats.items()])
+    yield ("ocr_executor_expired_total", "counter", "Tasks skipped at dequeue (deadline passed or client gone).",
+           [((("pool", name),), st.expired) for name, st in stats.items()])
+
+    by_class = [
+        ((("pool", pool), ("class", cls)), st)
+        for pool, classes in get_executor().class_stats().items()
+        for cls, st in classes.items()
+    ]
+    yield ("ocr_executor_class_running", "gauge", "Tasks running per executor pool and traffic class.",
+           [(labels, st.running) for labels, st in by_class])
+    yield ("ocr_executor_class_queue_depth", "gauge", "Tasks waiting per executor pool and traffic class.",
+           [(labels, st.waiting) for labels, st in by_class])
+    yield ("ocr_executor_class_rejected_total", "counter", "Tasks shed per executor pool and traffic class.",
+           [(labels, st.rejected) for labels, st in by_class])
+
+
+@register_collector
+def _admission_metrics():
+    st = get_admission().stats()
+    yield ("ocr_admission_in_flight_cost", "gauge", "Admitted cost units in flight (this worker).",
+           [((), st.in_flight)])
+    yield ("ocr_admission_active", "gauge", "Admitted requests in flight (this worker).",
+           [((), st.active)])
+    yield ("ocr_admission_rejected_total", "counter", "Requests rejected with 429.",
+           [((), st.rejected)])
+    yield ("ocr_admission_drain_rate", "gauge", "Cost units completed per second (EWMA).",
+           [((), st.drain_rate)])
+
+
+@register_collector
+def _tenant_metrics():
+    stats = sorted(get_tenant_quotas().stats().items())
+    yield ("ocr_tenant_requests_total", "counter", "Requests admitted and jobs accepted per tenant (this worker).",
+           [((("tenant", name), ("kind", "request")), st.requests) for name, st in stats]
+           + [((("tenant", name), ("kind", "job")), st.jobs) for name, st in stats])
+    yield ("ocr_tenant_pages_total", "counter", "Pages sent to OCR (jobs: queued for it) per tenant (this worker).",
+           [((("tenant", name), ("kind", "request")), st.pages) for name, st in stats]
+           + [((("tenant", name), ("kind", "job")), st.job_pages) for name, st in stats])
+    yield ("ocr_tenant_pages_last_minute", "gauge", "Pages charged to the tenant's quota in the last minute.",
+           [((("tenant", name),), st.pages_last_minute) for name, st in stats])
+    yield ("ocr_tenant_active", "gauge", "Admitted requests in flight per tenant (this worker).",
+           [((("tenant", name),), st.active) for name, st in stats])
+    yield ("ocr_tenant_rejected_total", "counter", "Requests and job submissions rejected with 429 by tenant quota.",
+           [((("tenant", name), ("kind", "request"), ("quota", "concurrency")), st.rejected_concurrency)
+            for name, st in stats]
+           + [((("tenant", name), ("kind", "request"), ("quota", "pages")), st.rejected_pages) for name, st in stats]
+           + [((("tenant", name), ("kind", "job"), ("quota", "pages")), st.rejected_job_pages) for name, st in stats])
+
+
+@register_collector
+def _memory_metrics():
+    st = get_memory_budget().stats()
+    yield ("ocr_memory_budget_bytes", "gauge", "Memory budget for requests in flight (this worker).",
+           [((), st.budget)])
+    yield ("ocr_memory_reserved_bytes", "gauge", "Estimated peak memory reserved by requests in flight.",
+           [((), st.reserved)])
+    yield ("ocr_memory_reserved_peak_bytes", "gauge", "Highest reserved bytes since start.",
+           [((), st.peak_reserved)])
+    yield ("ocr_memory_waiting", "gauge", "Requests queued for memory.",
+           [((), st.waiting)])
+    yield ("ocr_memory_waited_total", "counter", "Requests that queued for memory before running.",
+           [((), st.waited)])
+    yield ("ocr_memory_rejected_total", "counter", "Requests rejected with 503 after waiting for memory.",
+           [((), st.rejected)])
+    yield ("ocr_memory_wait_seconds_total", "counter", "Time spent queued for memory.",
+           [((), st.wait_seconds_total)])
+    yield ("ocr_process_resident_bytes", "gauge", "Resident set size of this worker.",
+           [((), rss_bytes())])
+    yield ("ocr_process_resident_peak_bytes", "gauge", "Peak resident set size of this worker since start.",
+           [((), peak_rss_bytes())])
+
+
+@register_collector
+def _cache_metrics():
+    ratios = []
+    for cache in ("ocr", "idempotency"):
+        hits = CACHE_LOOKUPS.value(cache, "hit")
+        total = hits + CACHE_LOOKUPS.value(cache, "miss")
+        ratios.append(((("cache", cache),), hits / total if total else 0.0))
+    yield ("ocr_cache_hit_ratio", "gauge", "Hit ratio since start (this worker).", ratios)
+
+    settings = get_settings()
+    if settings.ocr_cache_enabled:
+        st = get_ocr_cache(settings.ocr_cache_dir).stats()
+        yield ("ocr_cache_entries", "gauge", "Entries in the shared OCR cache.", [((), st["entries"])])
+        yield ("ocr_cache_size_bytes", "gauge", "Size of the shared OCR cache.", [((), st["bytes"])])
+
+
+@register_collector
+def _job_metrics():
+    if not JOBS_ENABLED:
+        return
+    counts = get_job_store().counts()
+    yield ("ocr_jobs", "gauge", "Async jobs by state (host-wide queue).",
+           [((("status", status),), n) for status, n in counts.items()])
+
+
+# -------------------------
+# Multi-worker snapshots
+# -------------------------
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+
+def _publish() -> None:
+    path = _snapshot_path(os.getpid())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp, path)
+
+
+def _peer_snapshots() -> List[Tuple[Optional[str], List[Family]]]:
+    own = str(os.getpid())
+    cutoff = time.time() - _WORKER_STALE_SECONDS
+    out: List[Tuple[Optional[str], List[Family]]] = []
+    try:
+        names = os.listdir(METRICS_DIR)
+    except OSError:
+        return out
+    for name in sorted(names):
+        pid, _, ext = name.partition(".")
+        if ext != "json" or pid == own:
+            continue
+        path = os.path.join(METRICS_DIR, name)
+        try:
+            if os.stat(path).st_mtime < cutoff:
+                continue
+            with open(path, encoding="utf-8") as f:
+                out.append((pid, json.load(f)))
+        except (OSError, ValueError):
+            continue  # exited or mid-replace
+    return out
+
+
+_publish_task: Optional[asyncio.Task[None]] = None
+
+
+async def _publish_loop() -> None:
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    try:
+        while True:
+            try:
+                await asyncio.to_thread(_publish)
+            except Exception:
+                logger.exception("metrics snapshot publish failed")
+            await asyncio.sleep(METRICS_PUBLISH_SECONDS)
+    finally:
+        try:
+            os.remove(_snapshot_path(os.getpid()))
+        except OSError:
+            pass
+
+
+def start_metrics_publisher() -> None:
+    global _publish_task
+    if METRICS_DIR and _publish_task is None:
+        _publish_task = asyncio.create_task(_publish_loop())
+
+
+async def stop_metrics_publisher() -> None:
+    global _publish_task
+    if _publish_task is not None:
+        _publish_task.cancel()
+        try:
+            await _publish_task
+        except asyncio.CancelledError:
+            pass
+        _publish_task = None
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics() -> PlainTextResponse:
+    # sync handler: collectors read SQLite, so keep them off the event loop
+    if not METRICS_DIR:
+        return PlainTextResponse(render([(None, snapshot())]), media_type=CONTENT_TYPE)
+    per_worker = [(str(os.getpid()), snapshot())] + _peer_snapshots()
+    return PlainTextResponse(render(per_worker), media_type=CONTENT_TYPE)
@@ -1,25 +1,158 @@
 from __future__ import annotations
-from typing import Any, Dict, Optional
+from enum import Enum
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 from ocr_service.core.types import DocType
 
-class ProcessRequest(BaseModel):
+
+class RequestDocType(str, Enum):
     """
-    Request model for JSON base64 endpoint (/v1/process_base64).
+    doc_type as requests give it: a DocType, or AUTO to classify the
+    document from its OCR text. Only the API knows AUTO; the pipeline takes
+    Optional[DocType], None meaning "detect" (see requested_doc_type).
+    """
+    ID_FRONT = "ID_FRONT"
+    ID_BACK = "ID_BACK"
+    ID_OLD_FRONT = "ID_OLD_FRONT"
+    ID_OLD_BACK = "ID_OLD_BACK"
+    DRIVING_LICENSE = "DRIVING_LICENSE"
+    ADDRESS_CARD = "ADDRESS_CARD"
+    PASSPORT = "PASSPORT"
+    REGISTRATION = "REGISTRATION"
+    COC = "COC"
+    AUTO = "AUTO"
+
+
+def requested_doc_type(value: RequestDocType) -> Optional[DocType]:
+    return None if value is RequestDocType.AUTO else DocType(value.value)
+
+
+class ProcessRequestMeta(BaseModel):
+    """
+    Scalar fields of ProcessRequest; validated separately when the body is
+    stream-parsed and file_base64 is decoded incrementally.
     """
     uid: str = Field(..., min_length=1, max_length=128)
-    doc_type: DocType
-    file_base64: str = Field(..., min_length=16)  # base64 or data URL
+    doc_type: RequestDocType
     extension: Optional[str] = None
 
+
+class ProcessRequest(ProcessRequestMeta):
+    """
+    Request model for JSON base64 endpoint (/v1/process_base64).
+    """
+    file_base64: str = Field(..., min_length=16)  # base64 or data URL
+
 class ProcessResponse(BaseModel):
     """
     Response model (shared shape for both endpoints).
     """
     uid: str
-    doc_type: str
+    doc_type: Optional[str]  # null: AUTO requested, no type recognised
     document_number: Optional[str]
     is_correct_document: bool
     confidence: float
     personal_data: Optional[Dict[str, Any]] = None
     vehicle_data: Optional[Dict[str, Any]] = None
+    timings: Optional[Dict[str, Any]] = Field(
+        None,
+        description="Per-stage durations (ms), cache hits and retries; only with ?timings=true.",
+    )
+
+
+class BatchRequestMeta(BaseModel):
+    """
+    Scalar fields of BatchRequest; validated separately when the body is
+    stream-parsed and each item is decoded as it arrives.
+    """
+    deadline_seconds: Optional[float] = Field(None, gt=0)
+
+
+class BatchRequest(BatchRequestMeta):
+    """
+    JSON body for /v1/process_batch (multipart uploads use repeated uid/doc_type/file parts).
+    """
+    items: List[ProcessRequest] = Field(..., min_length=1)
+
+
+class ExtractRequest(BaseModel):
+    """
+    JSON body for /v1/extract: OCR markdown (e.g. corrected in review) instead of a file.
+    """
+    uid: str = Field(..., min_length=1, max_length=128)
+    doc_type: RequestDocType
+    text: str = Field(..., min_length=1)
+
+
+class ExtractBatchRequest(BaseModel):
+    """
+    JSON body for /v1/extract_batch.
+    """
+    items: List[ExtractRequest] = Field(..., min_length=1)
+
+
+class BatchItemError(BaseModel):
+    status_code: int
+    detail: Any
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    uid: str
+    ok: bool
+    duplicate_of: Optional[int] = None  # index of the item whose OCR result was reused
+    result: Optional[ProcessResponse] = None
+    error: Optional[BatchItemError] = None
+
+
+class BatchResponse(BaseModel):
+    items: List[BatchItemResult]
+
+
+class BundleDocument(BaseModel):
+    doc_type: DocType
+    pages: List[int]             # 0-based page indices in the uploaded PDF
+    classification_score: float  # keyword signature score of the best page
+    result: ProcessResponse
+
+
+class BundleResponse(BaseModel):
+    """
+    Response of /v1/process_bundle: one entry per document detected in the upload.
+    """
+    uid: str
+    page_count: int
+    documents: List[BundleDocument]
+    unclassified_pages: List[int]
+
+
+class JobCreated(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+
+
+class JobStatus(BaseModel):
+    """
+    Status of an asynchronous job (/v1/jobs/{job_id}); result is set once it succeeded.
+    """
+    job_id: str
+    uid: str
+    doc_type: str
+    status: str  # queued | running | succeeded | failed
+    attempts: int
+    created_at: float
+    updated_at: float
+    result: Optional[ProcessResponse] = None
+    error: Optional[BatchItemError] = None
+
+
+class UploadStatus(BaseModel):
+    """
+    State of a resumable upload (/v1/uploads/{upload_id}); process it once offset == length.
+    """
+    upload_id: str
+    upload_url: str
+    offset: int
+    length: int
+    expires_at: float
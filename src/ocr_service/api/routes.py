@@ -1,167 +1,304 @@
 from __future__ import annotations
 
+import asyncio
 import base64
 import binascii
 import os
-import tempfile
-import uuid
-from typing import Optional
-
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile
-
-from ocr_service.api.models import ProcessRequest, ProcessResponse
-from ocr_service.config.mistral_client import get_mistral_client
+import time
+from email.utils import formatdate
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from fastapi import (
+    APIRouter,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from starlette.requests import ClientDisconnect
+
+from ocr_service.api.admission import estimate_cost, refine_admission
+from ocr_service.api.common import (
+    MAX_BASE64_BODY_BYTES,
+    MAX_IMAGE_BYTES,
+    MAX_PDF_BYTES,
+    MAX_UPLOAD_BYTES,
+    SPILL_BYTES,
+    choose_ext,
+    drain_encoder,
+    max_bytes_for_ext,
+    new_encoder,
+    read_upload,
+    run_pipeline_idempotent,
+    run_preflight,
+)
+from ocr_service.api.ingest import Base64StreamDecoder, IngestError, JSONFieldStream, RawBodyDecoder
+from ocr_service.api.memory import refine_memory
+from ocr_service.api.metrics import label_doc_type
+from ocr_service.api.models import (
+    ProcessRequest,
+    ProcessRequestMeta,
+    ProcessResponse,
+    RequestDocType,
+    UploadStatus,
+    requested_doc_type,
+)
+from ocr_service.api.serialization import COMPACT_DEFAULT, compact_result, json_response
+from ocr_service.api.streaming import STREAM_RESPONSES, document_events, event_response, stream_mode
+from ocr_service.api.uploads import (
+    UPLOAD_LEASE_SECONDS,
+    Upload,
+    UploadError,
+    UploadWriter,
+    get_upload_store,
+)
+from ocr_service.core.deadline import REQUEST_TIMEOUT_SECONDS
+from ocr_service.core.metrics import current_timings, observe_stage, stage
 from ocr_service.core.types import DocType
-from ocr_service.pipeline.service import process_document, unify_payload
+from ocr_service.core.utils.image import StreamEncoder
+from ocr_service.pipeline.service import ocr_cached
 
 router = APIRouter()
 
-# Size limits (bytes)
-MAX_IMAGE_BYTES = int(os.getenv("API_MAX_IMAGE_BYTES", "6000000"))   # 6 MB
-MAX_PDF_BYTES = int(os.getenv("API_MAX_PDF_BYTES", "20000000"))      # 20 MB
-ALLOWED_EXT = {"jpg", "jpeg", "png", "webp", "pdf"}
-CHUNK_SIZE = 1024 * 1024  # 1 MB
-
-
-def _strip_data_url(s: str) -> str:
-    s = (s or "").strip()
-    if s.startswith("data:"):
-        comma = s.find(",")
-        if comma != -1:
-            return s[comma + 1 :].strip()
-    return s
-
-
-def _sniff_ext(blob: bytes) -> Optional[str]:
-    if len(blob) >= 4 and blob[:4] == b"%PDF":
-        return "pdf"
-    if len(blob) >= 3 and blob[0:3] == b"\xFF\xD8\xFF":
-        return "jpg"
-    if len(blob) >= 8 and blob[0:8] == b"\x89PNG\r\n\x1a\n":
-        return "png"
-    if len(blob) >= 12 and blob[0:4] == b"RIFF" and blob[8:12] == b"WEBP":
-        return "webp"
-    return None
-
-
-def _normalize_ext(ext: str) -> str:
-    e = (ext or "").strip().lower().lstrip(".")
-    return "jpg" if e == "jpeg" else e
-
-
-def _choose_ext(
-    req_ext: Optional[str],
-    blob: Optional[bytes],
-    filename: Optional[str],
-    content_type: Optional[str],
-) -> str:
-    # 1) explicit extension wins
-    if req_ext:
-        ext = _normalize_ext(req_ext)
-        if ext not in ALLOWED_EXT:
-            raise HTTPException(status_code=400, detail=f"Unsupported extension: {req_ext}")
-        return ext
-
-    # 2) content-type
-    ct = (content_type or "").lower().strip()
-    if ct == "application/pdf":
-        return "pdf"
-    if ct in ("image/jpeg", "image/jpg"):
-        return "jpg"
-    if ct == "image/png":
-        return "png"
-    if ct == "image/webp":
-        return "webp"
-
-    # 3) filename suffix
-    if filename and "." in filename:
-        ext = _normalize_ext(filename.rsplit(".", 1)[-1])
-        if ext in ALLOWED_EXT:
-            return ext
-
-    # 4) sniff (needs bytes)
-    if blob:
-        sniffed = _sniff_ext(blob)
-        if sniffed:
-            return sniffed
-
-    raise HTTPException(
-        status_code=400,
-        detail="Could not determine file type. Provide extension or upload a valid jpg/png/webp/pdf.",
-    )
-
-
-def _max_bytes_for_ext(ext: str) -> int:
-    return MAX_PDF_BYTES if ext == "pdf" else MAX_IMAGE_BYTES
+REPLAY_HEADER = "X-Idempotent-Replay"
+SERVER_TIMING_ENABLED = os.getenv("API_SERVER_TIMING", "1") == "1"
+
+CompactQuery = Query(COMPACT_DEFAULT, description="Omit null fields from personal_data / vehicle_data.")
+TimingsQuery = Query(False, description="Add a per-stage `timings` block (durations, cache hits, retries).")
+DocTypeQuery = Query(None, description="Or the X-OCR-Doc-Type header.")
+DocTypeHeader = Header(None, include_in_schema=False)
+
+
+def _result_response(body: dict, replay: Optional[str], compact: bool, timings: bool):
+    if compact:
+        body = compact_result(body)
+    request_timings = current_timings()
+    if timings and request_timings is not None:
+        body = {**body, "timings": request_timings.as_dict()}  # never stored for idempotent replays
+    response = json_response(body, headers={REPLAY_HEADER: replay} if replay is not None else None)
+    if SERVER_TIMING_ENABLED and request_timings is not None:
+        # after encoding, so the serialization stage is included
+        response.headers["Server-Timing"] = request_timings.server_timing()
+    return response
+
+
+async def _ingest_raw_body(
+    request: Request,
+    max_bytes: int,
+    encoder: Optional[StreamEncoder] = None,
+) -> Tuple[SpooledTemporaryFile, int]:
+    """
+    Decode the request body (per Content-Encoding) into a bounded spool,
+    feeding the decoded bytes to `encoder` as they arrive (hashed and
+    encoded off the event loop, fully flushed on return).
+    Returns (spool, decoded size).
+    """
+    # a compressed body is never larger than its content, plus framing
+    max_received = max_bytes + 64 * 1024
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_received:
+        raise HTTPException(status_code=413, detail=f"Request body too large. Max bytes = {max_bytes}.")
 
-
-def _write_temp_bytes(blob: bytes, ext: str) -> str:
-    name = f"ocr_{uuid.uuid4().hex}.{ext}"
-    path = os.path.join(tempfile.gettempdir(), name)
-    with open(path, "wb") as f:
-        f.write(blob)
-    return path
-
-
-async def _save_upload_to_temp(file: UploadFile, ext: str) -> str:
-    limit = _max_bytes_for_ext(ext)
-    name = f"ocr_{uuid.uuid4().hex}.{ext}"
-    path = os.path.join(tempfile.gettempdir(), name)
-
-    total = 0
     try:
-        with open(path, "wb") as out:
-            while True:
-                chunk = await file.read(CHUNK_SIZE)
-                if not chunk:
-                    break
-                total += len(chunk)
-                if total > limit:
-                    raise HTTPException(
-                        status_code=413,
-                        detail=f"File too large. Max bytes for .{ext} = {limit}.",
-                    )
-                out.write(chunk)
-
-        if total == 0:
-            raise HTTPException(status_code=400, detail="Uploaded file is empty.")
-
-        return path
-
-    except HTTPException:
-        try:
-            os.remove(path)
-        except OSError:
-            pass
+        decoder = RawBodyDecoder(
+            request.headers.get("content-encoding", ""),
+            max_bytes=max_bytes,
+            spill_bytes=SPILL_BYTES,
+            encoder=encoder,
+        )
+    except IngestError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail) from e
+    try:
+        async for chunk in request.stream():
+            if decoder.received + len(chunk) > max_received:
+                raise IngestError(413, f"Request body too large. Max bytes = {max_bytes}.")
+            decoder.feed(chunk)
+            await drain_encoder(encoder)
+        spool = decoder.close()
+        await drain_encoder(encoder, final=True)
+    except IngestError as e:
+        decoder.discard()
+        raise HTTPException(status_code=e.status_code, detail=e.detail) from e
+    except BaseException:
+        decoder.discard()
         raise
 
+    if decoder.decoded == 0:
+        spool.close()
+        raise HTTPException(status_code=400, detail="Request body is empty.")
+    return spool, decoder.decoded
+
+
+def _decoded_ext(spool: BinaryIO, size: int, *, req_ext: Optional[str]) -> str:
+    """
+    File type of a decoded body (explicit extension, else sniffed) and its size limit.
+    """
+    prefix = spool.read(64)
+    spool.seek(0)
+    ext = choose_ext(req_ext=req_ext, blob=prefix, filename=None, content_type=None)
+    limit = max_bytes_for_ext(ext)
+    if size > limit:
+        raise HTTPException(status_code=413, detail=f"File too large. Max bytes for .{ext} = {limit}.")
+    return ext
+
+
+async def _process_document(
+    request: Request,
+    *,
+    uid: str,
+    doc_type: Optional[DocType],
+    ext: str,
+    spool: BinaryIO,
+    compact: bool,
+    timings: bool,
+    digest: Optional[str] = None,
+    encoder: Optional[StreamEncoder] = None,
+):
+    """
+    Shared tail of the single-document routes: preflight, admission
+    refinement, then a progress stream or the (idempotent) JSON result.
+    Takes ownership of `spool`. With the content `digest` known up front
+    (or an `encoder` fed during ingest), nothing re-reads the file to hash
+    or encode it, and an OCR cache hit is admitted at extraction cost only
+    and drops the pre-encoded body.
+    """
+    owned = False  # handed on to a progress stream or the idempotent computation
+    try:
+        if encoder is not None:
+            digest = encoder.hexdigest()
+        info = await run_preflight(doc_type, ext, spool)
+        cached = digest is not None and ocr_cached(digest, ext)
+        refine_admission(
+            request, estimate_cost(doc_type, info, ocr_cached=cached), pages=0 if cached else info.page_count or 1
+        )
+        refine_memory(request, info.size, preencoded=encoder is not None and encoder.encoding and not cached)
+        data_url = None
+        if encoder is not None:
+            if cached:
+                encoder.discard()
+            else:
+                data_url = await asyncio.to_thread(encoder.data_url, ext)
+        mode = stream_mode(request)
+        if mode is not None:
+            events = document_events(
+                doc_type=doc_type,
+                data=spool,
+                ext=ext,
+                uid=uid,
+                page_count=info.page_count or 1,
+                digest=digest,
+                data_url=data_url,
+            )
+            owned = True  # the stream owns the spool from here on
+            return event_response(mode, events, cleanup=spool.close)
+
+        # the computation may outlive this request (shared with identical ones): it closes the spool
+        owned = True
+        body, replay = await run_pipeline_idempotent(
+            uid=uid, doc_type=doc_type, data=spool, ext=ext, digest=digest, data_url=data_url, cleanup=spool.close
+        )
+        return _result_response(body, replay, compact, timings)
+    finally:
+        if not owned:
+            spool.close()
+
+
+async def _ingest_base64_body(
+    request: Request,
+    encoder: Optional[StreamEncoder] = None,
+) -> Tuple[ProcessRequestMeta, SpooledTemporaryFile, int]:
+    """
+    Stream-parse a ProcessRequest JSON body into (meta, spool, decoded size).
+    file_base64 is decoded incrementally into a bounded spool (and `encoder`);
+    oversized bodies are rejected from Content-Length or as soon as the
+    running byte count passes the limit, before anything is buffered.
+    """
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > MAX_BASE64_BODY_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Request body too large. Max bytes = {MAX_BASE64_BODY_BYTES}.",
+        )
+
+    decoder = Base64StreamDecoder(
+        max_bytes=max(MAX_IMAGE_BYTES, MAX_PDF_BYTES),
+        spill_bytes=SPILL_BYTES,
+        encoder=encoder,
+    )
+    parser = JSONFieldStream({"file_base64": decoder.feed})
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > MAX_BASE64_BODY_BYTES:
+                raise IngestError(413, f"Request body too large. Max bytes = {MAX_BASE64_BODY_BYTES}.")
+            parser.feed(chunk)
+            await drain_encoder(encoder)
+        fields = parser.close()
+        spool = decoder.close()
+        await drain_encoder(encoder, final=True)
+    except IngestError as e:
+        decoder.discard()
+        raise HTTPException(status_code=e.status_code, detail=e.detail) from e
+    except BaseException:
+        decoder.discard()
+        raise
 
-def _build_response(res, uid: str) -> dict:
-    doc_type = res.doc_type.value
-    fields = dict(res.fields or {})
-    docno = res.document_number
-
-    data_key, data = unify_payload(doc_type, fields)
+    errors = []
+    if "file_base64" not in parser.streamed:
+        errors.append({
+            "type": "missing",
+            "loc": ("body", "file_base64"),
+            "msg": "Field required",
+            "input": None,
+        })
+    try:
+        meta = ProcessRequestMeta.model_validate(fields)
+    except ValidationError as e:
+        errors.extend({**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False))
+    if errors:
+        spool.close()
+        raise RequestValidationError(errors)
 
-    return {
-        "uid": uid,
-        "doc_type": doc_type,
-        "document_number": docno,
-        "is_correct_document": res.is_correct_document,
-        "confidence": round(res.confidence, 4),
-        data_key: data,
-    }
+    return meta, spool, decoder.decoded
 
 
 # -------------------------
 # PRIMARY: multipart/form-data
 # -------------------------
-@router.post("/process", response_model=ProcessResponse)
+@router.post("/process", response_model=ProcessResponse, responses=STREAM_RESPONSES)
 async def process_multipart(
+    request: Request,
     uid: str = Form(...),
-    doc_type: DocType = Form(...),
+    doc_type: RequestDocType = Form(...),
     file: UploadFile = File(...),
-) -> dict:
+    compact: bool = CompactQuery,
+    timings: bool = TimingsQuery,
+):
+    """
+    Process one document. With `Accept: text/event-stream` or
+    `application/x-ndjson` the response is a progress stream instead
+    (page, document and result events).
+
+    Repeats of the same (uid, file, doc_type) within IDEMPOTENCY_TTL_SECONDS
+    return the stored response (X-Idempotent-Replay: stored) or wait for the
+    identical request still in flight (X-Idempotent-Replay: attached).
+
+    Responses carry a Server-Timing header with per-stage durations;
+    `?timings=true` adds the same breakdown as a `timings` block.
+    """
+    request_timings = current_timings()
+    if request_timings is not None:
+        # multipart body was received and parsed before the handler runs
+        observe_stage("upload", time.perf_counter() - request_timings.started)
+    label_doc_type(request, doc_type.value)
     uid = (uid or "").strip()
     if not uid:
         raise HTTPException(status_code=422, detail="uid must not be empty.")
@@ -170,61 +307,372 @@ async def process_multipart(
     prefix = await file.read(64)
     await file.seek(0)
 
-    ext = _choose_ext(
+    ext = choose_ext(
         req_ext=None,
         blob=prefix,
         filename=file.filename,
         content_type=file.content_type,
     )
 
-    tmp_path = await _save_upload_to_temp(file, ext)
-    try:
-        client = get_mistral_client()
-        res = process_document(client=client, doc_type=doc_type, image_path=tmp_path)
-        return _build_response(res, uid)
-    finally:
-        try:
-            os.remove(tmp_path)
-        except OSError:
-            pass
+    encoder = new_encoder()
+    spool = await read_upload(file, ext, encoder)
+    return await _process_document(
+        request,
+        uid=uid,
+        doc_type=requested_doc_type(doc_type),
+        ext=ext,
+        spool=spool,
+        compact=compact,
+        timings=timings,
+        encoder=encoder,
+    )
 
 
 # -------------------------
 # FALLBACK: JSON base64
 # -------------------------
-@router.post("/process_base64", response_model=ProcessResponse)
-def process_base64(req: ProcessRequest) -> dict:
-    uid = (req.uid or "").strip()
+@router.post(
+    "/process_base64",
+    response_model=ProcessResponse,
+    responses=STREAM_RESPONSES,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": ProcessRequest.model_json_schema(
+                        ref_template="#/components/schemas/{model}"
+                    ),
+                },
+            },
+        },
+    },
+)
+async def process_base64(request: Request, compact: bool = CompactQuery, timings: bool = TimingsQuery):
+    encoder = new_encoder()
+    with stage("ingest"):
+        req, spool, size = await _ingest_base64_body(request, encoder)
+    label_doc_type(request, req.doc_type.value)
+    try:
+        uid = (req.uid or "").strip()
+        if not uid:
+            raise HTTPException(status_code=422, detail="uid must not be empty.")
+
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Decoded file is empty.")
+
+        ext = _decoded_ext(spool, size, req_ext=req.extension)
+    except BaseException:
+        spool.close()
+        raise
+
+    return await _process_document(
+        request,
+        uid=uid,
+        doc_type=requested_doc_type(req.doc_type),
+        ext=ext,
+        spool=spool,
+        compact=compact,
+        timings=timings,
+        encoder=encoder,
+    )
+
+
+# -------------------------
+# Service-to-service: raw (optionally compressed) body
+# -------------------------
+@router.post(
+    "/process_raw",
+    response_model=ProcessResponse,
+    responses=STREAM_RESPONSES,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/octet-stream": {"schema": {"type": "string", "format": "binary"}},
+                "application/pdf": {"schema": {"type": "string", "format": "binary"}},
+                "image/*": {"schema": {"type": "string", "format": "binary"}},
+            },
+        },
+    },
+)
+async def process_raw(
+    request: Request,
+    uid: Optional[str] = Query(None, description="Or the X-OCR-UID header."),
+    doc_type: Optional[RequestDocType] = DocTypeQuery,
+    extension: Optional[str] = Query(None, description="Or the X-OCR-Extension header; else Content-Type / sniffed."),
+    x_ocr_uid: Optional[str] = Header(None, include_in_schema=False),
+    x_ocr_doc_type: Optional[RequestDocType] = DocTypeHeader,
+    x_ocr_extension: Optional[str] = Header(None, include_in_schema=False),
+    compact: bool = CompactQuery,
+    timings: bool = TimingsQuery,
+):
+    """
+    Process one document sent as the request body itself (no multipart
+    parsing or base64), for callers that already know the doc type.
+    `Content-Encoding: gzip` (and `zstd` when installed) bodies are decoded
+    as they stream in, under the same size limits as the other routes.
+    """
+    uid = (uid or x_ocr_uid or "").strip()
     if not uid:
-        raise HTTPException(status_code=422, detail="uid must not be empty.")
+        raise HTTPException(status_code=422, detail="uid is required (query or X-OCR-UID header).")
+    doc_type = doc_type or x_ocr_doc_type
+    if doc_type is None:
+        raise HTTPException(status_code=422, detail="doc_type is required (query or X-OCR-Doc-Type header).")
+    label_doc_type(request, doc_type.value)
 
-    raw = _strip_data_url(req.file_base64)
+    req_ext = extension or x_ocr_extension
     try:
-        blob = base64.b64decode(raw, validate=True)
-    except (binascii.Error, ValueError):
-        raise HTTPException(status_code=400, detail="Invalid base64 payload.")
-
-    if not blob:
-        raise HTTPException(status_code=400, detail="Decoded file is empty.")
-
-    ext = _choose_ext(
-        req_ext=req.extension,
-        blob=blob,
-        filename=None,
-        content_type=None,
+        # known up front: enforce this type's limit while reading
+        ext: Optional[str] = choose_ext(
+            req_ext=req_ext, blob=None, filename=None, content_type=request.headers.get("content-type")
+        )
+    except HTTPException:
+        if req_ext:
+            raise
+        ext = None  # sniffed after decoding
+
+    encoder = new_encoder()
+    with stage("ingest"):
+        spool, size = await _ingest_raw_body(
+            request, max_bytes_for_ext(ext) if ext else MAX_UPLOAD_BYTES, encoder
+        )
+    try:
+        ext = _decoded_ext(spool, size, req_ext=ext)
+    except BaseException:
+        spool.close()
+        raise
+
+    return await _process_document(
+        request,
+        uid=uid,
+        doc_type=requested_doc_type(doc_type),
+        ext=ext,
+        spool=spool,
+        compact=compact,
+        timings=timings,
+        encoder=encoder,
     )
 
-    limit = _max_bytes_for_ext(ext)
-    if len(blob) > limit:
-        raise HTTPException(status_code=413, detail=f"File too large. Max bytes for .{ext} = {limit}.")
 
-    tmp_path = _write_temp_bytes(blob, ext)
+# -------------------------
+# Resumable uploads (tus-style) for large files over flaky connections
+# -------------------------
+TUS_VERSION = "1.0.0"
+UPLOAD_CONTENT_TYPE = "application/offset+octet-stream"
+
+
+def _upload_url(upload: Upload) -> str:
+    return f"/v1/uploads/{upload.id}"
+
+
+def _upload_headers(upload: Upload) -> Dict[str, str]:
+    return {
+        "Tus-Resumable": TUS_VERSION,
+        "Upload-Offset": str(upload.received),
+        "Upload-Length": str(upload.length),
+        "Upload-Expires": formatdate(upload.expires_at, usegmt=True),
+        "Cache-Control": "no-store",
+    }
+
+
+def _upload_status(upload: Upload) -> dict:
+    return {
+        "upload_id": upload.id,
+        "upload_url": _upload_url(upload),
+        "offset": upload.received,
+        "length": upload.length,
+        "expires_at": upload.expires_at,
+    }
+
+
+def _upload_error(e: UploadError) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers={"Tus-Resumable": TUS_VERSION})
+
+
+def _parse_upload_metadata(value: Optional[str]) -> Dict[str, str]:
+    """
+    tus Upload-Metadata: comma-separated `key base64(value)` pairs.
+    """
+    out: Dict[str, str] = {}
+    for item in (value or "").split(","):
+        key, _, encoded = item.strip().partition(" ")
+        if not key:
+            continue
+        try:
+            out[key] = base64.b64decode(encoded.strip(), validate=True).decode("utf-8")
+        except (binascii.Error, UnicodeDecodeError):
+            raise HTTPException(status_code=400, detail=f"Invalid Upload-Metadata value for '{key}'.") from None
+    return out
+
+
+@router.post("/uploads", response_model=UploadStatus, status_code=201)
+async def create_upload(
+    upload_length: Optional[str] = Header(None),
+    upload_metadata: Optional[str] = Header(None),
+):
+    """
+    Start a resumable upload. Upload-Length is the file size; Upload-Metadata
+    carries `uid`, `doc_type` and optionally `extension`, `filetype` or
+    `filename`. PATCH the bytes to upload_url in one or more requests
+    (Content-Type: application/offset+octet-stream, Upload-Offset: bytes
+    received so far, which HEAD returns after a dropped connection), then
+    POST upload_url + "/process". Unfinished uploads expire
+    (Upload-Expires, extended by every PATCH).
+    """
+    if not (upload_length or "").isdigit() or int(upload_length) == 0:
+        raise HTTPException(status_code=400, detail="Upload-Length must be a positive number of bytes.")
+    length = int(upload_length)
+
+    meta = _parse_upload_metadata(upload_metadata)
+    uid = meta.get("uid", "").strip()
+    if not uid:
+        raise HTTPException(status_code=422, detail="uid is required in Upload-Metadata.")
     try:
-        client = get_mistral_client()
-        res = process_document(client=client, doc_type=req.doc_type, image_path=tmp_path)
-        return _build_response(res, uid)
-    finally:
+        doc_type = RequestDocType(meta.get("doc_type", ""))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="A valid doc_type is required in Upload-Metadata.") from None
+
+    req_ext = meta.get("extension")
+    try:
+        ext: Optional[str] = choose_ext(
+            req_ext=req_ext, blob=None, filename=meta.get("filename"), content_type=meta.get("filetype")
+        )
+    except HTTPException:
+        if req_ext:
+            raise
+        ext = None  # sniffed on finalise
+    limit = max_bytes_for_ext(ext) if ext else MAX_UPLOAD_BYTES
+    if length > limit:
+        raise HTTPException(status_code=413, detail=f"File too large. Max bytes = {limit}.")
+
+    try:
+        upload = await asyncio.to_thread(
+            get_upload_store().create, uid=uid, doc_type=doc_type.value, ext=ext, length=length
+        )
+    except UploadError as e:
+        raise _upload_error(e) from e
+    return json_response(
+        _upload_status(upload),
+        status_code=201,
+        headers={**_upload_headers(upload), "Location": _upload_url(upload)},
+    )
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadStatus)
+@router.head("/uploads/{upload_id}", include_in_schema=False)  # tus offset probe
+async def get_upload(upload_id: str):
+    upload = await asyncio.to_thread(get_upload_store().get, upload_id)
+    if upload is None:
+        raise _upload_error(UploadError(404, "Upload not found."))
+    return json_response(_upload_status(upload), headers=_upload_headers(upload))
+
+
+@router.patch("/uploads/{upload_id}", status_code=204)
+async def upload_chunk(request: Request, upload_id: str, upload_offset: Optional[str] = Header(None)):
+    """
+    Append the body at Upload-Offset. Bytes received before a dropped
+    connection are kept; resume from the offset HEAD reports.
+    """
+    content_type = request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    if content_type != UPLOAD_CONTENT_TYPE:
+        raise HTTPException(status_code=415, detail=f"Content-Type must be {UPLOAD_CONTENT_TYPE}.")
+    if not (upload_offset or "").isdigit():
+        raise HTTPException(status_code=400, detail="Upload-Offset must be a number of bytes.")
+
+    store = get_upload_store()
+    try:
+        lease = await asyncio.to_thread(store.acquire, upload_id, offset=int(upload_offset))
         try:
-            os.remove(tmp_path)
-        except OSError:
-            pass
+            writer = await asyncio.to_thread(UploadWriter, store, lease)
+        except BaseException:
+            await asyncio.shield(asyncio.to_thread(store.release, lease))
+            raise
+        try:
+            declared = request.headers.get("content-length", "")
+            if declared.isdigit() and writer.received + int(declared) > lease.upload.length:
+                raise UploadError(413, f"Chunk exceeds Upload-Length ({lease.upload.length} bytes).")
+            with stage("ingest"):
+                async for chunk in request.stream():
+                    writer.feed(chunk)
+                    if writer.due():
+                        await asyncio.to_thread(writer.commit)
+        except ClientDisconnect:
+            pass  # keep what arrived; nobody reads the response
+        finally:
+            await asyncio.shield(asyncio.to_thread(writer.close))
+    except UploadError as e:
+        raise _upload_error(e) from e
+    return Response(status_code=204, headers=_upload_headers(lease.upload))
+
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def delete_upload(upload_id: str):
+    if not await asyncio.to_thread(get_upload_store().delete, upload_id):
+        raise _upload_error(UploadError(404, "Upload not found."))
+    return Response(status_code=204, headers={"Tus-Resumable": TUS_VERSION})
+
+
+@router.post("/uploads/{upload_id}/process", response_model=ProcessResponse, responses=STREAM_RESPONSES)
+async def process_upload(
+    request: Request,
+    upload_id: str,
+    compact: bool = CompactQuery,
+    timings: bool = TimingsQuery,
+):
+    """
+    Process a completed upload like /v1/process (same response, streaming
+    and idempotency); the upload is removed once processed, and another
+    /process of it while this one runs gets 423. Its content hash was
+    computed as the chunks arrived, so the file is not hashed again and an
+    OCR cache hit is known before anything is queued.
+    """
+    store = get_upload_store()
+    try:
+        # held until processing is done, so a concurrent /process gets 423 instead of a second OCR run
+        lease = await asyncio.to_thread(
+            store.acquire, upload_id, seconds=REQUEST_TIMEOUT_SECONDS + UPLOAD_LEASE_SECONDS
+        )
+    except UploadError as e:
+        raise _upload_error(e) from e
+
+    processed = False
+    try:
+        try:
+            upload = lease.upload
+            if not upload.complete:
+                raise UploadError(409, f"Upload incomplete: {upload.received} of {upload.length} bytes received.")
+            digest = await asyncio.to_thread(store.digest, upload)
+            try:
+                f = open(store.path(upload.id), "rb")
+            except OSError:
+                raise UploadError(410, "Upload data is missing.") from None
+        except UploadError as e:
+            raise _upload_error(e) from e
+
+        doc_type = RequestDocType(upload.doc_type)
+        label_doc_type(request, doc_type.value)
+        try:
+            ext = _decoded_ext(f, upload.length, req_ext=upload.ext)
+        except BaseException:
+            f.close()
+            raise
+
+        response = await _process_document(
+            request,
+            uid=upload.uid,
+            doc_type=requested_doc_type(doc_type),
+            ext=ext,
+            spool=f,
+            compact=compact,
+            timings=timings,
+            digest=digest,
+        )
+        # a progress stream keeps reading through its open handle
+        await asyncio.to_thread(store.delete, upload.id)
+        processed = True
+        return response
+    finally:
+        if not processed:
+            # failed: the client may retry /process
+            await asyncio.shield(asyncio.to_thread(store.release, lease))
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, Mapping, Optional
+
+from fastapi.responses import JSONResponse
+
+from ocr_service.core.metrics import stage
+
+try:
+    import orjson
+except ImportError:  # optional: pip install "ocr-service[fast]"
+    orjson = None  # type: ignore[assignment]
+
+# Response encoding for the /v1 routes.
+#
+# Handlers build responses from trusted internal dicts (build_response), so
+# they return FastJSONResponse directly: FastAPI then skips re-validating the
+# body against the response_model (which stays for the OpenAPI schema) and
+# encodes once, with orjson when installed.
+
+COMPACT_DEFAULT = os.getenv("API_COMPACT_RESPONSES", "0") == "1"
+
+_DATA_KEYS = ("personal_data", "vehicle_data")
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Compact UTF-8 JSON; same output shape as FastAPI's default JSONResponse.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        with stage("serialization"):
+            return dumps(content)
+
+
+def compact_result(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Drop null fields from personal_data / vehicle_data (and the absent block itself).
+    """
+    out = dict(body)
+    for key in _DATA_KEYS:
+        data = out.get(key)
+        if isinstance(data, dict):
+            out[key] = {k: v for k, v in data.items() if v is not None}
+        elif key in out and data is None:
+            del out[key]
+    return out
+
+
+def json_response(
+    body: Any,
+    *,
+    status_code: int = 200,
+    headers: Optional[Mapping[str, str]] = None,
+) -> FastJSONResponse:
+    return FastJSONResponse(content=body, status_code=status_code, headers=dict(headers) if headers else None)
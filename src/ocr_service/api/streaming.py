@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from ocr_service.api.common import build_response, run_extract, run_ocr
+from ocr_service.api.serialization import dumps
+from ocr_service.core.deadline import DeadlineExceeded
+from ocr_service.core.types import DocType, OCRResult
+from ocr_service.core.utils.image import BinarySource
+from ocr_service.pipeline.service import split_ocr_pages
+
+# Progress streaming for /v1/process and /v1/process_batch.
+#
+# Clients opt in with `Accept: text/event-stream` (SSE) or
+# `Accept: application/x-ndjson`. Events are written as soon as they are
+# produced and nothing is buffered server-side once sent:
+# - page:     text of one PDF page (or image); a document is OCR'd in one
+#             provider call, so its page events follow each other once it returns
+# - document: extraction finished for a document (batch: one per item)
+# - result:   final ProcessResponse (single document)
+# - done:     end of a batch stream
+# - error:    processing failed after the stream started
+
+Event = Tuple[str, Dict[str, Any]]
+
+SSE = "sse"
+NDJSON = "ndjson"
+
+_MEDIA_TYPES = {SSE: "text/event-stream", NDJSON: "application/x-ndjson"}
+
+
+def stream_mode(request: Request) -> Optional[str]:
+    accept = request.headers.get("accept", "").lower()
+    if "text/event-stream" in accept:
+        return SSE
+    if "application/x-ndjson" in accept:
+        return NDJSON
+    return None
+
+
+# OpenAPI: alternative 200 bodies for routes supporting streaming mode
+STREAM_RESPONSES: Dict[int | str, Dict[str, Any]] = {
+    200: {"content": {media: {} for media in _MEDIA_TYPES.values()}},
+}
+
+
+def format_event(mode: str, event: str, data: Dict[str, Any]) -> bytes:
+    if mode == SSE:
+        return b"event: " + event.encode("ascii") + b"\ndata: " + dumps(data) + b"\n\n"
+    return dumps({"event": event, **data}) + b"\n"
+
+
+def error_data(exc: BaseException) -> Dict[str, Any]:
+    if isinstance(exc, HTTPException):
+        return {"status_code": exc.status_code, "detail": exc.detail}
+    if isinstance(exc, DeadlineExceeded):
+        return {"status_code": 504, "detail": f"{str(exc).capitalize()}."}
+    return {"status_code": 500, "detail": "Internal error while processing the document."}
+
+
+def event_response(
+    mode: str,
+    events: AsyncIterator[Event],
+    cleanup: Optional[Callable[[], None]] = None,
+) -> StreamingResponse:
+    """
+    Serialize an event iterator as SSE or NDJSON. Failures after the headers
+    were sent become an `error` event; `cleanup` runs when the stream ends or
+    the client disconnects.
+    """
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            async with aclosing(events) as it:
+                async for event, data in it:
+                    yield format_event(mode, event, data)
+        except Exception as e:
+            yield format_event(mode, "error", error_data(e))
+        finally:
+            if cleanup is not None:
+                cleanup()
+
+    return StreamingResponse(
+        body(),
+        media_type=_MEDIA_TYPES[mode],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def page_event(page: int, page_count: int, completed: int, ocr: OCRResult, **extra: Any) -> Event:
+    return "page", {**extra, "page": page, "pages": page_count, "completed": completed, "text": ocr.text}
+
+
+def page_events(ocr: OCRResult, page_count: int) -> List[Event]:
+    """
+    Page events for a document OCR'd in one provider call, in page order.
+    Images and single-page PDFs are reported whole, as page 0.
+    """
+    pages = split_ocr_pages(ocr) if page_count > 1 else []
+    if len(pages) <= 1:
+        return [page_event(0, 1, 1, ocr)]
+    return [page_event(i, len(pages), i + 1, page) for i, page in enumerate(pages)]
+
+
+async def stream_ocr(
+    *,
+    data: BinarySource,
+    ext: str,
+    page_count: int,
+    on_page: Callable[[Event], Any],
+    digest: Optional[str] = None,
+) -> OCRResult:
+    """
+    OCR the document in one call (served from the document cache when
+    possible), then report each of its pages through on_page.
+    """
+    ocr = await run_ocr(data=data, ext=ext, digest=digest)
+    for event in page_events(ocr, page_count):
+        on_page(event)
+    return ocr
+
+
+async def document_events(
+    *,
+    doc_type: Optional[DocType],
+    data: BinarySource,
+    ext: str,
+    uid: str,
+    page_count: int,
+    digest: Optional[str] = None,
+    data_url: Optional[str] = None,
+) -> AsyncIterator[Event]:
+    """
+    Event stream for one document: page events, then document + result.
+    """
+    ocr = await run_ocr(data=data, ext=ext, digest=digest, data_url=data_url)
+    for event in page_events(ocr, page_count):
+        yield event
+
+    res = await run_extract(doc_type=doc_type, ocr=ocr)
+    yield "document", {
+        "doc_type": res.doc_type.value if res.doc_type is not None else None,
+        "is_correct_document": res.is_correct_document,
+        "confidence": round(res.confidence, 4),
+    }
+    yield "result", build_response(res, uid)
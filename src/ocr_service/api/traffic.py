@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from ocr_service.core.tenants import resolve_tenant, set_tenant
+from ocr_service.core.traffic import (
+    API_KEY_HEADER,
+    TRAFFIC_CLASS_HEADER,
+    resolve_traffic_class,
+    set_traffic_class,
+)
+
+# Identifies the caller of every /v1 request and capture session: its tenant
+# (core/tenants.py) and traffic class (core/traffic.py), both from the API
+# key, the class otherwise from X-Traffic-Class. Must run outside
+# AdmissionMiddleware (tenant quotas) and DeadlineMiddleware, which copies the
+# context into the handler task.
+
+TENANT_KEY = "traffic.tenant"  # scope keys, for admission, handlers and logs
+TRAFFIC_CLASS_KEY = "traffic.class"
+_PREFIX = "/v1"
+
+
+class TrafficMiddleware:
+    """
+    Pure ASGI middleware. A missing or unknown API key (with
+    TENANTS_REQUIRE_KEY) is a 401, an unknown class name in the header a
+    400; WebSockets get a policy-violation close instead.
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket") or not scope["path"].startswith(_PREFIX + "/"):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        api_key = headers.get(API_KEY_HEADER)
+        tenant = resolve_tenant(api_key)
+        try:
+            if tenant is None:
+                raise PermissionError(f"A valid {API_KEY_HEADER} header is required.")
+            cls = tenant.traffic_class or resolve_traffic_class(headers.get(TRAFFIC_CLASS_HEADER), api_key)
+        except (PermissionError, ValueError) as e:
+            if scope["type"] == "websocket":
+                await send({"type": "websocket.close", "code": 1008, "reason": str(e)})
+            else:
+                status = 401 if isinstance(e, PermissionError) else 400
+                await JSONResponse(status_code=status, content={"detail": str(e)})(scope, receive, send)
+            return
+        scope[TENANT_KEY] = tenant
+        scope[TRAFFIC_CLASS_KEY] = cls
+        set_tenant(tenant)
+        set_traffic_class(cls)
+        await self.app(scope, receive, send)
@@ -0,0 +1,417 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+from ocr_service.core.utils.sqlite import connect, transaction
+
+# Storage for resumable uploads (/v1/uploads routes in api/routes.py).
+#
+# Upload state lives in SQLite and the bytes in one file per upload under
+# UPLOADS_DIR, both shared by the workers on one host, so a client can resume
+# on any worker. A writer (PATCH or finalise) holds a short lease on the
+# upload: bytes received are committed (and the lease renewed) every
+# UPLOAD_COMMIT_BYTES, so a dropped connection loses at most that much, and a
+# connection that stalls lets go of the upload after UPLOAD_LEASE_SECONDS.
+#
+# The sha256 of the content is updated as chunks arrive; a worker that did not
+# see the earlier chunks catches up from the file once. Uploads untouched for
+# UPLOAD_EXPIRE_SECONDS are removed by the janitor.
+
+logger = logging.getLogger(__name__)
+
+UPLOADS_DB_PATH = os.getenv("UPLOADS_DB_PATH", "cache/uploads/uploads.sqlite3")
+UPLOADS_DIR = os.getenv("UPLOADS_DIR", "cache/uploads/files")
+UPLOAD_EXPIRE_SECONDS = float(os.getenv("UPLOAD_EXPIRE_SECONDS", str(24 * 3600)))  # since last activity
+UPLOAD_LEASE_SECONDS = float(os.getenv("UPLOAD_LEASE_SECONDS", "30"))
+UPLOADS_MAX_PENDING_BYTES = int(os.getenv("UPLOADS_MAX_PENDING_BYTES", str(4 * 1024**3)))  # declared, all uploads
+UPLOAD_JANITOR_SECONDS = float(os.getenv("UPLOAD_JANITOR_SECONDS", "300"))
+UPLOAD_COMMIT_BYTES = 1024 * 1024
+_LEASE_MARGIN = 1.0  # stop writing this long before the lease could be taken over
+_READ_CHUNK = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    id TEXT PRIMARY KEY,
+    uid TEXT NOT NULL,
+    doc_type TEXT NOT NULL,
+    ext TEXT,
+    length INTEGER NOT NULL,
+    received INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    lease_token TEXT,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS uploads_expires ON uploads (expires_at);
+"""
+
+
+class UploadError(Exception):
+    """
+    Raised for unknown, conflicting or oversized uploads; carries the HTTP status.
+    """
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass(frozen=True)
+class Upload:
+    id: str
+    uid: str
+    doc_type: str
+    ext: Optional[str]  # None: sniffed from the content on finalise
+    length: int
+    received: int
+    created_at: float
+    expires_at: float
+
+    @property
+    def complete(self) -> bool:
+        return self.received == self.length
+
+
+@dataclass
+class Lease:
+    upload: Upload
+    token: str
+    until: float
+
+
+def _upload_from_row(row: Any) -> Upload:
+    return Upload(
+        id=row["id"],
+        uid=row["uid"],
+        doc_type=row["doc_type"],
+        ext=row["ext"],
+        length=row["length"],
+        received=row["received"],
+        created_at=row["created_at"],
+        expires_at=row["expires_at"],
+    )
+
+
+class UploadStore:
+    """
+    SQLite-backed upload state (one short-lived connection per call, usable
+    from any thread or worker) plus the per-process running hashes.
+    """
+    def __init__(self, db_path: str = UPLOADS_DB_PATH, files_dir: str = UPLOADS_DIR) -> None:
+        self.db_path = db_path
+        self.files_dir = files_dir
+        os.makedirs(files_dir, exist_ok=True)
+        conn = connect(db_path)
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+        # upload id -> (bytes hashed, running sha256, last used)
+        self._hashers: Dict[str, Tuple[int, Any, float]] = {}
+        self._hashers_lock = threading.Lock()
+
+    def path(self, upload_id: str) -> str:
+        return os.path.join(self.files_dir, upload_id)
+
+    def create(self, *, uid: str, doc_type: str, ext: Optional[str], length: int) -> Upload:
+        now = time.time()
+        upload = Upload(
+            id=uuid.uuid4().hex,
+            uid=uid,
+            doc_type=doc_type,
+            ext=ext,
+            length=length,
+            received=0,
+            created_at=now,
+            expires_at=now + UPLOAD_EXPIRE_SECONDS,
+        )
+        conn = connect(self.db_path)
+        try:
+            with transaction(conn):
+                pending = conn.execute(
+                    "SELECT COALESCE(SUM(length - received), 0) FROM uploads WHERE expires_at >= ?", (now,)
+                ).fetchone()[0]
+                if pending + length > UPLOADS_MAX_PENDING_BYTES:
+                    raise UploadError(503, "Too many uploads in progress. Retry later.")
+                conn.execute(
+                    "INSERT INTO uploads (id, uid, doc_type, ext, length, received, created_at, expires_at)"
+                    " VALUES (?, ?, ?, ?, ?, 0, ?, ?)",
+                    (upload.id, uid, doc_type, ext, length, now, upload.expires_at),
+                )
+        finally:
+            conn.close()
+        open(self.path(upload.id), "wb").close()
+        return upload
+
+    def get(self, upload_id: str) -> Optional[Upload]:
+        conn = connect(self.db_path)
+        try:
+            row = conn.execute(
+                "SELECT * FROM uploads WHERE id = ? AND expires_at >= ?", (upload_id, time.time())
+            ).fetchone()
+        finally:
+            conn.close()
+        return _upload_from_row(row) if row else None
+
+    def acquire(
+        self,
+        upload_id: str,
+        *,
+        offset: Optional[int] = None,
+        seconds: float = UPLOAD_LEASE_SECONDS,
+    ) -> Lease:
+        """
+        Lease the upload for writing (or, for `seconds` as long as the
+        request may take, for processing); `offset` (PATCH) must match the
+        bytes received so far.
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        conn = connect(self.db_path)
+        try:
+            with transaction(conn):
+                row = conn.execute(
+                    "SELECT * FROM uploads WHERE id = ? AND expires_at >= ?", (upload_id, now)
+                ).fetchone()
+                if row is None:
+                    raise UploadError(404, "Upload not found.")
+                if row["lease_until"] is not None and row["lease_until"] >= now:
+                    raise UploadError(423, "Upload is being written or processed by another request.")
+                if offset is not None and offset != row["received"]:
+                    raise UploadError(409, f"Upload-Offset mismatch: {row['received']} bytes received.")
+                until = now + seconds
+                conn.execute(
+                    "UPDATE uploads SET lease_token = ?, lease_until = ? WHERE id = ?",
+                    (token, until, upload_id),
+                )
+        finally:
+            conn.close()
+        return Lease(upload=_upload_from_row(row), token=token, until=until)
+
+    def commit(self, lease: Lease, received: int) -> None:
+        """
+        Record bytes received under the lease and renew it (and the expiry).
+        """
+        now = time.time()
+        conn = connect(self.db_path)
+        try:
+            n = conn.execute(
+                "UPDATE uploads SET received = ?, lease_until = ?, expires_at = ?"
+                " WHERE id = ? AND lease_token = ?",
+                (received, now + UPLOAD_LEASE_SECONDS, now + UPLOAD_EXPIRE_SECONDS, lease.upload.id, lease.token),
+            ).rowcount
+        finally:
+            conn.close()
+        if n != 1:
+            raise UploadError(404, "Upload not found.")
+        lease.until = now + UPLOAD_LEASE_SECONDS
+        lease.upload = replace(lease.upload, received=received, expires_at=now + UPLOAD_EXPIRE_SECONDS)
+
+    def release(self, lease: Lease) -> None:
+        conn = connect(self.db_path)
+        try:
+            conn.execute(
+                "UPDATE uploads SET lease_token = NULL, lease_until = NULL WHERE id = ? AND lease_token = ?",
+                (lease.upload.id, lease.token),
+            )
+        finally:
+            conn.close()
+
+    def delete(self, upload_id: str) -> bool:
+        conn = connect(self.db_path)
+        try:
+            n = conn.execute("DELETE FROM uploads WHERE id = ?", (upload_id,)).rowcount
+        finally:
+            conn.close()
+        _remove(self.path(upload_id))
+        with self._hashers_lock:
+            self._hashers.pop(upload_id, None)
+        return n == 1
+
+    # ---- running hash ----
+    def hasher(self, upload_id: str, received: int) -> Any:
+        """
+        Running sha256 of the first `received` bytes: the one this process kept,
+        else rebuilt from the file.
+        """
+        with self._hashers_lock:
+            entry = self._hashers.pop(upload_id, None)
+        if entry is not None and entry[0] == received:
+            return entry[1]
+        h = hashlib.sha256()
+        remaining = received
+        with open(self.path(upload_id), "rb") as f:
+            while remaining > 0:
+                chunk = f.read(min(_READ_CHUNK, remaining))
+                if not chunk:
+                    raise UploadError(410, "Upload data is missing.")
+                h.update(chunk)
+                remaining -= len(chunk)
+        return h
+
+    def keep_hasher(self, upload_id: str, received: int, h: Any) -> None:
+        with self._hashers_lock:
+            self._hashers[upload_id] = (received, h, time.time())
+
+    def digest(self, upload: Upload) -> str:
+        h = self.hasher(upload.id, upload.received)
+        self.keep_hasher(upload.id, upload.received, h)  # a failed finalise may be retried
+        return h.hexdigest()
+
+    # ---- janitor ----
+    def purge(self) -> int:
+        """
+        Remove expired uploads that nobody is writing, and files without an upload.
+        """
+        now = time.time()
+        conn = connect(self.db_path)
+        try:
+            with transaction(conn):
+                ids = [
+                    row["id"]
+                    for row in conn.execute(
+                        "SELECT id FROM uploads WHERE expires_at < ? AND (lease_until IS NULL OR lease_until < ?)",
+                        (now, now),
+                    )
+                ]
+                conn.executemany("DELETE FROM uploads WHERE id = ?", [(i,) for i in ids])
+            known = {row["id"] for row in conn.execute("SELECT id FROM uploads")}
+        finally:
+            conn.close()
+
+        for upload_id in ids:
+            _remove(self.path(upload_id))
+        try:
+            names = os.listdir(self.files_dir)
+        except OSError:
+            names = []
+        for name in names:
+            path = os.path.join(self.files_dir, name)
+            try:
+                # created just before its row is visible: leave young files alone
+                if name not in known and os.stat(path).st_mtime < now - UPLOAD_EXPIRE_SECONDS:
+                    os.remove(path)
+            except OSError:
+                pass
+        with self._hashers_lock:
+            for upload_id in [k for k, v in self._hashers.items() if k not in known or v[2] < now - UPLOAD_EXPIRE_SECONDS]:
+                del self._hashers[upload_id]
+        return len(ids)
+
+
+class UploadWriter:
+    """
+    Appends request chunks to a leased upload. feed() only checks and queues
+    a chunk; commit() writes the queued chunks to the file and the running
+    hash, persists the offset and renews the lease, so at most
+    UPLOAD_COMMIT_BYTES are buffered. Blocking (file I/O, hashing, SQLite):
+    construct and commit/close off the event loop.
+    """
+    def __init__(self, store: UploadStore, lease: Lease) -> None:
+        self.store = store
+        self.lease = lease
+        self.received = lease.upload.received
+        self._committed = self.received
+        self._hash = store.hasher(lease.upload.id, self.received)
+        self._file = open(store.path(lease.upload.id), "r+b")
+        self._file.seek(self.received)
+        self._file.truncate()  # drop bytes a lost writer left past the committed offset
+        self._buffer: List[bytes] = []
+
+    @property
+    def pending(self) -> int:
+        return self.received - self._committed
+
+    def due(self) -> bool:
+        return self.pending >= UPLOAD_COMMIT_BYTES or time.time() > self.lease.until - UPLOAD_LEASE_SECONDS / 2
+
+    def feed(self, chunk: bytes) -> None:
+        if self.received + len(chunk) > self.lease.upload.length:
+            raise UploadError(413, f"Chunk exceeds Upload-Length ({self.lease.upload.length} bytes).")
+        if time.time() > self.lease.until - _LEASE_MARGIN:
+            # stalled past the lease: another request may own the upload now
+            raise UploadError(409, "Upload lease expired; resume from the current Upload-Offset.")
+        self._buffer.append(chunk)
+        self.received += len(chunk)
+
+    def commit(self) -> None:
+        buffered, self._buffer = self._buffer, []
+        for chunk in buffered:
+            self._file.write(chunk)
+            self._hash.update(chunk)
+        self._file.flush()
+        self.store.commit(self.lease, self.received)
+        self._committed = self.received
+
+    def close(self) -> None:
+        """
+        Commit what was received (also after a dropped connection) and release the lease.
+        """
+        try:
+            if time.time() <= self.lease.until - _LEASE_MARGIN:
+                if self.pending:
+                    self.commit()
+                self.store.keep_hasher(self.lease.upload.id, self.received, self._hash)
+                self.store.release(self.lease)
+        finally:
+            self._file.close()
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_store: Optional[UploadStore] = None
+_store_lock = threading.Lock()
+
+
+def get_upload_store() -> UploadStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = UploadStore()
+    return _store
+
+
+_janitor_task: Optional[asyncio.Task[None]] = None
+
+
+async def _janitor_loop(store: UploadStore) -> None:
+    while True:
+        try:
+            n = await asyncio.to_thread(store.purge)
+        except Exception:
+            logger.exception("upload janitor failed")
+        else:
+            if n:
+                logger.info("removed %d expired uploads", n)
+        await asyncio.sleep(UPLOAD_JANITOR_SECONDS)
+
+
+def start_upload_janitor() -> None:
+    global _janitor_task
+    if _janitor_task is None:
+        _janitor_task = asyncio.create_task(_janitor_loop(get_upload_store()))
+
+
+async def stop_upload_janitor() -> None:
+    global _janitor_task
+    if _janitor_task is not None:
+        _janitor_task.cancel()
+        try:
+            await _janitor_task
+        except asyncio.CancelledError:
+            pass
+        _janitor_task = None
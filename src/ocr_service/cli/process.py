@@ -3,17 +3,23 @@ import argparse
 import json
 from ocr_service.config.mistral_client import get_mistral_client
 from ocr_service.core.types import DocType
-from ocr_service.pipeline.service import process_document, unify_payload
+from ocr_service.pipeline.service import extract_document, process_document, text_ocr, unify_payload
 
 
 def main() -> None:
     ap = argparse.ArgumentParser()
     ap.add_argument("--doc-type", required=True, choices=[d.value for d in DocType])
-    ap.add_argument("--image", required=True)
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--image")
+    src.add_argument("--text", help="OCR markdown file to extract from, without an OCR call")
     args = ap.parse_args()
 
-    client = get_mistral_client()
-    res = process_document(client=client, doc_type=DocType(args.doc_type), image_path=args.image)
+    if args.text is not None:
+        with open(args.text, encoding="utf-8") as f:
+            res = extract_document(doc_type=DocType(args.doc_type), ocr=text_ocr(f.read()))
+    else:
+        client = get_mistral_client()
+        res = process_document(client=client, doc_type=DocType(args.doc_type), image_path=args.image)
 
     doc_type = res.doc_type.value
     fields = dict(res.fields or {})
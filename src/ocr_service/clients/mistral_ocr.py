@@ -1,8 +1,42 @@
 from __future__ import annotations
-from typing import Any
+import os
+from typing import Any, List, Optional
 
+import httpx
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+
+from ocr_service.core.deadline import check_deadline, remaining_seconds
+from ocr_service.core.metrics import PROVIDER_BYTES, PROVIDER_CALLS, PROVIDER_IN_FLIGHT, count_retry, stage
 from ocr_service.core.types import OCRResult
-from ocr_service.core.utils.image import image_path_to_data_url
+from ocr_service.core.utils.image import BinarySource, image_path_to_data_url, source_to_data_url
+
+
+# Transient provider failures (rate limiting, 5xx, connection errors) are
+# retried with jittered exponential backoff; anything else fails at once.
+# Within a request, each attempt is bounded by the time left until the
+# request deadline and no attempt starts after it (core/deadline.py).
+OCR_MAX_RETRIES = int(os.getenv("OCR_MAX_RETRIES", "2"))
+OCR_RETRY_BACKOFF_SECONDS = float(os.getenv("OCR_RETRY_BACKOFF_SECONDS", "0.5"))
+_RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def _is_transient(e: BaseException) -> bool:
+    if isinstance(e, httpx.TransportError):
+        return True
+    status = getattr(e, "status_code", None)
+    if status is None:
+        status = getattr(getattr(e, "raw_response", None), "status_code", None)
+    return status in _RETRY_STATUS
+
+
+_backoff = wait_exponential_jitter(initial=OCR_RETRY_BACKOFF_SECONDS, max=8 * OCR_RETRY_BACKOFF_SECONDS)
+
+
+def _wait(retry_state: Any) -> float:
+    # never sleep past the request deadline; the next attempt's check fails fast
+    remaining = remaining_seconds()
+    wait = _backoff(retry_state)
+    return wait if remaining is None else max(0.0, min(wait, remaining))
 
 
 def _guess_document_type_from_data_url(data_url: str) -> str:
@@ -13,29 +47,113 @@ def _guess_document_type_from_data_url(data_url: str) -> str:
     return "image_url"
 
 
-def run_ocr_image_path(*, client: Any, image_path: str, model: str = "mistral-ocr-latest", table_format: str = "markdown") -> OCRResult:
-    data_url = image_path_to_data_url(image_path)
-    doc_type = _guess_document_type_from_data_url(data_url)
+def run_ocr_data_url(
+    *,
+    client: Any,
+    data_url: str,
+    model: str = "mistral-ocr-latest",
+    table_format: str = "markdown",
+    is_pdf: Optional[bool] = None,
+    pages: Optional[List[int]] = None,
+) -> OCRResult:
+    if is_pdf is None:
+        doc_type = _guess_document_type_from_data_url(data_url)
+    else:
+        doc_type = "document_url" if is_pdf else "image_url"
 
     payload_key = "document_url" if doc_type == "document_url" else "image_url"
 
-    resp = client.ocr.process(
-        model=model,
-        document={
-            "type": doc_type,
-            payload_key: data_url,
-        },
-        table_format=table_format,
+    kwargs: dict[str, Any] = {}
+    if pages is not None:
+        kwargs["pages"] = pages  # 0-based page indices (PDF only)
+
+    retrying = Retrying(
+        stop=stop_after_attempt(OCR_MAX_RETRIES + 1),
+        wait=_wait,
+        retry=retry_if_exception(_is_transient),
+        before_sleep=lambda state: count_retry("ocr"),
+        reraise=True,
     )
+    for attempt in retrying:
+        with attempt:
+            check_deadline("ocr")
+            remaining = remaining_seconds()
+            if remaining is not None:
+                kwargs["timeout_ms"] = max(1, int(remaining * 1000))
+            PROVIDER_BYTES.inc(amount=len(data_url))
+            with PROVIDER_IN_FLIGHT.track(), stage("ocr"):
+                try:
+                    resp = client.ocr.process(
+                        model=model,
+                        document={
+                            "type": doc_type,
+                            payload_key: data_url,
+                        },
+                        table_format=table_format,
+                        **kwargs,
+                    )
+                except Exception:
+                    PROVIDER_CALLS.inc("error")
+                    raise
+            PROVIDER_CALLS.inc("ok")
 
     raw = resp if isinstance(resp, dict) else resp.model_dump()
+    return ocr_result_from_raw(raw)
 
-    pages = raw.get("pages", [])
+
+def ocr_result_from_raw(raw: dict[str, Any]) -> OCRResult:
+    """
+    Build an OCRResult from a raw OCR response dict (fresh or cached).
+    """
     text_parts: list[str] = []
-    for p in pages:
+    for p in raw.get("pages", []):
         md = p.get("markdown")
         if isinstance(md, str) and md.strip():
             text_parts.append(md.strip())
 
     text = "\n\n".join(text_parts).strip()
     return OCRResult(text=text, raw=raw)
+
+
+def run_ocr_image_path(
+    *,
+    client: Any,
+    image_path: str,
+    model: str = "mistral-ocr-latest",
+    table_format: str = "markdown",
+    is_pdf: Optional[bool] = None,
+) -> OCRResult:
+    with stage("encode"):
+        data_url = image_path_to_data_url(image_path)
+    return run_ocr_data_url(
+        client=client,
+        data_url=data_url,
+        model=model,
+        table_format=table_format,
+        is_pdf=is_pdf,
+    )
+
+
+def run_ocr_bytes(
+    *,
+    client: Any,
+    data: BinarySource,
+    ext: str,
+    model: str = "mistral-ocr-latest",
+    table_format: str = "markdown",
+    data_url: Optional[str] = None,
+) -> OCRResult:
+    """
+    OCR in-memory bytes (or a file object) without touching the filesystem;
+    `data_url` is their encoding when already made while receiving them.
+    """
+    if data_url is None:
+        with stage("encode"):
+            data_url = source_to_data_url(data, ext)
+    return run_ocr_data_url(
+        client=client,
+        data_url=data_url,
+        model=model,
+        table_format=table_format,
+        is_pdf=ext == "pdf",
+    )
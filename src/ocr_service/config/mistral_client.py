@@ -1,12 +1,30 @@
 from __future__ import annotations
-from mistralai import Mistral
+import threading
+from typing import TYPE_CHECKING, Optional
+
 from ocr_service.config.settings import get_settings
 
+if TYPE_CHECKING:
+    from mistralai import Mistral
+
+_client: Optional[Mistral] = None
+_client_lock = threading.Lock()
+
 
 def get_mistral_client() -> Mistral:
     """
     Factory for Mistral client.
-    Created once per process, safe to reuse.
+    Created once per process (per uvicorn worker), safe to reuse: the
+    underlying HTTP connection pool is shared by all requests.
+    The SDK (~0.7 s to import) is loaded here, on first use or warm-up.
     """
-    settings = get_settings()
-    return Mistral(api_key=settings.mistral_api_key)
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from mistralai import Mistral
+
+                settings = get_settings()
+                kwargs = {"server_url": settings.mistral_server_url} if settings.mistral_server_url else {}
+                _client = Mistral(api_key=settings.mistral_api_key, **kwargs)
+    return _client
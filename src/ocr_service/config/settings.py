@@ -15,6 +15,7 @@ class Settings:
     ocr_cache_force_refresh: bool = False
     ocr_model: str = "mistral-ocr-latest"
     ocr_table_format: str = "markdown"
+    mistral_server_url: str = ""  # empty = SDK default endpoint
 
 
 def get_settings() -> Settings:
@@ -29,4 +30,5 @@ def get_settings() -> Settings:
         ocr_cache_force_refresh=os.getenv("OCR_CACHE_FORCE_REFRESH", "0") == "1",
         ocr_model=os.getenv("OCR_MODEL", "mistral-ocr-latest"),
         ocr_table_format=os.getenv("OCR_TABLE_FORMAT", "markdown"),
+        mistral_server_url=os.getenv("MISTRAL_SERVER_URL", "").strip(),
     )
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+# Per-request deadline, carried through the pipeline in a context variable
+# (the executor copies the context into its worker threads, so a Deadline is
+# shared by the request's coroutine and every thread working for it).
+#
+# Stages call check_deadline() before starting work; it raises once the
+# deadline has passed or the client has disconnected, so queued OCR calls,
+# retries and extractions are skipped instead of run for nobody.
+
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "120"))
+REQUEST_MAX_TIMEOUT_SECONDS = float(os.getenv("REQUEST_MAX_TIMEOUT_SECONDS", "600"))
+TIMEOUT_HEADER = "X-Request-Timeout"
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised by check_deadline(); `cancelled` is True when the client went away
+    rather than the deadline passing.
+    """
+    def __init__(self, stage: str, cancelled: bool = False) -> None:
+        what = "client disconnected" if cancelled else "request deadline exceeded"
+        super().__init__(f"{what} before {stage}")
+        self.stage = stage
+        self.cancelled = cancelled
+
+
+class Deadline:
+    """
+    Absolute (monotonic) deadline plus a cancellation flag; safe to read from
+    any thread.
+    """
+    def __init__(self, timeout: float) -> None:
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+        self._cancelled = threading.Event()
+
+    @classmethod
+    def from_header(cls, value: Optional[str]) -> Deadline:
+        """
+        X-Request-Timeout: seconds (decimal), capped at REQUEST_MAX_TIMEOUT_SECONDS.
+        Missing -> REQUEST_TIMEOUT_SECONDS. Raises ValueError when malformed.
+        """
+        if value is None or not value.strip():
+            return cls(REQUEST_TIMEOUT_SECONDS)
+        try:
+            timeout = float(value)
+        except ValueError:
+            raise ValueError(f"{TIMEOUT_HEADER} must be a number of seconds.") from None
+        if not timeout > 0:  # also rejects nan
+            raise ValueError(f"{TIMEOUT_HEADER} must be positive.")
+        return cls(min(timeout, REQUEST_MAX_TIMEOUT_SECONDS))
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def check(self, stage: str) -> None:
+        if self._cancelled.is_set():
+            raise DeadlineExceeded(stage, cancelled=True)
+        if time.monotonic() >= self.expires_at:
+            raise DeadlineExceeded(stage)
+
+
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def set_deadline(deadline: Optional[Deadline]) -> None:
+    _deadline.set(deadline)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _deadline.get()
+
+
+def check_deadline(stage: str) -> None:
+    """
+    Raise DeadlineExceeded if the current request is out of time (no-op
+    outside a request, e.g. async jobs and the CLI).
+    """
+    deadline = _deadline.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+def remaining_seconds() -> Optional[float]:
+    """
+    Time left for the current request, or None without a deadline.
+    """
+    deadline = _deadline.get()
+    return deadline.remaining() if deadline is not None else None
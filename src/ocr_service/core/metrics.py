@@ -0,0 +1,400 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Process-local metrics in the Prometheus text exposition format (0.0.4),
+# without a prometheus_client dependency.
+#
+# Lock-light: each thread records into its own shard of a metric (a plain
+# dict only that thread writes to), so recording never takes a lock and
+# never contends across the executor pools. A lock is taken only the first
+# time a thread touches a metric and when a scrape snapshots the shard list;
+# the scrape then sums the shards.
+
+logger = logging.getLogger(__name__)
+
+Labels = Tuple[str, ...]
+# (sample name suffix, label pairs, value)
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+# Seconds; covers header checks (~ms) up to slow multi-page provider calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict[Labels, Any]] = []
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _shard(self) -> Dict[Labels, Any]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _labels(self, values: Labels) -> Tuple[Tuple[str, str], ...]:
+        return tuple(zip(self.labelnames, values, strict=True))
+
+    def _snapshot_shards(self) -> List[Dict[Labels, Any]]:
+        with self._lock:
+            shards = list(self._shards)
+        # copy each shard: its owner thread may add label sets meanwhile
+        return [dict(s) for s in shards]
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """
+    Monotonic counter. Also used for up/down gauges of per-thread deltas
+    (see Gauge), since shard values are summed either way.
+    """
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return sum(s.get(labels, 0.0) for s in self._snapshot_shards())
+
+    def samples(self) -> List[Sample]:
+        totals: Dict[Labels, float] = {}
+        for shard in self._snapshot_shards():
+            for labels, v in shard.items():
+                totals[labels] = totals.get(labels, 0.0) + v
+        return [("", self._labels(k), v) for k, v in sorted(totals.items())]
+
+
+class Gauge(Counter):
+    """
+    Up/down gauge (e.g. calls in flight): inc() on entry, dec() on exit, from any thread.
+    """
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    @contextmanager
+    def track(self, *labels: str) -> Iterator[None]:
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        row = shard.get(labels)
+        if row is None:
+            # per-bucket counts (last = +Inf), then sum
+            row = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self) -> List[Sample]:
+        n = len(self.buckets) + 1
+        totals: Dict[Labels, List[float]] = {}
+        for shard in self._snapshot_shards():
+            for labels, row in shard.items():
+                acc = totals.setdefault(labels, [0.0] * (n + 1))
+                for i, v in enumerate(list(row)):
+                    acc[i] += v
+
+        out: List[Sample] = []
+        for labels, acc in sorted(totals.items()):
+            base = self._labels(labels)
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), acc[:n], strict=True):
+                cumulative += count
+                out.append(("_bucket", base + (("le", _format_value(bound)),), cumulative))
+            out.append(("_sum", base, acc[n]))
+            out.append(("_count", base, cumulative))
+        return out
+
+
+_REGISTRY: List[_Metric] = []
+# callbacks evaluated at scrape time: -> [(name, type, help, [(label pairs, value)])]
+Collector = Callable[[], Iterable[Tuple[str, str, str, Iterable[Tuple[Tuple[Tuple[str, str], ...], float]]]]]
+_COLLECTORS: List[Collector] = []
+
+
+def register_collector(fn: Collector) -> Collector:
+    """
+    Register a scrape-time callback for gauges read from existing state
+    (executor pools, admission controller, ...). Usable as a decorator.
+    """
+    _COLLECTORS.append(fn)
+    return fn
+
+
+# -------------------------
+# Metrics
+# -------------------------
+REQUESTS = Counter(
+    "ocr_requests_total",
+    "Processing requests by route, doc_type and HTTP status.",
+    ("route", "doc_type", "status"),
+)
+REQUEST_SECONDS = Histogram(
+    "ocr_request_seconds",
+    "End-to-end request latency by route.",
+    ("route",),
+)
+STAGE_SECONDS = Histogram(
+    "ocr_stage_seconds",
+    "Latency per pipeline stage (upload, ingest, preflight, encode, ocr_wait, "
+    "ocr, cpu_wait, extraction, postprocess, serialization).",
+    ("stage",),
+)
+QUEUE_SECONDS = Histogram(
+    "ocr_executor_queue_seconds",
+    "Time tasks waited for an executor thread, by pool and traffic class.",
+    ("pool", "class"),
+)
+EXTRACTION_SECONDS = Histogram(
+    "ocr_extraction_seconds",
+    "Field extraction time per document processor.",
+    ("processor",),
+)
+CACHE_LOOKUPS = Counter(
+    "ocr_cache_lookups_total",
+    "Cache lookups by cache (ocr, idempotency) and result (hit, miss).",
+    ("cache", "result"),
+)
+PROVIDER_IN_FLIGHT = Gauge(
+    "ocr_provider_in_flight",
+    "OCR provider calls currently in flight.",
+)
+PROVIDER_CALLS = Counter(
+    "ocr_provider_calls_total",
+    "OCR provider calls by outcome (ok, error).",
+    ("outcome",),
+)
+RETRIES = Counter(
+    "ocr_retries_total",
+    "Retried calls by stage (transient OCR provider errors).",
+    ("stage",),
+)
+PROVIDER_BYTES = Counter(
+    "ocr_provider_sent_bytes_total",
+    "Request payload bytes sent to the OCR provider (base64 data URLs).",
+)
+
+
+# -------------------------
+# Per-request timings
+# -------------------------
+class RequestTimings:
+    """
+    Stage durations, cache hits and retries of one request (Server-Timing /
+    `timings` block). Carried in a contextvar, so the executor threads and
+    tasks working for the request record into the same object; the lock is
+    per request and only contended by concurrent pages of one document.
+    Durations of concurrent work (pages) are summed.
+    """
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    def add(self, stage: str, *, seconds: float = 0.0, calls: int = 0, **counts: int) -> None:
+        with self._lock:
+            row = self._stages.get(stage)
+            if row is None:
+                row = self._stages[stage] = {"ms": 0.0, "calls": 0}
+            row["ms"] += seconds * 1000
+            row["calls"] += calls
+            for key, n in counts.items():
+                row[key] = row.get(key, 0) + n
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {
+                name: {k: round(v, 3) if k == "ms" else int(v) for k, v in row.items()}
+                for name, row in self._stages.items()
+            }
+        return {"total_ms": round((time.perf_counter() - self.started) * 1000, 3), "stages": stages}
+
+    def server_timing(self) -> str:
+        """
+        Server-Timing header value: one metric per stage plus `total`;
+        cache hits / retries go into the metric's desc.
+        """
+        data = self.as_dict()
+        parts = []
+        for name, row in data["stages"].items():
+            extra = " ".join(f"{k}={v}" for k, v in row.items() if k not in ("ms", "calls") and v)
+            part = f"{name};dur={row['ms']:.1f}" if row["calls"] else name
+            parts.append(f'{part};desc="{extra}"' if extra else part)
+        parts.append(f"total;dur={data['total_ms']:.1f}")
+        return ", ".join(parts)
+
+
+_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def start_timings() -> RequestTimings:
+    """
+    Begin collecting timings for the current request (context).
+    """
+    timings = RequestTimings()
+    _timings.set(timings)
+    return timings
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _timings.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time a pipeline stage into ocr_stage_seconds (and the request's timings).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, name)
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(name, seconds=seconds, calls=1)
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.inc(cache, "hit" if hit else "miss")
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(cache, **{"cache_hits" if hit else "cache_misses": 1})
+
+
+def count_retry(stage: str) -> None:
+    RETRIES.inc(stage)
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(stage, retries=1)
+
+
+# -------------------------
+# Exposition
+# -------------------------
+Family = Dict[str, Any]  # {"name", "type", "help", "samples": [Sample]}
+
+
+def snapshot() -> List[Family]:
+    """
+    Current values of every metric and collector in this process (JSON-serialisable).
+    """
+    families: List[Family] = [
+        {"name": m.name, "type": m.type, "help": m.help, "samples": m.samples()}
+        for m in _REGISTRY
+    ]
+    for fn in _COLLECTORS:
+        try:
+            collected = [
+                {
+                    "name": name,
+                    "type": mtype,
+                    "help": help,
+                    "samples": [("", tuple(labels), float(v)) for labels, v in values],
+                }
+                for name, mtype, help, values in fn()
+            ]
+        except Exception:
+            # one broken source (e.g. an unreadable state DB) must not hide the rest
+            logger.exception("metrics collector %s failed", getattr(fn, "__name__", fn))
+            continue
+        families.extend(collected)
+    return families
+
+
+def render(per_worker: Sequence[Tuple[Optional[str], List[Family]]]) -> str:
+    """
+    Text exposition of one or more process snapshots. With several workers
+    each sample gets a `worker` label, so series stay per-process (a
+    worker that exits just stops reporting) and are summed in queries.
+    """
+    merged: Dict[str, Family] = {}
+    lines_by_family: Dict[str, List[str]] = {}
+    for worker, families in per_worker:
+        extra = (("worker", worker),) if worker is not None else ()
+        for fam in families:
+            name = fam["name"]
+            if name not in merged:
+                merged[name] = fam
+                lines_by_family[name] = []
+            out = lines_by_family[name]
+            for suffix, labels, value in fam["samples"]:
+                pairs = tuple(tuple(p) for p in labels) + extra
+                out.append(f"{name}{suffix}{_format_labels(pairs)} {_format_value(value)}")
+
+    lines: List[str] = []
+    for name, fam in merged.items():
+        lines.append(f"# HELP {name} {fam['help']}")
+        lines.append(f"# TYPE {name} {fam['type']}")
+        lines.extend(lines_by_family[name])
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(pairs: Sequence[Sequence[str]]) -> str:
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs)
+    return "{" + inner + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from ocr_service.core.traffic import TRAFFIC_CLASSES
+
+# Tenants: the teams sharing one deployment, identified by API key
+# (X-API-Key). TENANTS_FILE (JSON) lists them:
+#
+#   {"tenants": [{"name": "onboarding", "api_keys": ["..."],
+#                 "max_concurrent": 20, "pages_per_minute": 600,
+#                 "weight": 2, "traffic_class": "interactive"}]}
+#
+# Requests without a known key belong to the "default" tenant (limits from
+# TENANT_DEFAULT_*), or are refused with TENANTS_REQUIRE_KEY=1. Quotas are
+# enforced at admission (api/admission.py); within a traffic class the
+# executor pools fair-queue between tenants by weight (pipeline/executor.py).
+# The tenant of a request is carried in a context variable, like its traffic
+# class (core/traffic.py).
+
+TENANTS_FILE = os.getenv("TENANTS_FILE", "")
+TENANTS_REQUIRE_KEY = os.getenv("TENANTS_REQUIRE_KEY", "0") == "1"
+DEFAULT_TENANT_NAME = "default"
+
+
+@dataclass(frozen=True)
+class Tenant:
+    name: str
+    max_concurrent: int = 0    # admitted requests in flight; 0 = unlimited
+    pages_per_minute: int = 0  # pages sent to OCR; 0 = unlimited
+    weight: float = 1.0        # share of pool starts against other tenants of its class
+    traffic_class: Optional[str] = None  # overrides X-Traffic-Class
+
+
+DEFAULT_TENANT = Tenant(
+    name=DEFAULT_TENANT_NAME,
+    max_concurrent=int(os.getenv("TENANT_DEFAULT_MAX_CONCURRENT", "0")),
+    pages_per_minute=int(os.getenv("TENANT_DEFAULT_PAGES_PER_MINUTE", "0")),
+)
+
+
+class TenantRegistry:
+    """
+    Tenants by API key and by name (immutable once loaded).
+    """
+    def __init__(self, tenants: Dict[str, Tenant], keys: Dict[str, str]) -> None:
+        self.tenants = tenants
+        self._keys = keys
+
+    @classmethod
+    def load(cls, path: str) -> TenantRegistry:
+        """
+        Parse TENANTS_FILE; raises ValueError for a malformed file.
+        """
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        tenants: Dict[str, Tenant] = {DEFAULT_TENANT_NAME: DEFAULT_TENANT}
+        keys: Dict[str, str] = {}
+        for entry in data.get("tenants", []):
+            try:
+                tenant = Tenant(
+                    name=str(entry["name"]),
+                    max_concurrent=int(entry.get("max_concurrent", 0)),
+                    pages_per_minute=int(entry.get("pages_per_minute", 0)),
+                    weight=float(entry.get("weight", 1.0)),
+                    traffic_class=entry.get("traffic_class"),
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Invalid tenant entry in {path}: {entry!r}") from e
+            if tenant.traffic_class is not None and tenant.traffic_class not in TRAFFIC_CLASSES:
+                raise ValueError(f"Unknown traffic_class {tenant.traffic_class!r} for tenant {tenant.name!r}.")
+            tenants[tenant.name] = tenant
+            for key in entry.get("api_keys", []):
+                if key in keys:
+                    raise ValueError(f"API key listed for both {keys[key]!r} and {tenant.name!r} in {path}.")
+                keys[key] = tenant.name
+        return cls(tenants, keys)
+
+    def by_key(self, api_key: Optional[str]) -> Optional[Tenant]:
+        name = self._keys.get(api_key) if api_key else None
+        return self.tenants[name] if name is not None else None
+
+
+_registry: Optional[TenantRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_tenants() -> TenantRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = (
+                    TenantRegistry.load(TENANTS_FILE) if TENANTS_FILE
+                    else TenantRegistry({DEFAULT_TENANT_NAME: DEFAULT_TENANT}, {})
+                )
+    return _registry
+
+
+def resolve_tenant(api_key: Optional[str]) -> Optional[Tenant]:
+    """
+    Tenant of a request from its API key; unknown or missing keys map to the
+    default tenant, or to None when TENANTS_REQUIRE_KEY is set.
+    """
+    tenant = get_tenants().by_key(api_key)
+    if tenant is None and not TENANTS_REQUIRE_KEY:
+        return DEFAULT_TENANT
+    return tenant
+
+
+_tenant: ContextVar[Tenant] = ContextVar("tenant", default=DEFAULT_TENANT)
+
+
+def set_tenant(tenant: Tenant) -> None:
+    _tenant.set(tenant)
+
+
+def current_tenant() -> Tenant:
+    return _tenant.get()
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import os
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# Traffic classes: "interactive" (a person is waiting, e.g. onboarding) and
+# "bulk" (re-processing runs, async jobs). Each class has its own wait queue
+# in the executor pools (pipeline/executor.py), which start queued tasks in
+# weighted fair order and keep TRAFFIC_INTERACTIVE_OCR_RESERVED OCR threads
+# that other classes never take, so a bulk backlog cannot push interactive
+# requests to the back of the provider's concurrency window.
+#
+# The class of a request comes from its API key (TRAFFIC_API_KEYS, so a bulk
+# client cannot promote itself) or the X-Traffic-Class header, and is carried
+# in a context variable like the deadline (core/deadline.py).
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+TRAFFIC_CLASS_HEADER = "X-Traffic-Class"
+API_KEY_HEADER = "X-API-Key"
+
+
+@dataclass(frozen=True)
+class TrafficClass:
+    name: str
+    weight: float      # share of task starts while classes compete for a pool
+    ocr_reserved: int  # OCR pool threads kept free for this class
+
+
+def _parse_map(raw: str) -> Dict[str, str]:
+    """
+    "key:value,key:value" -> dict (blank entries ignored).
+    """
+    out: Dict[str, str] = {}
+    for entry in raw.split(","):
+        key, sep, value = entry.strip().rpartition(":")
+        if sep and key and value:
+            out[key] = value.strip()
+    return out
+
+
+TRAFFIC_CLASSES: Dict[str, TrafficClass] = {
+    INTERACTIVE: TrafficClass(
+        INTERACTIVE,
+        weight=float(os.getenv("TRAFFIC_INTERACTIVE_WEIGHT", "4")),
+        ocr_reserved=int(os.getenv("TRAFFIC_INTERACTIVE_OCR_RESERVED", "4")),
+    ),
+    BULK: TrafficClass(BULK, weight=float(os.getenv("TRAFFIC_BULK_WEIGHT", "1")), ocr_reserved=0),
+}
+TRAFFIC_DEFAULT_CLASS = os.getenv("TRAFFIC_DEFAULT_CLASS", INTERACTIVE)
+TRAFFIC_JOBS_CLASS = os.getenv("TRAFFIC_JOBS_CLASS", BULK)  # async jobs (jobs/worker.py)
+TRAFFIC_API_KEYS = _parse_map(os.getenv("TRAFFIC_API_KEYS", ""))  # API key -> class
+
+_traffic_class: ContextVar[str] = ContextVar("traffic_class", default=TRAFFIC_DEFAULT_CLASS)
+
+
+def resolve_traffic_class(header: Optional[str], api_key: Optional[str] = None) -> str:
+    """
+    Class of a request: the one mapped to its API key, else the
+    X-Traffic-Class header, else TRAFFIC_DEFAULT_CLASS. Raises ValueError
+    for an unknown class name in the header.
+    """
+    if api_key and api_key in TRAFFIC_API_KEYS:
+        return TRAFFIC_API_KEYS[api_key]
+    if header is None or not header.strip():
+        return TRAFFIC_DEFAULT_CLASS
+    name = header.strip().lower()
+    if name not in TRAFFIC_CLASSES:
+        raise ValueError(f"{TRAFFIC_CLASS_HEADER} must be one of: {', '.join(TRAFFIC_CLASSES)}.")
+    return name
+
+
+def set_traffic_class(name: str) -> None:
+    _traffic_class.set(name)
+
+
+def current_traffic_class() -> str:
+    return _traffic_class.get()
@@ -24,7 +24,7 @@ class OCRResult:
 
 @dataclass
 class ExtractionResult:
-    doc_type: DocType
+    doc_type: Optional[DocType]  # None: detection requested, no type recognised
     document_number: Optional[str]
     is_correct_document: bool
     confidence: float
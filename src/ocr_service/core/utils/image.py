@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import base64
+import binascii
+import hashlib
 from pathlib import Path
+from typing import BinaryIO, List, Optional, Union
 
 _MIME_BY_EXT = {
     ".jpg": "image/jpeg",
@@ -11,14 +14,144 @@ _MIME_BY_EXT = {
     ".pdf": "application/pdf",
 }
 
-def image_path_to_data_url(path: str) -> str:
-    p = Path(path)
-    data = p.read_bytes()
-    b64 = base64.b64encode(data).decode("utf-8")
+# In-memory bytes or a seekable binary file object (e.g. SpooledTemporaryFile)
+BinarySource = Union[bytes, bytearray, memoryview, BinaryIO]
+
+_ENCODE_CHUNK = 3 * 256 * 1024  # multiple of 3 => chunks encode without padding
+
+
+def normalize_ext(ext: str) -> str:
+    """
+    "JPEG" / ".jpeg" -> "jpg": the form extensions take in cache keys and routes.
+    """
+    e = (ext or "").strip().lower().lstrip(".")
+    return "jpg" if e == "jpeg" else e
+
+
+def mime_for_ext(ext: str) -> str:
+    e = (ext or "").lower()
+    if e and not e.startswith("."):
+        e = "." + e
+    # fallback (still works for many cases, but better to pass correct ext)
+    return _MIME_BY_EXT.get(e, "application/octet-stream")
+
+
+def b64encode_source(src: BinarySource) -> str:
+    """
+    Base64-encode bytes or a file object. File objects are read from the start
+    in chunks, so no extra full-size bytes copy is made.
+    """
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return base64.b64encode(src).decode("ascii")
+
+    src.seek(0)
+    parts: list[str] = []
+    while True:
+        chunk = src.read(_ENCODE_CHUNK)
+        if not chunk:
+            break
+        parts.append(base64.b64encode(chunk).decode("ascii"))
+    return "".join(parts)
+
+
+def source_sha256(src: BinarySource) -> str:
+    """
+    sha256 hex digest of bytes or a file object (read from the start, position restored).
+    """
+    h = hashlib.sha256()
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        h.update(src)
+        return h.hexdigest()
+
+    pos = src.tell()
+    src.seek(0)
+    while True:
+        chunk = src.read(_ENCODE_CHUNK)
+        if not chunk:
+            break
+        h.update(chunk)
+    src.seek(pos)
+    return h.hexdigest()
+
 
-    mime = _MIME_BY_EXT.get(p.suffix.lower())
-    if not mime:
-        # fallback (still works for many cases, but better to pass correct ext)
-        mime = "application/octet-stream"
+def source_to_data_url(src: BinarySource, ext: str) -> str:
+    return f"data:{mime_for_ext(ext)};base64,{b64encode_source(src)}"
 
-    return f"data:{mime};base64,{b64}"
+
+class StreamEncoder:
+    """
+    sha256 and base64 of a byte stream, built up batch by batch while it is
+    received, so neither needs another pass over the file afterwards.
+    encode=False only hashes.
+
+    feed() only queues a chunk; flush() hashes and encodes the queued ones
+    and is the blocking part: run it off the event loop whenever due().
+    """
+    def __init__(self, *, encode: bool = True, batch_bytes: int = 1024 * 1024) -> None:
+        self.size = 0
+        self.encoding = encode
+        self.batch_bytes = batch_bytes
+        self._sha = hashlib.sha256()
+        self._parts: Optional[List[str]] = [] if encode else None
+        self._carry = b""  # < 3 bytes not yet encoded
+        self._pending: List[bytes] = []
+        self._pending_bytes = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending_bytes
+
+    def feed(self, chunk: bytes) -> None:
+        if chunk:
+            self._pending.append(bytes(chunk))
+            self._pending_bytes += len(chunk)
+
+    def due(self) -> bool:
+        return self._pending_bytes >= self.batch_bytes
+
+    def flush(self) -> None:
+        pending, self._pending, self._pending_bytes = self._pending, [], 0
+        for chunk in pending:
+            self.update(chunk)
+
+    def update(self, chunk: bytes) -> None:
+        """
+        Hash and encode `chunk` now (blocking).
+        """
+        self._sha.update(chunk)
+        self.size += len(chunk)
+        if self._parts is None:
+            return
+        buf = memoryview(self._carry + chunk if self._carry else chunk)
+        cut = len(buf) - len(buf) % 3
+        self._carry = bytes(buf[cut:])
+        if cut:
+            self._parts.append(binascii.b2a_base64(buf[:cut], newline=False).decode("ascii"))
+
+    def hexdigest(self) -> str:
+        return self._sha.hexdigest()
+
+    def data_url(self, ext: str) -> Optional[str]:
+        """
+        The data URL of everything flushed so far (None if not encoding); the
+        encoded parts are released, so call it once, after the last flush.
+        Blocking for large files (joins the parts).
+        """
+        if self._parts is None:
+            return None
+        parts, self._parts = self._parts, None
+        if self._carry:
+            parts.append(binascii.b2a_base64(self._carry, newline=False).decode("ascii"))
+        return f"data:{mime_for_ext(ext)};base64,{''.join(parts)}"
+
+    def discard(self) -> None:
+        """
+        Drop the encoded parts (e.g. the OCR result is cached); the digest stays.
+        """
+        self._parts = None
+
+
+def image_path_to_data_url(path: str) -> str:
+    p = Path(path)
+    with p.open("rb") as f:
+        return source_to_data_url(f, p.suffix)
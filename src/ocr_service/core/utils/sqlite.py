@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator
+
+
+def connect(path: str, *, timeout: float = 10.0) -> sqlite3.Connection:
+    """
+    Open a SQLite connection suitable for sharing a database file between
+    threads and processes on one host:
+    - WAL journal (readers never block the single writer)
+    - busy timeout instead of immediate 'database is locked' errors
+    - autocommit mode; use `transaction()` for multi-statement writes
+    """
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(timeout * 1000)}")
+    return conn
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """
+    BEGIN IMMEDIATE ... COMMIT: takes the write lock up front, so
+    read-then-update sequences (claims, leases) are atomic across processes.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
@@ -1,34 +1,62 @@
 from __future__ import annotations
 
+import hashlib
+import importlib
+import os
+from functools import cache, lru_cache
+from pathlib import Path
 from typing import Dict, Optional, Type
 
 from ocr_service.core.types import DocType
 from ocr_service.documents.base import DocumentProcessor
 
-from ocr_service.documents.id_front.processor import IDFrontProcessor
-from ocr_service.documents.id_back.processor import IDBackProcessor
-from ocr_service.documents.id_old_front.processor import IDOldFrontProcessor
-from ocr_service.documents.id_old_back.processor import IDOldBackProcessor
-from ocr_service.documents.driving_license.processor import DrivingLicenseProcessor
-from ocr_service.documents.address_card.processor import AddressCardProcessor
-from ocr_service.documents.passport.processor import PassportProcessor
-from ocr_service.documents.registration.processor import RegistrationProcessor
-# from ocr_service.documents.coc.processor import CocProcessor
-
-
-PROCESSOR_CLASSES: Dict[DocType, Type[DocumentProcessor]] = {
-    DocType.ID_FRONT: IDFrontProcessor,
-    DocType.ID_BACK: IDBackProcessor,
-    DocType.ID_OLD_FRONT: IDOldFrontProcessor,
-    DocType.ID_OLD_BACK: IDOldBackProcessor,
-    DocType.DRIVING_LICENSE: DrivingLicenseProcessor,
-    DocType.ADDRESS_CARD: AddressCardProcessor,
-    DocType.PASSPORT: PassportProcessor,
-    DocType.REGISTRATION: RegistrationProcessor,
-    # DocType.COC: CocProcessor,
+# Processors (and their rules modules) are imported on first use, so
+# processes that never extract - the CLI's --help, tools that only need
+# rules_version(), workers still starting up - do not pay for all of them.
+# warm_up() (pipeline/warmup.py) loads them eagerly before /ready turns green.
+PROCESSOR_PATHS: Dict[DocType, str] = {
+    DocType.ID_FRONT: "ocr_service.documents.id_front.processor:IDFrontProcessor",
+    DocType.ID_BACK: "ocr_service.documents.id_back.processor:IDBackProcessor",
+    DocType.ID_OLD_FRONT: "ocr_service.documents.id_old_front.processor:IDOldFrontProcessor",
+    DocType.ID_OLD_BACK: "ocr_service.documents.id_old_back.processor:IDOldBackProcessor",
+    DocType.DRIVING_LICENSE: "ocr_service.documents.driving_license.processor:DrivingLicenseProcessor",
+    DocType.ADDRESS_CARD: "ocr_service.documents.address_card.processor:AddressCardProcessor",
+    DocType.PASSPORT: "ocr_service.documents.passport.processor:PassportProcessor",
+    DocType.REGISTRATION: "ocr_service.documents.registration.processor:RegistrationProcessor",
+    # DocType.COC: "ocr_service.documents.coc.processor:CocProcessor",
 }
 
 
+@cache
+def get_processor_class(doc_type: DocType) -> Optional[Type[DocumentProcessor]]:
+    path = PROCESSOR_PATHS.get(doc_type)
+    if path is None:
+        return None
+    module, _, name = path.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
 def get_processor(doc_type: DocType) -> Optional[DocumentProcessor]:
-    cls = PROCESSOR_CLASSES.get(doc_type)
+    cls = get_processor_class(doc_type)
     return cls() if cls else None
+
+
+@lru_cache(maxsize=1)
+def rules_version() -> str:
+    """
+    Short fingerprint of the extraction code (all modules of the documents
+    package, plus the classifier). Changes whenever rules, extractors or
+    post-processing change, so stored results computed by older rules are
+    not reused.
+    """
+    # outside the documents package but part of every result (doc-type
+    # check); imported here because it imports this module
+    from ocr_service.pipeline import classify
+
+    root = Path(__file__).resolve().parent
+    h = hashlib.sha256()
+    for path in sorted(root.rglob("*.py")) + [Path(classify.__file__).resolve()]:
+        h.update(os.path.relpath(path, root).replace(os.sep, "/").encode("utf-8"))
+        h.update(b"\0")
+        h.update(path.read_bytes())
+    return h.hexdigest()[:16]
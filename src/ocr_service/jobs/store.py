@@ -0,0 +1,394 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from ocr_service.core.tenants import DEFAULT_TENANT_NAME
+from ocr_service.core.utils.sqlite import connect, transaction
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "cache/jobs/jobs.sqlite3")
+JOBS_FILES_DIR = os.getenv("JOBS_FILES_DIR", "cache/jobs/files")
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", "300"))  # renewed while the job runs
+JOBS_RETENTION_SECONDS = float(os.getenv("JOBS_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    uid TEXT NOT NULL,
+    tenant TEXT NOT NULL DEFAULT 'default',
+    doc_type TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    callback_url TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    lease_until REAL,
+    lease_token TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+
+CREATE TABLE IF NOT EXISTS webhook_deliveries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    delivered_at REAL,
+    failed_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS webhook_due ON webhook_deliveries (delivered_at, failed_at, next_attempt_at);
+"""
+
+# columns added since the first schema, for databases created before them
+_ADDED_COLUMNS = (
+    ("lease_token", "lease_token TEXT"),
+    ("tenant", f"tenant TEXT NOT NULL DEFAULT '{DEFAULT_TENANT_NAME}'"),
+)
+
+
+@dataclass(frozen=True)
+class Job:
+    id: str
+    uid: str
+    doc_type: str
+    ext: str
+    file_path: str
+    callback_url: Optional[str]
+    status: str
+    attempts: int
+    result: Optional[Dict[str, Any]]
+    error: Optional[Dict[str, Any]]
+    created_at: float
+    updated_at: float
+    lease_token: Optional[str] = None  # of the claim that returned this job
+    tenant: str = DEFAULT_TENANT_NAME  # that submitted the job
+
+
+@dataclass(frozen=True)
+class Delivery:
+    id: int
+    job_id: str
+    url: str
+    payload: Dict[str, Any]
+    attempts: int
+
+
+def _job_from_row(row: Any) -> Job:
+    return Job(
+        id=row["id"],
+        uid=row["uid"],
+        doc_type=row["doc_type"],
+        ext=row["ext"],
+        file_path=row["file_path"],
+        callback_url=row["callback_url"],
+        status=row["status"],
+        attempts=row["attempts"],
+        result=json.loads(row["result"]) if row["result"] else None,
+        error=json.loads(row["error"]) if row["error"] else None,
+        created_at=row["created_at"],
+        updated_at=row["updated_at"],
+        lease_token=row["lease_token"],
+        tenant=row["tenant"],
+    )
+
+
+class JobStore:
+    """
+    SQLite-backed job queue. Every method opens its own short-lived connection,
+    so the store can be used from any thread and from several uvicorn workers
+    sharing the same database file.
+
+    Claims use a lease: a job left 'running' by a crashed process becomes
+    claimable again once its lease expires, until JOBS_MAX_ATTEMPTS is reached.
+    The runner renews the lease while it works; renew / requeue / finish
+    only act for the claim that still holds it (its lease token), so a
+    runner that lost its lease cannot overwrite the next one's outcome.
+    """
+    def __init__(self, db_path: str = JOBS_DB_PATH, files_dir: str = JOBS_FILES_DIR) -> None:
+        self.db_path = db_path
+        self.files_dir = files_dir
+        os.makedirs(files_dir, exist_ok=True)
+        conn = connect(db_path)
+        try:
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, ddl in _ADDED_COLUMNS:
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {ddl}")
+        finally:
+            conn.close()
+
+    # ---- jobs ----
+    def create(
+        self,
+        *,
+        uid: str,
+        doc_type: str,
+        ext: str,
+        data: bytes,
+        callback_url: Optional[str] = None,
+        tenant: str = DEFAULT_TENANT_NAME,
+    ) -> Job:
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.files_dir, f"{job_id}.{ext}")
+        tmp = path + ".part"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+        now = time.time()
+        conn = connect(self.db_path)
+        try:
+            conn.execute(
+                "INSERT INTO jobs (id, uid, tenant, doc_type, ext, file_path, callback_url, status,"
+                " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, uid, tenant, doc_type, ext, path, callback_url, QUEUED, now, now),
+            )
+        except BaseException:
+            _remove(path)
+            raise
+        finally:
+            conn.close()
+        return self.get(job_id)  # type: ignore[return-value]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        conn = connect(self.db_path)
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return _job_from_row(row) if row else None
+
+    def claim(self) -> Optional[Job]:
+        """
+        Atomically take the oldest queued job (or one whose lease expired).
+        """
+        now = time.time()
+        conn = connect(self.db_path)
+        try:
+            with transaction(conn):
+                # out of attempts: fail instead of retrying forever
+                expired = conn.execute(
+                    "SELECT id, file_path FROM jobs WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (RUNNING, now, JOBS_MAX_ATTEMPTS),
+                ).fetchall()
+                for row in expired:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, error = ?, updated_at = ?, lease_until = NULL,"
+                        " lease_token = NULL WHERE id = ?",
+                        (FAILED, json.dumps({"status_code": 500, "detail": "Job lease expired too many times."}),
+                         now, row["id"]),
+                    )
+                    _remove(row["file_path"])
+
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?)"
+                    " ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, lease_token = ?,"
+                    " updated_at = ? WHERE id = ?",
+                    (RUNNING, now + JOBS_LEASE_SECONDS, uuid.uuid4().hex, now, row["id"]),
+                )
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+        finally:
+            conn.close()
+        return _job_from_row(row)
+
+    def renew(self, job: Job) -> bool:
+        """
+        Extend the lease of a claimed job; False if the claim lost it.
+        """
+        now = time.time()
+        conn = connect(self.db_path)
+        try:
+            n = conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ? AND lease_token = ?",
+                (now + JOBS_LEASE_SECONDS, job.id, RUNNING, job.lease_token),
+            ).rowcount
+        finally:
+            conn.close()
+        return n == 1
+
+    def requeue(self, job: Job) -> None:
+        """
+        Put a running job back (e.g. transient overload) without losing its attempt count.
+        """
+        conn = connect(self.db_path)
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = ?, lease_until = NULL, lease_token = NULL, updated_at = ?"
+                " WHERE id = ? AND status = ? AND lease_token = ?",
+                (QUEUED, time.time(), job.id, RUNNING, job.lease_token),
+            )
+        finally:
+            conn.close()
+
+    def finish(
+        self,
+        job: Job,
+        *,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """
+        Record the final outcome and, if the job has a callback URL, enqueue its
+        webhook in the same transaction. False (nothing recorded) if the
+        claim lost its lease to another runner.
+        """
+        now = time.time()
+        status = SUCCEEDED if error is None else FAILED
+        conn = connect(self.db_path)
+        try:
+            with transaction(conn):
+                n = conn.execute(
+                    "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, lease_until = NULL,"
+                    " lease_token = NULL WHERE id = ? AND status = ? AND lease_token = ?",
+                    (status, json.dumps(result) if result is not None else None,
+                     json.dumps(error) if error is not None else None, now, job.id, RUNNING, job.lease_token),
+                ).rowcount
+                if n != 1:
+                    return False
+                if job.callback_url:
+                    payload = {"job_id": job.id, "uid": job.uid, "status": status,
+                               "result": result, "error": error}
+                    conn.execute(
+                        "INSERT INTO webhook_deliveries (job_id, url, payload, next_attempt_at)"
+                        " VALUES (?, ?, ?, ?)",
+                        (job.id, job.callback_url, json.dumps(payload), now),
+                    )
+        finally:
+            conn.close()
+        _remove(job.file_path)
+        return True
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Number of jobs per state (queued / running are the queue depth).
+        """
+        conn = connect(self.db_path)
+        try:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs WHERE status IN (?, ?) GROUP BY status",
+                (QUEUED, RUNNING),
+            ).fetchall()
+        finally:
+            conn.close()
+        out = {QUEUED: 0, RUNNING: 0}
+        out.update({row["status"]: row["n"] for row in rows})
+        return out
+
+    def purge(self, older_than: float = JOBS_RETENTION_SECONDS) -> int:
+        """
+        Delete finished jobs (and settled webhook rows) older than the retention window.
+        """
+        cutoff = time.time() - older_than
+        conn = connect(self.db_path)
+        try:
+            with transaction(conn):
+                n = conn.execute(
+                    "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                    (SUCCEEDED, FAILED, cutoff),
+                ).rowcount
+                conn.execute(
+                    "DELETE FROM webhook_deliveries WHERE (delivered_at IS NOT NULL OR failed_at IS NOT NULL)"
+                    " AND next_attempt_at < ?",
+                    (cutoff,),
+                )
+        finally:
+            conn.close()
+        return n
+
+    # ---- webhooks ----
+    def claim_deliveries(self, *, limit: int, lease_seconds: float) -> List[Delivery]:
+        now = time.time()
+        conn = connect(self.db_path)
+        try:
+            with transaction(conn):
+                rows = conn.execute(
+                    "SELECT * FROM webhook_deliveries WHERE delivered_at IS NULL AND failed_at IS NULL"
+                    " AND next_attempt_at <= ? AND (lease_until IS NULL OR lease_until < ?)"
+                    " ORDER BY next_attempt_at LIMIT ?",
+                    (now, now, limit),
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE webhook_deliveries SET lease_until = ? WHERE id = ?",
+                    [(now + lease_seconds, r["id"]) for r in rows],
+                )
+        finally:
+            conn.close()
+        return [
+            Delivery(id=r["id"], job_id=r["job_id"], url=r["url"],
+                     payload=json.loads(r["payload"]), attempts=r["attempts"])
+            for r in rows
+        ]
+
+    def mark_delivered(self, ids: List[int]) -> None:
+        now = time.time()
+        conn = connect(self.db_path)
+        try:
+            conn.executemany(
+                "UPDATE webhook_deliveries SET delivered_at = ?, lease_until = NULL WHERE id = ?",
+                [(now, i) for i in ids],
+            )
+        finally:
+            conn.close()
+
+    def mark_delivery_failed(self, ids: List[int], *, error: str, retry_at: Optional[float]) -> None:
+        """
+        Record a failed attempt; retry_at=None gives up on the delivery.
+        """
+        now = time.time()
+        conn = connect(self.db_path)
+        try:
+            conn.executemany(
+                "UPDATE webhook_deliveries SET attempts = attempts + 1, last_error = ?, lease_until = NULL,"
+                " next_attempt_at = COALESCE(?, next_attempt_at), failed_at = ? WHERE id = ?",
+                [(error[:500], retry_at, None if retry_at is not None else now, i) for i in ids],
+            )
+        finally:
+            conn.close()
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = JobStore()
+    return _store
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from ocr_service.jobs.store import Delivery, JobStore
+
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "50"))          # events per POST
+WEBHOOK_FLUSH_SECONDS = float(os.getenv("WEBHOOK_FLUSH_SECONDS", "2"))   # max delay before a flush
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_BACKOFF_SECONDS = float(os.getenv("WEBHOOK_BACKOFF_SECONDS", "5"))
+WEBHOOK_BACKOFF_MAX_SECONDS = float(os.getenv("WEBHOOK_BACKOFF_MAX_SECONDS", "600"))
+
+
+def _retry_at(attempts: int) -> Optional[float]:
+    """
+    Exponential backoff with jitter; None once the delivery should be abandoned.
+    """
+    if attempts + 1 >= WEBHOOK_MAX_ATTEMPTS:
+        return None
+    delay = min(WEBHOOK_BACKOFF_MAX_SECONDS, WEBHOOK_BACKOFF_SECONDS * (2 ** attempts))
+    return time.time() + delay * random.uniform(0.8, 1.2)
+
+
+class WebhookDispatcher:
+    """
+    Delivers job-completion callbacks from the webhook_deliveries table.
+
+    Pending events are grouped per callback URL and POSTed as
+    {"events": [...]} (up to WEBHOOK_BATCH_SIZE per request). Non-2xx responses
+    and network errors are retried with exponential backoff. Rows are leased
+    while in flight, so several processes can run a dispatcher on one database.
+    """
+    def __init__(self, store: JobStore) -> None:
+        self.store = store
+        self._wake = asyncio.Event()
+        self._stopping = False
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stopping = True
+        self._wake.set()
+
+    async def run(self) -> None:
+        async with httpx.AsyncClient(timeout=WEBHOOK_TIMEOUT_SECONDS) as http:
+            while not self._stopping:
+                try:
+                    sent = await self.flush(http)
+                except Exception:
+                    sent = 0
+                if sent >= WEBHOOK_BATCH_SIZE:
+                    continue
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=WEBHOOK_FLUSH_SECONDS)
+                except TimeoutError:
+                    pass
+                self._wake.clear()
+
+    async def flush(self, http: httpx.AsyncClient) -> int:
+        deliveries = await asyncio.to_thread(
+            self.store.claim_deliveries,
+            limit=WEBHOOK_BATCH_SIZE * 4,
+            lease_seconds=WEBHOOK_TIMEOUT_SECONDS * 3,
+        )
+        by_url: Dict[str, List[Delivery]] = {}
+        for d in deliveries:
+            by_url.setdefault(d.url, []).append(d)
+
+        batches = [
+            group[i : i + WEBHOOK_BATCH_SIZE]
+            for group in by_url.values()
+            for i in range(0, len(group), WEBHOOK_BATCH_SIZE)
+        ]
+        await asyncio.gather(*(self._send(http, b) for b in batches))
+        return len(deliveries)
+
+    async def _send(self, http: httpx.AsyncClient, batch: List[Delivery]) -> None:
+        ids = [d.id for d in batch]
+        try:
+            resp = await http.post(batch[0].url, json={"events": [d.payload for d in batch]})
+            if 200 <= resp.status_code < 300:
+                await asyncio.to_thread(self.store.mark_delivered, ids)
+                return
+            error = f"HTTP {resp.status_code}"
+        except httpx.HTTPError as e:
+            error = f"{type(e).__name__}: {e}"
+
+        attempts = max(d.attempts for d in batch)
+        await asyncio.to_thread(
+            self.store.mark_delivery_failed, ids, error=error, retry_at=_retry_at(attempts)
+        )
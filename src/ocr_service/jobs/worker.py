@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+from ocr_service.api.common import build_response, run_pipeline
+from ocr_service.api.memory import reserve_memory
+from ocr_service.api.models import RequestDocType, requested_doc_type
+from ocr_service.core.tenants import DEFAULT_TENANT, get_tenants, set_tenant
+from ocr_service.core.traffic import TRAFFIC_JOBS_CLASS, set_traffic_class
+from ocr_service.jobs.store import (
+    JOBS_LEASE_SECONDS,
+    JOBS_MAX_ATTEMPTS,
+    Job,
+    JobStore,
+    get_job_store,
+)
+from ocr_service.jobs.webhooks import WebhookDispatcher
+
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "1") == "1"
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "1"))
+JOBS_PURGE_INTERVAL_SECONDS = 3600.0
+JOBS_HEARTBEAT_SECONDS = JOBS_LEASE_SECONDS / 3
+
+logger = logging.getLogger(__name__)
+
+
+class JobRunner:
+    """
+    Bounded pool of asyncio workers that claim jobs from the SQLite queue and
+    run them through the same pipeline as /v1/process, plus the webhook
+    dispatcher. Workers wake immediately on local submissions and poll the
+    queue otherwise (to pick up work left by restarts or other processes).
+    """
+    def __init__(self, store: JobStore, *, workers: int = JOBS_WORKERS) -> None:
+        self.store = store
+        self.workers = workers
+        self.webhooks = WebhookDispatcher(store)
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._tasks: List[asyncio.Task] = []
+        self._last_purge = 0.0
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self.webhooks.run()))
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wake.set()
+        self.webhooks.stop()
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        set_traffic_class(TRAFFIC_JOBS_CLASS)  # queued behind interactive requests in the pools
+        while not self._stopping:
+            job = await asyncio.to_thread(self.store.claim)
+            if job is None:
+                await self._idle()
+                continue
+            await self._run(job)
+
+    async def _idle(self) -> None:
+        now = time.monotonic()
+        if now - self._last_purge > JOBS_PURGE_INTERVAL_SECONDS:
+            self._last_purge = now
+            await asyncio.to_thread(self.store.purge)
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=JOBS_POLL_SECONDS)
+        except TimeoutError:
+            pass
+        self._wake.clear()
+
+    async def _heartbeat(self, job: Job) -> None:
+        """
+        Renew the job's lease while it waits in the pools and runs, so a
+        long or queued job is not claimed a second time.
+        """
+        while True:
+            await asyncio.sleep(JOBS_HEARTBEAT_SECONDS)
+            try:
+                renewed = await asyncio.to_thread(self.store.renew, job)
+            except Exception:
+                logger.exception("job lease renewal failed: %s", job.id)
+                continue
+            if not renewed:
+                logger.warning("job %s lost its lease; its outcome will not be recorded here", job.id)
+                return
+
+    async def _run(self, job: Job) -> None:
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await self._process(job)
+        finally:
+            heartbeat.cancel()
+
+    async def _process(self, job: Job) -> None:
+        # fair-queued in the pools as the tenant that submitted it (charged at submission);
+        # a tenant since removed from TENANTS_FILE falls back to the default one
+        set_tenant(get_tenants().tenants.get(job.tenant, DEFAULT_TENANT))
+        try:
+            with open(job.file_path, "rb") as f:
+                # background work queues for memory without a time limit
+                async with reserve_memory(os.fstat(f.fileno()).st_size, bounded=False):
+                    doc_type = requested_doc_type(RequestDocType(job.doc_type))
+                    res = await run_pipeline(doc_type=doc_type, data=f, ext=job.ext)
+            result = build_response(res, job.uid)
+        except HTTPException as e:
+            if e.status_code == 503:
+                # executor saturated by synchronous traffic: back off and retry later
+                await asyncio.to_thread(self.store.requeue, job)
+                await asyncio.sleep(JOBS_POLL_SECONDS)
+                return
+            await self._finish(job, error={"status_code": e.status_code, "detail": e.detail})
+            return
+        except asyncio.CancelledError:
+            await asyncio.shield(asyncio.to_thread(self.store.requeue, job))
+            raise
+        except Exception as e:
+            if job.attempts < JOBS_MAX_ATTEMPTS:
+                await asyncio.to_thread(self.store.requeue, job)
+                return
+            await self._finish(job, error={"status_code": 500, "detail": f"{type(e).__name__}: {e}"})
+            return
+
+        await self._finish(job, result=result)
+
+    async def _finish(self, job: Job, *, result: Optional[dict] = None, error: Optional[dict] = None) -> None:
+        recorded = await asyncio.to_thread(self.store.finish, job, result=result, error=error)
+        if recorded and job.callback_url:
+            self.webhooks.wake()
+
+
+_runner: Optional[JobRunner] = None
+
+
+def get_job_runner() -> Optional[JobRunner]:
+    return _runner
+
+
+def start_job_runner() -> Optional[JobRunner]:
+    global _runner
+    if not JOBS_ENABLED:
+        return None
+    if _runner is None:
+        _runner = JobRunner(get_job_store())
+        _runner.start()
+    return _runner
+
+
+async def stop_job_runner() -> None:
+    global _runner
+    if _runner is not None:
+        await _runner.stop()
+        _runner = None
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import io
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+# Frame scoring for live capture (the /v1/capture WebSocket, api/capture.py).
+#
+# Preview frames are scored on a small grayscale copy (CAPTURE_ANALYSIS_SIZE px
+# on the long side; JPEGs are decoded at reduced scale) with cheap metrics:
+# - sharpness: variance of the Laplacian, mapped to 0..1
+# - glare: share of blown-out pixels
+# - presence: share of tiles with text-like local contrast (in a capture flow
+#   the document fills most of the frame; desks and walls are flat)
+# A 64-bit difference hash (dHash) identifies near-identical frames: they
+# reuse the scene metrics (presence, glare) of the frame they repeat and only
+# sharpness is measured again, and a run of similar frames means the camera
+# is being held steady. Only the best frame is ever sent to OCR.
+#
+# Imports NumPy: load this module on first use (or from warm-up), not at startup.
+
+CAPTURE_ANALYSIS_SIZE = int(os.getenv("CAPTURE_ANALYSIS_SIZE", "320"))
+CAPTURE_MAX_FRAME_PIXELS = int(os.getenv("CAPTURE_MAX_FRAME_PIXELS", str(4096 * 4096)))
+CAPTURE_READY_QUALITY = float(os.getenv("CAPTURE_READY_QUALITY", "0.6"))
+CAPTURE_STEADY_FRAMES = int(os.getenv("CAPTURE_STEADY_FRAMES", "3"))
+
+_SHARPNESS_REF = 600.0     # Laplacian variance at which sharpness = 1 - 1/e
+_GLARE_LEVEL = 250         # pixel value counted as blown out
+_GLARE_MAX = 0.08          # glare share that zeroes the quality
+_TILES = 8                 # presence grid (per side)
+_TILE_STD = 12.0           # tile intensity std that counts as content
+_MIN_PRESENCE = 0.35       # below: no document in view
+_FULL_PRESENCE = 0.6       # at or above: presence no longer limits quality
+_MIN_BRIGHTNESS = 40.0
+_DUPLICATE_BITS = 2        # dHash distance of a repeated frame
+_STEADY_BITS = 6           # dHash distance of consecutive frames of a steady camera
+_MAX_REUSE = 10            # re-measure the scene after this many repeats
+
+_EXT_BY_FORMAT = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+
+class FrameError(ValueError):
+    """
+    Raised for frames that cannot be decoded or are too large.
+    """
+
+
+@dataclass(frozen=True)
+class FrameScore:
+    seq: int
+    ext: str
+    quality: float     # 0..1, what best-frame selection maximises
+    sharpness: float   # 0..1
+    glare: float       # share of blown-out pixels
+    presence: float    # share of tiles with content
+    brightness: float  # mean, 0..255
+    dhash: int
+    duplicate: bool    # scene metrics reused from the previous frame
+    reused: int = 0    # consecutive frames the scene metrics were reused for
+
+    @property
+    def usable(self) -> bool:
+        return self.presence >= _MIN_PRESENCE and self.brightness >= _MIN_BRIGHTNESS
+
+    def hint(self) -> str:
+        """
+        What the capture UI should tell the user about this frame.
+        """
+        if self.brightness < _MIN_BRIGHTNESS:
+            return "too_dark"
+        if self.presence < _MIN_PRESENCE:
+            return "no_document"
+        if self.glare > _GLARE_MAX / 4:
+            return "glare"
+        if self.sharpness < 0.5:
+            return "blurry"
+        return "ok"
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _load_gray(data: bytes) -> Tuple[Image.Image, str]:
+    try:
+        img = Image.open(io.BytesIO(data))
+        ext = _EXT_BY_FORMAT.get(img.format or "")
+        if ext is None:
+            raise FrameError("Frames must be JPEG, PNG or WebP images.")
+        if img.width * img.height > CAPTURE_MAX_FRAME_PIXELS:
+            raise FrameError(f"Frame too large ({img.width}x{img.height}).")
+        img.draft("L", (CAPTURE_ANALYSIS_SIZE, CAPTURE_ANALYSIS_SIZE))  # JPEG: DCT scaling
+        gray = img.convert("L")
+        gray.thumbnail((CAPTURE_ANALYSIS_SIZE, CAPTURE_ANALYSIS_SIZE), Image.Resampling.BILINEAR)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise FrameError("Could not decode frame.") from None
+    return gray, ext
+
+
+def dhash(gray: Image.Image) -> int:
+    """
+    64-bit difference hash: brighter-than-right-neighbour bits of a 9x8 thumbnail.
+    """
+    px = np.asarray(gray.resize((9, 8), Image.Resampling.BOX), dtype=np.int16)
+    bits = (px[:, 1:] > px[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _sharpness(a: np.ndarray) -> float:
+    lap = 4.0 * a[1:-1, 1:-1] - a[:-2, 1:-1] - a[2:, 1:-1] - a[1:-1, :-2] - a[1:-1, 2:]
+    return float(1.0 - np.exp(-float(lap.var()) / _SHARPNESS_REF))
+
+
+def _presence(a: np.ndarray) -> float:
+    h, w = a.shape
+    th, tw = h // _TILES, w // _TILES
+    if th < 2 or tw < 2:
+        return 0.0
+    tiles = a[: th * _TILES, : tw * _TILES].reshape(_TILES, th, _TILES, tw)
+    return float((tiles.std(axis=(1, 3)) >= _TILE_STD).mean())
+
+
+def analyze_frame(data: bytes, seq: int, previous: Optional[FrameScore] = None) -> FrameScore:
+    """
+    Score one preview frame (CPU-bound, a few ms: run it on the CPU pool).
+    Raises FrameError for undecodable or oversized frames.
+    """
+    gray, ext = _load_gray(data)
+    a = np.asarray(gray, dtype=np.float32)
+    h = dhash(gray)
+    sharpness = _sharpness(a)
+
+    duplicate = (
+        previous is not None
+        and previous.reused < _MAX_REUSE
+        and hamming(h, previous.dhash) <= _DUPLICATE_BITS
+    )
+    if duplicate:
+        glare, presence, brightness = previous.glare, previous.presence, previous.brightness
+        reused = previous.reused + 1
+    else:
+        glare = float((a >= _GLARE_LEVEL).mean())
+        presence = _presence(a)
+        brightness = float(a.mean())
+        reused = 0
+
+    quality = (
+        sharpness
+        * max(0.0, 1.0 - glare / _GLARE_MAX)
+        * min(1.0, presence / _FULL_PRESENCE)
+        * (1.0 if brightness >= _MIN_BRIGHTNESS else 0.0)
+    )
+    return FrameScore(
+        seq=seq,
+        ext=ext,
+        quality=round(quality, 4),
+        sharpness=round(sharpness, 4),
+        glare=round(glare, 4),
+        presence=round(presence, 4),
+        brightness=round(brightness, 1),
+        dhash=h,
+        duplicate=duplicate,
+        reused=reused,
+    )
+
+
+class CaptureSession:
+    """
+    Best-frame selection over the scored preview frames of one capture.
+    Keeps only the best frame's bytes.
+    """
+    def __init__(
+        self,
+        *,
+        ready_quality: float = CAPTURE_READY_QUALITY,
+        steady_frames: int = CAPTURE_STEADY_FRAMES,
+    ) -> None:
+        self.ready_quality = ready_quality
+        self.steady_frames = steady_frames
+        self.frames = 0
+        self.duplicates = 0
+        self.steady = 0  # consecutive frames close to their predecessor
+        self.previous: Optional[FrameScore] = None
+        self.best: Optional[FrameScore] = None
+        self.best_data: Optional[bytes] = None
+
+    def add(self, score: FrameScore, data: bytes) -> None:
+        self.frames += 1
+        self.duplicates += score.duplicate
+        if self.previous is not None and hamming(score.dhash, self.previous.dhash) <= _STEADY_BITS:
+            self.steady += 1
+        else:
+            self.steady = 0
+        if score.usable and (self.best is None or score.quality > self.best.quality):
+            self.best, self.best_data = score, data
+        self.previous = score
+
+    @property
+    def ready(self) -> bool:
+        """
+        A good enough frame was seen while the camera is held steady.
+        """
+        return (
+            self.best is not None
+            and self.best.quality >= self.ready_quality
+            and self.steady >= self.steady_frames
+        )
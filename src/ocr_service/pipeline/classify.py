@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import importlib
+import math
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from ocr_service.core.types import DocType
+from ocr_service.documents.registry import PROCESSOR_PATHS
+
+# Cheap doc-type classification over OCR text (a bundle page or a whole
+# document): weighted keyword signatures plus the field labels of each
+# type's rules module (documents/*/rules.py). Titles and bilingual labels
+# that only appear on one document side carry the most weight; labels shared
+# between layouts (e.g. "Családi és utónév") only help break ties.
+#
+# Everything goes into one SignatureIndex. Each pattern is declared with the
+# literal keys (folded: uppercase ASCII, no diacritics) one of which begins a
+# word in every text it matches; scoring walks the words of the folded text
+# once and only runs the patterns whose keys occur - far cheaper than running
+# the processors. A pattern declared without keys is searched every time.
+
+Signature = Tuple[Pattern[str], float, Tuple[str, ...]]
+
+
+def _sig(pattern: str, weight: float, *keys: str) -> Signature:
+    return re.compile(pattern, re.IGNORECASE | re.MULTILINE), weight, keys
+
+
+SIGNATURES: Dict[DocType, List[Signature]] = {
+    DocType.ID_FRONT: [
+        _sig(r"\bSZEM[EÉ]LYAZONOS[IÍ]T[OÓ]\s+IGAZOLV[AÁ]NY\b", 2.0, "SZEMELYAZONOSITO"),
+        _sig(r"\bIDENTITY\s+CARD\b", 2.0, "IDENTITY"),
+        _sig(r"\bFAMILY\s+NAME\s+AND\s+GIVEN\s+NAME\b(?!\s+AT\s+BIRTH)", 1.5, "FAMILY"),
+        _sig(r"\b[OÖ]KM[AÁ]NYAZONOS[IÍ]T[OÓ]\b|\bDOC\.?\s*NO\b", 1.0, "OKMANYAZONOSITO", "DOC"),
+        _sig(r"\bCAN\b", 0.5, "CAN"),
+    ],
+    DocType.ID_BACK: [
+        _sig(r"\bMOTHER'?S\s+MAIDEN\s+NAME\b", 2.0, "MOTHER"),
+        _sig(r"\bPLACE\s+OF\s+ORIGIN\b|\bSZ[AÁ]RMAZ[AÁ]SI\s+HELY\b", 2.0, "ORIGIN", "SZARMAZASI"),
+        _sig(r"\bGIVEN\s+NAME\s+AT\s+BIRTH\b", 1.5, "GIVEN"),
+        _sig(r"^I[D<]HUN", 2.0),  # TD1 MRZ first line
+        _sig(r"\bPLACE\s+OF\s+BIRTH\b", 0.5, "PLACE"),
+    ],
+    DocType.ID_OLD_FRONT: [
+        _sig(r"\bSURNAME\s+AND\s+GIVEN\s+NAME\b", 2.0, "SURNAME"),
+        _sig(r"\bSZEM[EÉ]LYI\s+AZONOS[IÍ]T[OÓ]\b", 1.0, "SZEMELYI"),
+        _sig(r"\bCSAL[AÁ]DI\s+[EÉ]S\s+UT[OÓ]N[EÉ]V\b", 0.5, "CSALADI"),
+    ],
+    DocType.ID_OLD_BACK: [
+        _sig(r"\bMOTHER'?S\s+NAME\b", 1.5, "MOTHER"),
+        _sig(r"\bBIRTH\s+NAME\b", 1.0, "BIRTH"),
+        _sig(r"\bSZ[UÜ]LET[EÉ]SI\s+N[EÉ]V\b", 1.0, "SZULETESI"),
+        _sig(r"\bANYJA\s+SZ[UÜ]LET[EÉ]SI\s+NEVE\b", 0.5, "ANYJA"),
+    ],
+    DocType.DRIVING_LICENSE: [
+        _sig(r"\bVEZET[OŐ]I\s+ENGED[EÉ]LY\b", 2.5, "VEZETOI"),
+        _sig(r"\bDRIVING\s+LICEN[CS]E\b", 2.5, "DRIVING"),
+        _sig(r"(?:^|\s)4\s*\.?\s*\(?[abcd]\)?\s*[.:]", 1.0),
+        _sig(r"(?:^|\s)[59]\s*\.\s", 0.5),
+    ],
+    DocType.ADDRESS_CARD: [
+        _sig(r"\bLAKC[IÍ]MET\s+IGAZOL[OÓ]\b", 3.0, "LAKCIMET"),
+        _sig(r"\bLAK[OÓ]HELY\b", 1.0, "LAKOHELY"),
+        _sig(r"\bTART[OÓ]ZKOD[AÁ]SI\s+HELY\b", 1.0, "TARTOZKODASI"),
+        _sig(r"\bBEJELENT[EÉ]SI\s+ID[OŐ]\b", 1.0, "BEJELENTESI"),
+    ],
+    DocType.PASSPORT: [
+        _sig(r"\b[UÚ]TLEV[EÉ]L\b", 2.0, "UTLEVEL"),
+        _sig(r"\bPASSPORT\b", 2.0, "PASSPORT"),
+        _sig(r"^P[<A-Z][A-Z]{3}", 2.0),  # TD3 MRZ first line
+        _sig(r"\bDATE\s+OF\s+EXPIRY\b", 0.5, "DATE"),
+    ],
+    DocType.REGISTRATION: [
+        _sig(r"\bFORGALMI\s+ENGED[EÉ]LY\b", 3.0, "FORGALMI"),
+        _sig(r"\bREGISTRATION\s+CERTIFICATE\b", 2.0, "REGISTRATION"),
+        _sig(r"\bGY[AÁ]RT[AÁ]SI\s+[EÉ]V\b", 1.0, "GYARTASI"),
+        _sig(r"(?<![A-Z0-9])[DP]\s*\.\s*[123](?=\s|$)", 0.5),
+        _sig(r"(?<![A-Z0-9])V\s*\.\s*9(?=\s|$)", 0.5),
+    ],
+    DocType.COC: [
+        _sig(r"\bCERTIFICATE\s+OF\s+CONFORMITY\b", 3.0, "CERTIFICATE"),
+        _sig(r"\bMEGFELEL[OŐ]S[EÉ]GI\s+(?:NYILATKOZAT|IGAZOL[AÁ]S)\b", 3.0, "MEGFELELOSEGI"),
+        _sig(r"\bEC\s+TYPE[- ]APPROVAL\b", 1.0, "TYPE"),
+    ],
+}
+
+# Minimum score for a page to count as a document of its best type.
+MIN_SCORE = 1.0
+
+# Score a type gets for matching every one of its rules labels.
+LABEL_WEIGHT = 2.0
+# The rules labels that take part, by name in the type's rules module, with
+# their keys (as for SIGNATURES). Generic labels ("A.", "SEX") are left out.
+LABEL_KEYS: Dict[DocType, Dict[str, Tuple[str, ...]]] = {
+    DocType.ID_FRONT: {
+        "NAME_LABEL": ("FAMILY", "CSALADI"),
+    },
+    DocType.ID_BACK: {
+        "BIRTH_PLACE_LABEL": ("PLACE", "SZULETESI"),
+        "BIRTH_NAME_LABEL": ("FAMILY", "SZULETESI"),
+        "MOTHERS_NAME_LABEL": ("MOTHER", "ANYJA"),
+        "ORIGIN_PLACE_LABEL": ("PLACE", "SZARMAZASI"),
+    },
+    DocType.ID_OLD_FRONT: {
+        "NAME_LABEL": ("CSALADI", "SURNAME"),
+    },
+    DocType.ID_OLD_BACK: {
+        "BIRTH_NAME_LABEL": ("SZULETESI", "BIRTH"),
+        "BIRTH_PLACE_LABEL": ("SZULETESI", "PLACE"),
+        "BIRTH_DATE_LABEL": ("SZULETESI", "DATE"),
+        "MOTHERS_NAME_LABEL": ("ANYJA", "MOTHER"),
+    },
+    DocType.ADDRESS_CARD: {
+        "FULL_NAME_LABEL": ("CSALADI",),
+        "BIRTH_PLACE_DATE_LABEL": ("SZULETESI",),
+        "MOTHERS_NAME_LABEL": ("ANYJA",),
+        "PERMANENT_ADDRESS_LABEL": ("LAKOHELY",),
+        "TEMPORARY_ADDRESS_LABEL": ("TARTOZKODASI",),
+        "REPORTING_TIME_LABEL": ("BEJELENTESI",),
+        "VALIDITY_LABEL": ("ERVENYESSEGI",),
+        "ISSUING_AUTHORITY_LABEL": ("KIALLITO",),
+        "TITLE_LABEL": ("LAKCIMET",),
+    },
+    DocType.PASSPORT: {
+        "DOCUMENT_NUMBER_LABEL": ("UTLEVELSZAM", "PASSPORT"),
+        "SURNAME_LABEL": ("CSALADI", "SURNAME"),
+        "GIVEN_NAMES_LABEL": ("UTONEV", "GIVEN"),
+        "BIRTH_NAME_LABEL": ("SZULETESI", "BIRTH"),
+        "BIRTH_DATE_LABEL": ("SZULETESI", "DATE"),
+        "BIRTH_PLACE_LABEL": ("SZULETESI", "PLACE"),
+        "NATIONALITY_LABEL": ("ALLAMPOLGARSAG", "NATIONALITY"),
+        "ISSUE_DATE_LABEL": ("KIALLITASI", "DATE"),
+        "EXPIRY_DATE_LABEL": ("ERVENYESSEGI", "DATE"),
+        "ISSUING_AUTHORITY_LABEL": ("KIALLITO", "AUTHORITY"),
+    },
+    DocType.REGISTRATION: {
+        "MANUFACTURE_YEAR_LABEL": ("GYARTASI",),
+        "GEARBOX_TYPE_LABEL": ("SEBESSEGVALTO",),
+    },
+}
+# The requested type still counts as correct when it scores at least this
+# fraction of the best type (sibling layouts share most labels).
+_AMBIGUOUS_RATIO = 0.8
+
+# Types whose documents may span several consecutive pages.
+MULTI_PAGE_TYPES = {DocType.PASSPORT, DocType.REGISTRATION, DocType.COC}
+
+
+@dataclass(frozen=True)
+class PageLabel:
+    page: int
+    doc_type: Optional[DocType]
+    score: float
+
+
+@dataclass(frozen=True)
+class PageGroup:
+    doc_type: DocType
+    pages: List[int]
+    score: float  # best page score within the group
+
+
+@dataclass(frozen=True)
+class TypeCheck:
+    detected: Optional[DocType]  # best-scoring type, None if nothing reached MIN_SCORE
+    confidence: float            # share of the evidence for the requested (or detected) type
+    is_correct: bool
+
+
+@dataclass(frozen=True)
+class _Entry:
+    doc_type: DocType
+    rx: Pattern[str]
+    weight: Optional[float]  # signature weight; None for a rules label (scored by coverage)
+    keys: Tuple[str, ...]
+
+
+_COMBINING = re.compile(r"[\u0300-\u036f]+")
+_NON_ASCII = re.compile(r"[^\x00-\x7f]")
+_WORD = re.compile(r"[A-Z0-9]+")
+
+
+def _fold(text: str) -> str:
+    """
+    Uppercase ASCII, diacritics dropped, any other non-ASCII character a
+    space (so it still separates words): the form keys are matched in.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.upper())
+    return _NON_ASCII.sub(" ", _COMBINING.sub("", decomposed))
+
+
+def _rules_labels(doc_type: DocType) -> List[Tuple[Pattern[str], Tuple[str, ...]]]:
+    """
+    The LABEL_KEYS patterns of a type's rules module (imports it).
+    """
+    path = PROCESSOR_PATHS.get(doc_type)
+    labels = LABEL_KEYS.get(doc_type)
+    if path is None or not labels:
+        return []
+    package = path.partition(":")[0].rsplit(".", 1)[0]
+    module = importlib.import_module(f"{package}.rules")
+    return [(getattr(module, name), keys) for name, keys in labels.items()]
+
+
+class SignatureIndex:
+    """
+    All signatures and rules labels, looked up by their keys. Scoring folds
+    the text once and walks its words line by line, noting the first line
+    each key begins a word on; then only the entries with a key present
+    are searched - starting one line above that line. Entries without keys
+    search the whole text.
+
+    Score of a type = its matched signature weights + LABEL_WEIGHT x the
+    fraction of its labels present. A label span matched by labels of k types
+    counts 1/k for each, so shared labels ("Place of birth") weigh little.
+    """
+    def __init__(self, entries: List[_Entry]) -> None:
+        self.entries = entries
+        self._by_key: Dict[str, List[int]] = {}
+        self._keyless: List[int] = []
+        self._label_counts: Dict[DocType, int] = {}
+        for i, e in enumerate(entries):
+            for k in e.keys:
+                self._by_key.setdefault(k, []).append(i)
+            if not e.keys:
+                self._keyless.append(i)
+            if e.weight is None:
+                self._label_counts[e.doc_type] = self._label_counts.get(e.doc_type, 0) + 1
+        self._key_lengths = sorted({len(k) for k in self._by_key})
+
+    def score(self, text: str) -> Dict[DocType, float]:
+        # entry -> first line one of its keys begins a word on (folding keeps
+        # the line structure); a word counts for every key it starts with
+        first_line: Dict[int, int] = {i: 0 for i in self._keyless}
+        by_key, lengths = self._by_key, self._key_lengths
+        for n, line in enumerate(_fold(text).split("\n")):
+            for word in _WORD.findall(line):
+                for size in lengths:
+                    if size > len(word):
+                        break
+                    for i in by_key.get(word[:size], ()):
+                        first_line.setdefault(i, n)
+        line_starts = [0]
+        for line in text.split("\n")[:-1]:
+            line_starts.append(line_starts[-1] + len(line) + 1)
+
+        scores: Dict[DocType, float] = {}
+        spans: List[Tuple[DocType, int, int]] = []
+        for i in sorted(first_line):
+            e = self.entries[i]
+            m = e.rx.search(text, line_starts[max(0, first_line[i] - 1)])
+            if m is None:
+                continue
+            if e.weight is None:
+                spans.append((e.doc_type, m.start(), m.end()))
+            else:
+                scores[e.doc_type] = scores.get(e.doc_type, 0.0) + e.weight
+
+        coverage: Dict[DocType, float] = {}
+        for doc_type, start, end in spans:
+            sharing = {dt for dt, s, e in spans if s < end and start < e}
+            coverage[doc_type] = coverage.get(doc_type, 0.0) + 1.0 / len(sharing)
+        for doc_type, credit in coverage.items():
+            scores[doc_type] = scores.get(doc_type, 0.0) + LABEL_WEIGHT * credit / self._label_counts[doc_type]
+        return scores
+
+
+@lru_cache(maxsize=1)
+def signature_index() -> SignatureIndex:
+    """
+    Built on first use: it imports every rules module.
+    """
+    entries = [_Entry(dt, rx, w, keys) for dt, sigs in SIGNATURES.items() for rx, w, keys in sigs]
+    for doc_type in PROCESSOR_PATHS:
+        entries.extend(_Entry(doc_type, rx, None, keys) for rx, keys in _rules_labels(doc_type))
+    return SignatureIndex(entries)
+
+
+def score_text(text: str) -> Dict[DocType, float]:
+    return signature_index().score(text)
+
+
+def classify_text(text: str, page: int = 0) -> PageLabel:
+    scores = score_text(text or "")
+    if not scores:
+        return PageLabel(page=page, doc_type=None, score=0.0)
+    best = max(scores, key=lambda dt: scores[dt])
+    if scores[best] < MIN_SCORE:
+        return PageLabel(page=page, doc_type=None, score=scores[best])
+    return PageLabel(page=page, doc_type=best, score=scores[best])
+
+
+def check_doc_type(text: str, doc_type: Optional[DocType]) -> TypeCheck:
+    """
+    Classify a document's OCR text against the doc_type it was submitted as
+    (None: whatever it looks like).
+
+    confidence is a softmax over all types' scores, so it is high only when
+    the requested type clearly dominates. is_correct is False for empty text,
+    text in which no type reaches MIN_SCORE, or when another type clearly
+    wins.
+    """
+    scores = score_text(text or "")
+    best = max(scores, key=lambda dt: scores[dt]) if scores else None
+    detected = best if best is not None and scores[best] >= MIN_SCORE else None
+
+    target = detected if doc_type is None else doc_type
+    if target is None or not (text or "").strip():
+        return TypeCheck(detected=detected, confidence=0.0, is_correct=False)
+
+    top = max(scores.values(), default=0.0)
+    weights = {dt: math.exp(scores.get(dt, 0.0) - top) for dt in DocType}
+    confidence = weights[target] / sum(weights.values())
+
+    # no recognisable document at all is not evidence for the requested type
+    is_correct = detected is not None and (
+        detected is target or scores.get(target, 0.0) >= _AMBIGUOUS_RATIO * scores[detected]
+    )
+    return TypeCheck(detected=detected, confidence=confidence, is_correct=is_correct)
+
+
+def group_pages(labels: List[PageLabel]) -> Tuple[List[PageGroup], List[int]]:
+    """
+    Turn per-page labels into documents:
+    - consecutive pages of a multi-page type form one document
+    - an unrecognised page directly after a multi-page document is treated as
+      its continuation (registration back sides carry few keywords)
+    Returns (groups in page order, unclassified page indices).
+    """
+    groups: List[PageGroup] = []
+    unclassified: List[int] = []
+    for label in labels:
+        prev = groups[-1] if groups else None
+        continues = (
+            prev is not None
+            and prev.doc_type in MULTI_PAGE_TYPES
+            and prev.pages[-1] == label.page - 1
+            and label.doc_type in (None, prev.doc_type)
+        )
+        if continues:
+            groups[-1] = PageGroup(prev.doc_type, prev.pages + [label.page], max(prev.score, label.score))
+        elif label.doc_type is None:
+            unclassified.append(label.page)
+        else:
+            groups.append(PageGroup(label.doc_type, [label.page], label.score))
+    return groups, unclassified
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, TypeVar
+
+from ocr_service.core.deadline import DeadlineExceeded, check_deadline
+from ocr_service.core.metrics import QUEUE_SECONDS, observe_stage
+from ocr_service.core.tenants import Tenant, current_tenant
+from ocr_service.core.traffic import TRAFFIC_CLASSES, current_traffic_class
+
+T = TypeVar("T")
+
+# Pool names
+OCR_POOL = "ocr"   # threads that mostly wait on the OCR provider
+CPU_POOL = "cpu"   # regex extraction / post-processing
+
+OCR_WORKERS = int(os.getenv("PIPELINE_OCR_WORKERS", "16"))
+CPU_WORKERS = int(os.getenv("PIPELINE_CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_QUEUE = int(os.getenv("PIPELINE_MAX_QUEUE", "64"))  # waiting (not yet started) tasks per traffic class, per pool
+
+
+class QueueFullError(RuntimeError):
+    """
+    Raised when a pool's wait queue is at capacity; callers should shed the request.
+    """
+    def __init__(self, pool: str, depth: int) -> None:
+        super().__init__(f"Pipeline queue '{pool}' is full ({depth} waiting).")
+        self.pool = pool
+        self.depth = depth
+
+
+@dataclass
+class PoolStats:
+    workers: int
+    max_queue: int  # per traffic class (ClassStats.waiting), not for the pool as a whole
+    waiting: int = 0
+    running: int = 0
+    submitted: int = 0
+    rejected: int = 0
+    expired: int = 0  # skipped at dequeue: deadline passed or client gone
+    queue_time_total: float = 0.0
+    queue_time_max: float = 0.0
+
+    @property
+    def queue_time_avg(self) -> float:
+        started = self.submitted - self.waiting
+        return self.queue_time_total / started if started > 0 else 0.0
+
+
+@dataclass
+class ClassStats:
+    weight: float
+    reserved: int  # threads other classes never take
+    waiting: int = 0
+    running: int = 0
+    submitted: int = 0
+    rejected: int = 0
+    queue_time_total: float = 0.0
+    queue_time_max: float = 0.0
+
+
+@dataclass
+class _Task:
+    call: Callable[[], Any]
+    future: Future[Any]
+    submitted_at: float
+
+
+class _TenantQueue:
+    def __init__(self, weight: float) -> None:
+        self.tasks: Deque[_Task] = deque()
+        self.weight = weight
+        self.vtime = 0.0
+
+
+class _ClassQueue:
+    """
+    Wait queue of one traffic class: a FIFO per tenant (core/tenants.py),
+    served in weighted fair order like the classes themselves.
+    """
+    def __init__(self, weight: float, reserved: int) -> None:
+        self.stats = ClassStats(weight=weight, reserved=reserved)
+        self.vtime = 0.0  # virtual start time of the next task (weighted fair queueing)
+        self.pending = 0  # queued tasks, including cancelled ones not yet skipped
+        self._tenants: Dict[str, _TenantQueue] = {}
+        self._vclock = 0.0
+
+    def push(self, tenant: str, weight: float, task: _Task) -> None:
+        t = self._tenants.get(tenant)
+        if t is None:
+            t = self._tenants[tenant] = _TenantQueue(weight)
+        if not t.tasks:
+            t.vtime = max(t.vtime, self._vclock)
+        t.tasks.append(task)
+        self.pending += 1
+
+    def pop(self) -> _Task:
+        t = min((t for t in self._tenants.values() if t.tasks), key=lambda t: t.vtime)
+        self._vclock = t.vtime
+        t.vtime += 1.0 / max(t.weight, 1e-6)
+        self.pending -= 1
+        return t.tasks.popleft()
+
+    def clear(self) -> List[_Task]:
+        tasks = [task for t in self._tenants.values() for task in t.tasks]
+        for t in self._tenants.values():
+            t.tasks.clear()
+        self.pending = 0
+        return tasks
+
+
+class _Pool:
+    """
+    Thread pool with one wait queue per traffic class (core/traffic.py).
+    Tasks are handed to a thread only when one is free, in weighted fair
+    order: each start advances its class's virtual time by 1/weight and the
+    backlogged class with the lowest virtual time goes next (and within the
+    class, the tenant with the lowest virtual time). A class only starts a
+    task if the threads left free still cover the unused reservations of the
+    other classes.
+    """
+    def __init__(self, name: str, workers: int, max_queue: int, reserved: Dict[str, int]) -> None:
+        self.name = name
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"pipeline-{name}")
+        self.stats = PoolStats(workers=workers, max_queue=max_queue)
+        self.lock = threading.Lock()
+        self.vclock = 0.0
+        self.classes: Dict[str, _ClassQueue] = {
+            cls.name: _ClassQueue(cls.weight, min(reserved.get(cls.name, 0), workers - 1))
+            for cls in TRAFFIC_CLASSES.values()
+        }
+
+    def _queue(self, cls: str) -> _ClassQueue:
+        q = self.classes.get(cls)
+        if q is None:  # class not in TRAFFIC_CLASSES (misconfigured key map): weight 1
+            q = self.classes[cls] = _ClassQueue(1.0, 0)
+        return q
+
+    def submit(self, cls: str, tenant: Tenant, call: Callable[[], Any]) -> Future[Any]:
+        with self.lock:
+            st = self.stats
+            q = self._queue(cls)
+            # only tasks that cannot start immediately count against the class's queue
+            if q.stats.waiting >= st.max_queue and st.running + st.waiting >= st.workers:
+                st.rejected += 1
+                q.stats.rejected += 1
+                raise QueueFullError(self.name, q.stats.waiting)
+            if not q.pending:
+                q.vtime = max(q.vtime, self.vclock)  # no credit banked while idle
+            fut: Future[Any] = Future()
+            q.push(tenant.name, tenant.weight, _Task(call, fut, time.perf_counter()))
+            st.waiting += 1
+            st.submitted += 1
+            q.stats.waiting += 1
+            q.stats.submitted += 1
+            self._dispatch()
+        return fut
+
+    def _eligible(self, q: _ClassQueue) -> bool:
+        held = sum(
+            max(0, o.stats.reserved - o.stats.running) for o in self.classes.values() if o is not q
+        )
+        return self.stats.workers - self.stats.running - 1 >= held
+
+    def _dispatch(self) -> None:
+        # with self.lock held
+        st = self.stats
+        while st.running < st.workers:
+            ready = [q for q in self.classes.values() if q.pending and self._eligible(q)]
+            if not ready:
+                return
+            q = min(ready, key=lambda c: c.vtime)
+            task = q.pop()
+            if not task.future.set_running_or_notify_cancel():
+                continue  # cancelled while queued; counted in cancelled()
+            queued_for = time.perf_counter() - task.submitted_at
+            self.vclock = q.vtime
+            q.vtime += 1.0 / max(q.stats.weight, 1e-6)
+            for s in (st, q.stats):
+                s.waiting -= 1
+                s.running += 1
+                s.queue_time_total += queued_for
+                if queued_for > s.queue_time_max:
+                    s.queue_time_max = queued_for
+            try:
+                self.executor.submit(self._run, q, task)
+            except RuntimeError as e:  # shut down
+                st.running -= 1
+                q.stats.running -= 1
+                task.future.set_exception(e)
+
+    def _run(self, q: _ClassQueue, task: _Task) -> None:
+        try:
+            result = task.call()
+        except BaseException as e:
+            task.future.set_exception(e)
+        else:
+            task.future.set_result(result)
+        finally:
+            with self.lock:
+                self.stats.running -= 1
+                q.stats.running -= 1
+                self._dispatch()
+
+    def expired(self) -> None:
+        with self.lock:
+            self.stats.expired += 1
+
+    def cancelled(self, cls: str) -> None:
+        with self.lock:
+            self.stats.waiting -= 1
+            self._queue(cls).stats.waiting -= 1
+
+
+class PipelineExecutor:
+    """
+    Bounded thread pools for synchronous pipeline work, so route handlers never
+    block the event loop:
+    - OCR_POOL: sized for many concurrent waits on the OCR provider
+    - CPU_POOL: small, for extraction (GIL-bound; more threads do not help)
+
+    Each pool has a bounded wait queue per traffic class; when it is full,
+    run() raises QueueFullError instead of letting work pile up behind a slow
+    provider. Queued tasks start in weighted fair order across classes, with
+    OCR threads reserved for the interactive class (see _Pool). Tasks whose
+    request deadline passed (or whose client disconnected) while they waited
+    raise DeadlineExceeded when dequeued instead of running.
+    """
+    def __init__(
+        self,
+        *,
+        ocr_workers: int = OCR_WORKERS,
+        cpu_workers: int = CPU_WORKERS,
+        max_queue: int = MAX_QUEUE,
+    ) -> None:
+        ocr_reserved = {cls.name: cls.ocr_reserved for cls in TRAFFIC_CLASSES.values()}
+        self._pools: Dict[str, _Pool] = {
+            OCR_POOL: _Pool(OCR_POOL, ocr_workers, max_queue, ocr_reserved),
+            CPU_POOL: _Pool(CPU_POOL, cpu_workers, max_queue, {}),
+        }
+
+    async def run(self, pool: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        p = self._pools[pool]
+        cls = current_traffic_class()
+        tenant = current_tenant()
+        ctx = contextvars.copy_context()
+        submitted_at = time.perf_counter()
+
+        def _call() -> T:
+            queued_for = time.perf_counter() - submitted_at
+            ctx.run(observe_stage, f"{pool}_wait", queued_for)  # ocr_wait / cpu_wait, in the request's timings
+            QUEUE_SECONDS.observe(queued_for, pool, cls)
+            try:
+                ctx.run(check_deadline, f"{pool} pool")
+            except DeadlineExceeded:
+                p.expired()
+                raise
+            return ctx.run(fn, *args, **kwargs)
+
+        fut = p.submit(cls, tenant, _call)
+        try:
+            return await asyncio.wrap_future(fut)
+        except asyncio.CancelledError:
+            if fut.cancel():
+                p.cancelled(cls)
+            raise
+
+    def stats(self) -> Dict[str, PoolStats]:
+        out: Dict[str, PoolStats] = {}
+        for name, p in self._pools.items():
+            with p.lock:
+                out[name] = PoolStats(**vars(p.stats))
+        return out
+
+    def class_stats(self) -> Dict[str, Dict[str, ClassStats]]:
+        """
+        Per pool, per traffic class.
+        """
+        out: Dict[str, Dict[str, ClassStats]] = {}
+        for name, p in self._pools.items():
+            with p.lock:
+                out[name] = {cls: ClassStats(**vars(q.stats)) for cls, q in p.classes.items()}
+        return out
+
+    def shutdown(self, wait: bool = True) -> None:
+        for p in self._pools.values():
+            with p.lock:
+                for q in p.classes.values():
+                    for task in q.clear():
+                        task.future.cancel()
+            p.executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_executor: Optional[PipelineExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> PipelineExecutor:
+    """
+    Process-wide executor shared by all routes (created lazily).
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = PipelineExecutor()
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from ocr_service.core.metrics import cache_lookup
+from ocr_service.core.utils.sqlite import connect, transaction
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: no cross-process single-flight, cache still works
+    fcntl = None  # type: ignore[assignment]
+
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(2 * 1024**3)))  # 2 GB
+_EVICT_CHECK_EVERY = 200   # puts between size checks
+_EVICT_TARGET = 0.9        # evict down to this fraction of the limit
+_STALE_LOCK_SECONDS = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used_at);
+"""
+
+
+class OCRCache:
+    """
+    Disk cache of raw OCR responses, shared by every worker process on the host.
+
+    - entries: <dir>/<key[:2]>/<key>.json, written atomically (tmp + rename)
+    - index: SQLite (WAL) with size + last use, for LRU eviction under
+      OCR_CACHE_MAX_BYTES and hit statistics
+    - single-flight: a per-key flock, so concurrent misses for the same
+      document in any worker/thread result in one provider call
+    """
+    def __init__(self, cache_dir: str, max_bytes: int = OCR_CACHE_MAX_BYTES) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, "index.sqlite3")
+        self.lock_dir = os.path.join(cache_dir, "locks")
+        os.makedirs(self.lock_dir, exist_ok=True)
+        self._puts = 0
+        conn = connect(self.index_path)
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), "rb") as f:
+                raw = json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+        conn = connect(self.index_path)
+        try:
+            conn.execute(
+                "UPDATE entries SET last_used_at = ?, hits = hits + 1 WHERE key = ?",
+                (time.time(), key),
+            )
+        finally:
+            conn.close()
+        return raw
+
+    def contains(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put(self, key: str, raw: Dict[str, Any]) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(raw, ensure_ascii=False).encode("utf-8")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        now = time.time()
+        conn = connect(self.index_path)
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, size, created_at, last_used_at, hits)"
+                " VALUES (?, ?, ?, ?, 0)",
+                (key, len(data), now, now),
+            )
+        finally:
+            conn.close()
+
+        self._puts += 1
+        if self._puts % _EVICT_CHECK_EVERY == 0:
+            self.evict()
+
+    def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Dict[str, Any]],
+        *,
+        force_refresh: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Return the cached response for key, or compute and store it while
+        holding the key's lock (other processes/threads wait, then hit).
+        """
+        if not force_refresh:
+            raw = self.get(key)
+            if raw is not None:
+                cache_lookup("ocr", hit=True)
+                return raw
+
+        with self._lock(key):
+            if not force_refresh:
+                raw = self.get(key)
+                if raw is not None:
+                    cache_lookup("ocr", hit=True)  # computed by whoever held the lock
+                    return raw
+            cache_lookup("ocr", hit=False)
+            raw = compute()
+            self.put(key, raw)
+            return raw
+
+    @contextmanager
+    def _lock(self, key: str) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(os.path.join(self.lock_dir, f"{key}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.utime(fd)  # keep in-use locks out of _sweep_locks
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # releases the flock
+
+    def evict(self) -> int:
+        """
+        Drop least recently used entries until the cache is below the limit.
+        """
+        conn = connect(self.index_path)
+        removed = []
+        try:
+            with transaction(conn):
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+                if total <= self.max_bytes:
+                    return 0
+                target = self.max_bytes * _EVICT_TARGET
+                for row in conn.execute("SELECT key, size FROM entries ORDER BY last_used_at"):
+                    if total <= target:
+                        break
+                    removed.append(row["key"])
+                    total -= row["size"]
+                conn.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in removed])
+        finally:
+            conn.close()
+
+        for key in removed:
+            _remove(self._path(key))
+        self._sweep_locks()
+        return len(removed)
+
+    def _sweep_locks(self) -> None:
+        cutoff = time.time() - _STALE_LOCK_SECONDS
+        try:
+            names = os.listdir(self.lock_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.lock_dir, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        conn = connect(self.index_path)
+        try:
+            row = conn.execute(
+                "SELECT COUNT(*) AS entries, COALESCE(SUM(size), 0) AS bytes,"
+                " COALESCE(SUM(hits), 0) AS hits FROM entries"
+            ).fetchone()
+        finally:
+            conn.close()
+        return {"entries": row["entries"], "bytes": row["bytes"], "hits": row["hits"]}
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_caches: Dict[str, OCRCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_ocr_cache(cache_dir: str) -> OCRCache:
+    cache = _caches.get(cache_dir)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(cache_dir)
+            if cache is None:
+                cache = _caches[cache_dir] = OCRCache(cache_dir)
+    return cache
@@ -0,0 +1,569 @@
+"""
+Pre-flight inspection of uploads.
+
+Reads only file headers (PNG IHDR, JPEG SOFn, WebP VP8/VP8L/VP8X) and, for PDFs,
+the trailer / xref chain plus the catalog and page-tree root. Pixel data and
+content streams are never decoded, so this is cheap enough to run before we
+base64-encode and ship anything to OCR.
+"""
+from __future__ import annotations
+
+import io
+import os
+import re
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from ocr_service.core.types import DocType
+
+_HEAD_BYTES = 64 * 1024
+_TAIL_BYTES = 4 * 1024
+_OBJ_READ_BYTES = 4 * 1024
+_MAX_STREAM_BYTES = 8 * 1024 * 1024
+_MAX_XREF_HOPS = 32
+
+
+class PreflightError(ValueError):
+    """
+    Raised when an upload is malformed or exceeds the limits for its doc type.
+    Carries the HTTP status the API layer should answer with.
+    """
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass(frozen=True)
+class PreflightInfo:
+    ext: str
+    size: int
+    page_count: Optional[int] = None   # PDFs only; None if it could not be resolved cheaply
+    encrypted: bool = False            # PDFs only
+    width: Optional[int] = None        # images only
+    height: Optional[int] = None
+    color_mode: Optional[str] = None   # PIL-style: L, LA, P, RGB, RGBA, CMYK
+
+    @property
+    def is_pdf(self) -> bool:
+        return self.ext == "pdf"
+
+    @property
+    def pixels(self) -> Optional[int]:
+        if self.width is None or self.height is None:
+            return None
+        return self.width * self.height
+
+
+@dataclass(frozen=True)
+class PreflightLimits:
+    max_pages: int
+    max_pixels: int
+    max_side: int
+    allow_encrypted: bool = False
+
+
+# Sensible page counts per document: cards are front+back at most,
+# registration certificates / CoC may span several pages.
+_DEFAULT_MAX_PAGES: Dict[DocType, int] = {
+    DocType.ID_FRONT: 2,
+    DocType.ID_BACK: 2,
+    DocType.ID_OLD_FRONT: 2,
+    DocType.ID_OLD_BACK: 2,
+    DocType.DRIVING_LICENSE: 2,
+    DocType.ADDRESS_CARD: 2,
+    DocType.PASSPORT: 4,
+    DocType.REGISTRATION: 4,
+    DocType.COC: 8,
+}
+_BUNDLE_MAX_PAGES = 16  # several documents in one PDF (/v1/process_bundle)
+
+MAX_IMAGE_PIXELS = int(os.getenv("PREFLIGHT_MAX_IMAGE_PIXELS", "40000000"))  # 40 MP
+MAX_IMAGE_SIDE = int(os.getenv("PREFLIGHT_MAX_IMAGE_SIDE", "10000"))
+ALLOW_ENCRYPTED_PDF = os.getenv("PREFLIGHT_ALLOW_ENCRYPTED_PDF", "0") == "1"
+
+
+def get_limits(doc_type: Optional[DocType]) -> PreflightLimits:
+    """
+    Limits for a doc type. Page limits can be overridden per type with
+    PREFLIGHT_MAX_PAGES_<DOC_TYPE> (e.g. PREFLIGHT_MAX_PAGES_REGISTRATION=6).
+    doc_type=None means the type is not known up front - a mixed bundle or a
+    document to be classified - and gets PREFLIGHT_MAX_PAGES_BUNDLE.
+    """
+    if doc_type is None:
+        max_pages = int(os.getenv("PREFLIGHT_MAX_PAGES_BUNDLE", str(_BUNDLE_MAX_PAGES)))
+    else:
+        default_pages = _DEFAULT_MAX_PAGES.get(doc_type, 4)
+        max_pages = int(os.getenv(f"PREFLIGHT_MAX_PAGES_{doc_type.value}", str(default_pages)))
+    return PreflightLimits(
+        max_pages=max_pages,
+        max_pixels=MAX_IMAGE_PIXELS,
+        max_side=MAX_IMAGE_SIDE,
+        allow_encrypted=ALLOW_ENCRYPTED_PDF,
+    )
+
+
+def enforce_limits(info: PreflightInfo, doc_type: Optional[DocType]) -> None:
+    limits = get_limits(doc_type)
+
+    if info.is_pdf:
+        if info.encrypted and not limits.allow_encrypted:
+            raise PreflightError(422, "Encrypted PDFs are not supported. Upload an unprotected copy.")
+        if info.page_count is not None and info.page_count > limits.max_pages:
+            raise PreflightError(
+                413,
+                f"PDF has {info.page_count} pages; max for {doc_type.value if doc_type else 'an unknown type'}"
+                f" is {limits.max_pages}.",
+            )
+        return
+
+    if info.width is None or info.height is None:
+        return
+    if info.width <= 0 or info.height <= 0:
+        raise PreflightError(400, f"Invalid image dimensions {info.width}x{info.height}.")
+    if max(info.width, info.height) > limits.max_side:
+        raise PreflightError(
+            413,
+            f"Image is {info.width}x{info.height}px; max side is {limits.max_side}px.",
+        )
+    if (info.pixels or 0) > limits.max_pixels:
+        raise PreflightError(
+            413,
+            f"Image is {info.width}x{info.height}px ({info.pixels} px); max is {limits.max_pixels} px.",
+        )
+
+
+# -------------------------
+# Entry points
+# -------------------------
+def inspect_bytes(blob: bytes, ext: str) -> PreflightInfo:
+    return inspect_stream(io.BytesIO(blob), ext, size=len(blob))
+
+
+def inspect_path(path: str, ext: str) -> PreflightInfo:
+    with open(path, "rb") as f:
+        return inspect_stream(f, ext, size=os.fstat(f.fileno()).st_size)
+
+
+def inspect_stream(fp: BinaryIO, ext: str, *, size: Optional[int] = None) -> PreflightInfo:
+    """
+    Inspect a seekable binary stream. The stream position is restored afterwards.
+    """
+    pos = fp.tell()
+    try:
+        if size is None:
+            fp.seek(0, os.SEEK_END)
+            size = fp.tell()
+        r = _Reader(fp, size)
+
+        if ext == "pdf":
+            pages, encrypted = _inspect_pdf(r)
+            return PreflightInfo(ext=ext, size=size, page_count=pages, encrypted=encrypted)
+
+        head = r.read_at(0, _HEAD_BYTES)
+        if ext == "png":
+            w, h, mode = _inspect_png(head)
+        elif ext == "jpg":
+            w, h, mode = _inspect_jpeg(r)
+        elif ext == "webp":
+            w, h, mode = _inspect_webp(head)
+        else:
+            return PreflightInfo(ext=ext, size=size)
+        return PreflightInfo(ext=ext, size=size, width=w, height=h, color_mode=mode)
+    finally:
+        fp.seek(pos)
+
+
+class _Reader:
+    def __init__(self, fp: BinaryIO, size: int) -> None:
+        self.fp = fp
+        self.size = size
+
+    def read_at(self, offset: int, n: int) -> bytes:
+        if offset < 0 or offset >= self.size:
+            return b""
+        self.fp.seek(offset)
+        return self.fp.read(min(n, self.size - offset))
+
+
+# -------------------------
+# Images
+# -------------------------
+_PNG_MODES = {0: "L", 2: "RGB", 3: "P", 4: "LA", 6: "RGBA"}
+_JPEG_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+# SOF0..SOF15 except DHT (C4), JPG (C8) and DAC (CC)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _inspect_png(head: bytes) -> Tuple[int, int, Optional[str]]:
+    if len(head) < 26 or head[:8] != b"\x89PNG\r\n\x1a\n" or head[12:16] != b"IHDR":
+        raise PreflightError(400, "Malformed PNG: missing IHDR header.")
+    w, h = struct.unpack(">II", head[16:24])
+    return w, h, _PNG_MODES.get(head[25])
+
+
+def _inspect_jpeg(r: _Reader) -> Tuple[int, int, Optional[str]]:
+    if r.read_at(0, 2) != b"\xFF\xD8":
+        raise PreflightError(400, "Malformed JPEG: missing SOI marker.")
+
+    pos = 2
+    while pos < r.size:
+        hdr = r.read_at(pos, 4)
+        if len(hdr) < 2 or hdr[0] != 0xFF:
+            break
+        marker = hdr[1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:  # standalone markers
+            pos += 2
+            continue
+        if marker in (0xD9, 0xDA):  # EOI / SOS: no frame header before image data
+            break
+        if len(hdr) < 4:
+            break
+        seg_len = struct.unpack(">H", hdr[2:4])[0]
+        if marker in _JPEG_SOF:
+            sof = r.read_at(pos + 4, 6)
+            if len(sof) < 6:
+                break
+            h, w = struct.unpack(">HH", sof[1:5])
+            return w, h, _JPEG_MODES.get(sof[5])
+        pos += 2 + seg_len
+
+    raise PreflightError(400, "Malformed JPEG: no frame header (SOF) found.")
+
+
+def _inspect_webp(head: bytes) -> Tuple[int, int, Optional[str]]:
+    if len(head) < 30 or head[:4] != b"RIFF" or head[8:12] != b"WEBP":
+        raise PreflightError(400, "Malformed WebP: missing RIFF/WEBP header.")
+
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        if head[23:26] != b"\x9d\x01\x2a":
+            raise PreflightError(400, "Malformed WebP: bad VP8 frame header.")
+        w, h = struct.unpack("<HH", head[26:30])
+        return w & 0x3FFF, h & 0x3FFF, "RGB"
+    if chunk == b"VP8L":
+        if head[20] != 0x2F:
+            raise PreflightError(400, "Malformed WebP: bad VP8L signature.")
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, "RGBA"
+    if chunk == b"VP8X":
+        flags = head[20]
+        w = int.from_bytes(head[24:27], "little") + 1
+        h = int.from_bytes(head[27:30], "little") + 1
+        return w, h, "RGBA" if flags & 0x10 else "RGB"
+
+    raise PreflightError(400, f"Malformed WebP: unknown chunk {chunk!r}.")
+
+
+# -------------------------
+# PDF
+# -------------------------
+_LINEARIZED = re.compile(rb"/Linearized\b.*?/N\s+(\d+)", re.DOTALL)
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_ROOT_REF = re.compile(rb"/Root\s+(\d+)\s+(\d+)\s+R")
+_PAGES_REF = re.compile(rb"/Pages\s+(\d+)\s+(\d+)\s+R")
+_COUNT = re.compile(rb"/Count\s+(\d+)")
+_ENCRYPT = re.compile(rb"/Encrypt\b")
+_PREV = re.compile(rb"/Prev\s+(\d+)")
+_XREFSTM = re.compile(rb"/XRefStm\s+(\d+)")
+_XREF_SUBSECTION = re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*(?:\r\n|\r|\n)")
+_XREF_ENTRY = re.compile(rb"(\d{10})\s(\d{5})\s([nf])")
+_OBJ_HEADER = re.compile(rb"\s*\d+\s+\d+\s+obj\b")
+_STREAM_KW = re.compile(rb"stream\r?\n")
+_W = re.compile(rb"/W\s*\[\s*(\d+)\s+(\d+)\s+(\d+)\s*\]")
+_INDEX = re.compile(rb"/Index\s*\[([\d\s]*)\]")
+_SIZE = re.compile(rb"/Size\s+(\d+)")
+_LENGTH = re.compile(rb"/Length\s+(\d+)\b(?!\s+\d+\s+R)")
+_FIRST = re.compile(rb"/First\s+(\d+)")
+_PREDICTOR = re.compile(rb"/Predictor\s+(\d+)")
+_COLUMNS = re.compile(rb"/Columns\s+(\d+)")
+
+
+def _inspect_pdf(r: _Reader) -> Tuple[Optional[int], bool]:
+    head = r.read_at(0, 1024)
+    if not head.startswith(b"%PDF"):
+        raise PreflightError(400, "Malformed PDF: missing %PDF header.")
+
+    tail = r.read_at(max(0, r.size - _TAIL_BYTES), _TAIL_BYTES)
+    hits = _STARTXREF.findall(tail)
+    if not hits:
+        raise PreflightError(400, "Malformed PDF: no startxref in trailer.")
+
+    xref = _XrefChain(r, int(hits[-1]))
+    encrypted = bool(xref.trailer and _ENCRYPT.search(xref.trailer))
+
+    m = _LINEARIZED.search(head)
+    if m:
+        return int(m.group(1)), encrypted
+    if encrypted:
+        # object streams are encrypted too; the caller will reject anyway
+        return None, encrypted
+
+    return _page_count(xref), encrypted
+
+
+def _page_count(xref: _XrefChain) -> Optional[int]:
+    root = _ROOT_REF.search(xref.trailer or b"")
+    if not root:
+        return None
+    catalog = xref.object(int(root.group(1)))
+    pages_ref = _PAGES_REF.search(catalog or b"")
+    if not pages_ref:
+        return None
+    pages = xref.object(int(pages_ref.group(1)))
+    count = _COUNT.search(pages or b"")
+    return int(count.group(1)) if count else None
+
+
+def _dict_at(data: bytes, start: int = 0) -> Optional[bytes]:
+    """
+    Return the top-level << ... >> dictionary starting at/after `start`.
+    """
+    i = data.find(b"<<", start)
+    if i == -1:
+        return None
+    depth = 0
+    j = i
+    while j < len(data) - 1:
+        two = data[j : j + 2]
+        if two == b"<<":
+            depth += 1
+            j += 2
+            continue
+        if two == b">>":
+            depth -= 1
+            j += 2
+            if depth == 0:
+                return data[i:j]
+            continue
+        j += 1
+    return None
+
+
+class _XrefChain:
+    """
+    Resolves object numbers through classic xref tables and/or xref streams,
+    following /XRefStm and /Prev. Sections are parsed lazily and only as far
+    as needed to find the requested object.
+    """
+    def __init__(self, r: _Reader, startxref: int) -> None:
+        self.r = r
+        self.trailer: Optional[bytes] = None
+        self._sections: List[Tuple[str, int]] = []
+        self._stream_cache: Dict[int, Dict[int, Tuple[int, int, int]]] = {}
+
+        pending = [startxref]
+        seen: set[int] = set()
+        while pending and len(seen) < _MAX_XREF_HOPS:
+            off = pending.pop(0)
+            if off in seen:
+                continue
+            seen.add(off)
+            kind, trailer = self._read_trailer(off)
+            if kind is None:
+                continue
+            self._sections.append((kind, off))
+            if self.trailer is None:
+                self.trailer = trailer
+            if trailer:
+                stm = _XREFSTM.search(trailer)
+                if stm:
+                    pending.insert(0, int(stm.group(1)))
+                prev = _PREV.search(trailer)
+                if prev:
+                    pending.append(int(prev.group(1)))
+
+    def _read_trailer(self, off: int) -> Tuple[Optional[str], Optional[bytes]]:
+        chunk = self.r.read_at(off, _OBJ_READ_BYTES)
+        if chunk.lstrip().startswith(b"xref"):
+            # trailer follows the table, which may be long: scan forward for it
+            pos = off
+            while pos < self.r.size:
+                buf = self.r.read_at(pos, 64 * 1024)
+                k = buf.find(b"trailer")
+                if k != -1:
+                    d = _dict_at(self.r.read_at(pos + k, _OBJ_READ_BYTES))
+                    return "table", d
+                if len(buf) < 64 * 1024:
+                    break
+                pos += len(buf) - 16
+            return "table", None
+        if _OBJ_HEADER.match(chunk):
+            return "stream", _dict_at(chunk)
+        return None, None
+
+    # ---- lookup ----
+    def _locate(self, objnum: int) -> Optional[Tuple[int, int, int]]:
+        """
+        Return (type, a, b): (1, offset, 0) or (2, objstm_num, index).
+        """
+        for kind, off in self._sections:
+            if kind == "table":
+                hit = self._lookup_table(off, objnum)
+            else:
+                hit = self._stream_entries(off).get(objnum)
+            if hit is None:
+                continue
+            if hit[0] == 0:  # free in the newest section that mentions it
+                return None
+            return hit
+        return None
+
+    def _lookup_table(self, off: int, objnum: int) -> Optional[Tuple[int, int, int]]:
+        buf = self.r.read_at(off, 64)
+        pos = off + buf.find(b"xref") + 4
+        while pos < self.r.size:
+            line = self.r.read_at(pos, 64)
+            m = _XREF_SUBSECTION.match(line)
+            if not m:
+                return None
+            start, count = int(m.group(1)), int(m.group(2))
+            entries = pos + m.end()
+            if start <= objnum < start + count:
+                e = _XREF_ENTRY.match(self.r.read_at(entries + (objnum - start) * 20, 20))
+                if not e:
+                    return None
+                if e.group(3) == b"f":
+                    return (0, 0, 0)
+                return (1, int(e.group(1)), 0)
+            pos = entries + count * 20
+        return None
+
+    def _stream_entries(self, off: int) -> Dict[int, Tuple[int, int, int]]:
+        cached = self._stream_cache.get(off)
+        if cached is not None:
+            return cached
+
+        entries: Dict[int, Tuple[int, int, int]] = {}
+        self._stream_cache[off] = entries
+        parsed = self._read_stream(off)
+        if parsed is None:
+            return entries
+        d, data = parsed
+
+        w = _W.search(d)
+        if not w:
+            return entries
+        w1, w2, w3 = (int(w.group(i)) for i in (1, 2, 3))
+        row = w1 + w2 + w3
+        if row <= 0:
+            return entries
+
+        idx = _INDEX.search(d)
+        if idx:
+            nums = [int(x) for x in idx.group(1).split()]
+        else:
+            size = _SIZE.search(d)
+            nums = [0, int(size.group(1)) if size else len(data) // row]
+
+        pos = 0
+        for k in range(0, len(nums) - 1, 2):
+            first, count = nums[k], nums[k + 1]
+            for n in range(first, first + count):
+                rec = data[pos : pos + row]
+                pos += row
+                if len(rec) < row:
+                    return entries
+                t = int.from_bytes(rec[:w1], "big") if w1 else 1
+                a = int.from_bytes(rec[w1 : w1 + w2], "big")
+                b = int.from_bytes(rec[w1 + w2 :], "big") if w3 else 0
+                entries.setdefault(n, (t, a, b))
+        return entries
+
+    def _read_stream(self, off: int) -> Optional[Tuple[bytes, bytes]]:
+        """
+        Return (dict, decoded data) for a FlateDecode stream object at `off`.
+        """
+        chunk = self.r.read_at(off, _OBJ_READ_BYTES)
+        d = _dict_at(chunk)
+        if d is None:
+            return None
+        length = _LENGTH.search(d)
+        s = _STREAM_KW.search(chunk, chunk.find(d) + len(d))
+        if not length or not s or int(length.group(1)) > _MAX_STREAM_BYTES:
+            return None
+        raw = self.r.read_at(off + s.end(), int(length.group(1)))
+
+        if b"/Filter" in d:
+            if b"/FlateDecode" not in d:
+                return None
+            try:
+                raw = zlib.decompressobj().decompress(raw, _MAX_STREAM_BYTES)
+            except zlib.error:
+                return None
+
+        pred = _PREDICTOR.search(d)
+        if pred and int(pred.group(1)) >= 10:
+            cols = _COLUMNS.search(d)
+            raw = _png_unpredict(raw, int(cols.group(1)) if cols else 1)
+        return d, raw
+
+    def object(self, objnum: int) -> Optional[bytes]:
+        """
+        Return the dictionary of an object, or None if it cannot be resolved cheaply.
+        """
+        loc = self._locate(objnum)
+        if loc is None:
+            return None
+        t, a, b = loc
+        if t == 1:
+            chunk = self.r.read_at(a, _OBJ_READ_BYTES)
+            if not _OBJ_HEADER.match(chunk):
+                return None
+            return _dict_at(chunk)
+        if t == 2:
+            return self._object_from_stream(a, objnum)
+        return None
+
+    def _object_from_stream(self, stm_num: int, objnum: int) -> Optional[bytes]:
+        loc = self._locate(stm_num)
+        if loc is None or loc[0] != 1:
+            return None
+        parsed = self._read_stream(loc[1])
+        if parsed is None:
+            return None
+        d, data = parsed
+        first = _FIRST.search(d)
+        if not first:
+            return None
+        first_off = int(first.group(1))
+        nums = [int(x) for x in data[:first_off].split()]
+        for k in range(0, len(nums) - 1, 2):
+            if nums[k] == objnum:
+                return _dict_at(data, first_off + nums[k + 1])
+        return None
+
+
+def _png_unpredict(data: bytes, columns: int) -> bytes:
+    """
+    Undo PNG row predictors (PDF /Predictor >= 10), 1 byte per sample.
+    """
+    out = bytearray()
+    prev = bytearray(columns)
+    stride = columns + 1
+    for i in range(0, len(data) - columns, stride):
+        ftype = data[i]
+        row = bytearray(data[i + 1 : i + stride])
+        for j in range(len(row)):
+            left = row[j - 1] if j > 0 else 0
+            up = prev[j]
+            if ftype == 1:
+                row[j] = (row[j] + left) & 0xFF
+            elif ftype == 2:
+                row[j] = (row[j] + up) & 0xFF
+            elif ftype == 3:
+                row[j] = (row[j] + ((left + up) >> 1)) & 0xFF
+            elif ftype == 4:
+                ul = prev[j - 1] if j > 0 else 0
+                p = left + up - ul
+                pa, pb, pc = abs(p - left), abs(p - up), abs(p - ul)
+                pred = left if pa <= pb and pa <= pc else (up if pb <= pc else ul)
+                row[j] = (row[j] + pred) & 0xFF
+        out += row
+        prev = row
+    return bytes(out)
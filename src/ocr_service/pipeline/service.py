@@ -1,15 +1,24 @@
 from __future__ import annotations
-from typing import Any
-from ocr_service.clients.mistral_ocr import run_ocr_image_path
-from ocr_service.core.types import DocType, ExtractionResult
-from ocr_service.config.settings import get_settings
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+from ocr_service.clients.mistral_ocr import (
+    ocr_result_from_raw,
+    run_ocr_bytes,
+    run_ocr_image_path,
+)
+from ocr_service.core.metrics import EXTRACTION_SECONDS, stage
+from ocr_service.core.types import DocType, ExtractionResult, OCRResult
+from ocr_service.config.settings import Settings, get_settings
+from ocr_service.core.utils.image import BinarySource, normalize_ext, source_sha256
 from ocr_service.documents.registry import get_processor
+from ocr_service.pipeline.classify import PageGroup, check_doc_type, classify_text, group_pages
+from ocr_service.pipeline.ocr_cache import get_ocr_cache
 
 from ocr_service.documents import personal_schema, vehicle_schema
 
 VEHICLE_TYPES = {"REGISTRATION", "COC"}
 
-def unify_payload(doc_type_value: str, fields: dict) -> tuple[str, dict]:
+def unify_payload(doc_type_value: Optional[str], fields: dict) -> tuple[str, dict]:
     if doc_type_value in VEHICLE_TYPES:
         out = vehicle_schema.empty()
         for k in vehicle_schema.FIELDS:
@@ -24,45 +33,222 @@ def unify_payload(doc_type_value: str, fields: dict) -> tuple[str, dict]:
     return "personal_data", out
 
 
-def process_document(*, client: Any, doc_type: DocType, image_path: str) -> ExtractionResult:
+def _cached_ocr(settings: Settings, content_id: str, compute: Callable[[], OCRResult]) -> OCRResult:
     """
-    - Runs OCR (with local disk caching)
-    - Dispatches to doc-type processor (currently stubs)
-    - Returns stable JSON wrapper
+    Serve an OCR call from the shared disk cache (keyed by content, model and
+    table format) when OCR_CACHE_ENABLED; identical concurrent misses across
+    workers make one provider call.
+    """
+    if not settings.ocr_cache_enabled:
+        return compute()
+
+    cache = get_ocr_cache(settings.ocr_cache_dir)
+    key = cache.key(content_id, settings.ocr_model, settings.ocr_table_format)
+    raw = cache.get_or_compute(
+        key,
+        lambda: compute().raw,
+        force_refresh=settings.ocr_cache_force_refresh,
+    )
+    return ocr_result_from_raw(raw)
+
+
+def ocr_document(*, client: Any, image_path: str) -> OCRResult:
+    """
+    OCR stage: I/O-bound, dominated by waiting on the provider.
+    """
+    settings = get_settings()
+    ext = normalize_ext(Path(image_path).suffix)
+
+    def compute() -> OCRResult:
+        return run_ocr_image_path(
+            client=client,
+            image_path=image_path,
+            model=settings.ocr_model,
+            table_format=settings.ocr_table_format,
+            is_pdf=ext == "pdf",
+        )
+
+    with open(image_path, "rb") as f:
+        digest = source_sha256(f)
+    # same key as ocr_document_bytes() for the same file (".jpeg" -> ".jpg")
+    return _cached_ocr(settings, f"{digest}.{ext}", compute)
+
+
+def ocr_cached(digest: str, ext: str) -> bool:
+    """
+    Whether ocr_document_bytes() for this content (sha256 hex digest) would be
+    served from the disk cache, without reading the entry.
+    """
+    settings = get_settings()
+    if not settings.ocr_cache_enabled or settings.ocr_cache_force_refresh:
+        return False
+    cache = get_ocr_cache(settings.ocr_cache_dir)
+    return cache.contains(cache.key(f"{digest}.{ext}", settings.ocr_model, settings.ocr_table_format))
 
-    TODO -> Extraction logic + correctness scoring will be refined later.
+
+def ocr_document_bytes(
+    *,
+    client: Any,
+    data: BinarySource,
+    ext: str,
+    digest: Optional[str] = None,
+    data_url: Optional[str] = None,
+) -> OCRResult:
+    """
+    OCR stage for in-memory uploads (bytes or a spooled file object). Pass
+    `digest` (sha256 hex of data) and `data_url` when the ingest loop
+    already computed them, to skip re-reading the file.
     """
     settings = get_settings()
 
-    ocr = run_ocr_image_path(
-        client=client,
-        image_path=image_path,
-        model=settings.ocr_model,
-        table_format=settings.ocr_table_format,
-    ) 
+    def compute() -> OCRResult:
+        return run_ocr_bytes(
+            client=client,
+            data=data,
+            ext=ext,
+            model=settings.ocr_model,
+            table_format=settings.ocr_table_format,
+            data_url=data_url,
+        )
+
+    return _cached_ocr(settings, f"{digest or source_sha256(data)}.{ext}", compute)
+
+
+def merge_ocr_pages(results: List[OCRResult]) -> OCRResult:
+    """
+    Combine per-page OCR results (in page order) into one document result,
+    equivalent to OCR'ing the whole document in a single call.
+    """
+    if not results:
+        return OCRResult(text="", raw={"pages": []})
+
+    raw = {k: v for k, v in results[0].raw.items() if k != "pages"}
+    raw["pages"] = [p for r in results for p in r.raw.get("pages", [])]
+    text = "\n\n".join(r.text for r in results if r.text).strip()
+    return OCRResult(text=text, raw=raw)
+
+
+def split_ocr_pages(ocr: OCRResult) -> List[OCRResult]:
+    """
+    One OCRResult per page of a multi-page OCR response (inverse of merge_ocr_pages).
+    """
+    out: List[OCRResult] = []
+    top = {k: v for k, v in ocr.raw.items() if k != "pages"}
+    for p in ocr.raw.get("pages", []):
+        md = p.get("markdown")
+        text = md.strip() if isinstance(md, str) else ""
+        out.append(OCRResult(text=text, raw={**top, "pages": [p]}))
+    return out
+
+
+def split_bundle(ocr: OCRResult) -> tuple[List[tuple[PageGroup, OCRResult]], List[int]]:
+    """
+    Classify each page of a mixed bundle and regroup pages into documents.
+    Returns ([(group, OCR of its pages)], unclassified page indices).
+    """
+    pages = split_ocr_pages(ocr)
+    with stage("classify"):
+        labels = [classify_text(p.text, page=i) for i, p in enumerate(pages)]
+    groups, unclassified = group_pages(labels)
+    return [(g, merge_ocr_pages([pages[i] for i in g.pages])) for g in groups], unclassified
+
+
+def extract_document(*, doc_type: Optional[DocType], ocr: OCRResult) -> ExtractionResult:
+    """
+    Extraction stage: CPU-bound processor dispatch + scoring over OCR text.
+
+    The text is classified first (one signature-index scan, see
+    pipeline/classify.py): doc_type=None resolves to the detected type, and
+    is_correct_document / confidence say whether the document looks like
+    the type it was submitted as.
+    """
+    with stage("classify"):
+        check = check_doc_type(ocr.text, doc_type)
+    if doc_type is None:
+        doc_type = check.detected
 
     #Processor dispatch 
-    processor = get_processor(doc_type)
+    processor = get_processor(doc_type) if doc_type is not None else None
     if processor is None:
         fields: dict[str, Any] = {}
     else:
-        fields = processor.extract_fields(ocr)
+        with stage("extraction"), EXTRACTION_SECONDS.time(type(processor).__name__):
+            fields = processor.extract_fields(ocr)
 
     # Move document_number out of fields (if present)
     docno = None
     if isinstance(fields, dict):
         docno = fields.pop("document_number", None)
 
-    #TODO Stub scoring (for now)
-    confidence = 0.5 if ocr.text else 0.0
-    is_correct = True
-
-    # if confidence < settings.confidence_threshold:
-
     return ExtractionResult(
         doc_type=doc_type,
         document_number=docno,
-        is_correct_document=is_correct,
-        confidence=confidence,
+        is_correct_document=check.is_correct,
+        confidence=check.confidence,
         fields=fields,
-    )
\ No newline at end of file
+    )
+
+
+def text_ocr(text: str) -> OCRResult:
+    """
+    OCRResult for markdown supplied by the caller (e.g. OCR text corrected by
+    hand), shaped like a one-page OCR response.
+    """
+    text = text.strip()
+    return OCRResult(text=text, raw={"pages": [{"index": 0, "markdown": text}]})
+
+
+def extraction_payload(res: ExtractionResult) -> Dict[str, Any]:
+    """
+    Unified response body of an extraction (ProcessResponse without uid).
+    """
+    doc_type = res.doc_type.value if res.doc_type is not None else None
+    with stage("postprocess"):
+        data_key, data = unify_payload(doc_type, dict(res.fields or {}))
+    return {
+        "doc_type": doc_type,
+        "document_number": res.document_number,
+        "is_correct_document": res.is_correct_document,
+        "confidence": round(res.confidence, 4),
+        "personal_data": data if data_key == "personal_data" else None,
+        "vehicle_data": data if data_key == "vehicle_data" else None,
+    }
+
+
+def extract_from_text(doc_type: Union[DocType, str, None], text: str) -> Dict[str, Any]:
+    """
+    Classification, processor and unify_payload on supplied OCR markdown,
+    without an OCR call: the same body /v1/process returns for a document
+    whose OCR produced this text (minus uid). doc_type=None detects the type.
+    """
+    res = extract_document(doc_type=DocType(doc_type) if doc_type is not None else None, ocr=text_ocr(text))
+    return extraction_payload(res)
+
+
+def process_document(*, client: Any, doc_type: Optional[DocType], image_path: str) -> ExtractionResult:
+    """
+    - Runs OCR (with the shared disk cache, see pipeline/ocr_cache.py)
+    - Checks (or, for doc_type=None, detects) the doc type from the OCR text
+    - Dispatches to doc-type processor
+    - Returns stable JSON wrapper
+
+    Stages are also exposed separately (ocr_document / extract_document) so the
+    API can run them on differently sized pools.
+    """
+    ocr = ocr_document(client=client, image_path=image_path)
+    return extract_document(doc_type=doc_type, ocr=ocr)
+
+
+def process_document_bytes(
+    *,
+    client: Any,
+    doc_type: Optional[DocType],
+    data: BinarySource,
+    ext: str,
+) -> ExtractionResult:
+    """
+    Same as process_document, but for content already in memory
+    (bytes or a seekable file object); nothing is written to disk.
+    """
+    ocr = ocr_document_bytes(client=client, data=data, ext=ext)
+    return extract_document(doc_type=doc_type, ocr=ocr)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import io
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from ocr_service.core.types import OCRResult
+from ocr_service.documents.registry import PROCESSOR_PATHS, get_processor, rules_version
+from ocr_service.pipeline.classify import classify_text
+
+# Warm-up before a worker reports ready: everything that is otherwise paid by
+# the first requests after a cold start (lazy processor imports, first-use
+# regex compilation, NumPy for live-capture scoring, the OCR SDK import and
+# its connection setup).
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+# connect to the provider endpoint (DNS, TCP, TLS) during warm-up
+WARMUP_PROVIDER = os.getenv("WARMUP_PROVIDER", "1") == "1"
+
+# Labels / values shaped like the documents', so every extractor's patterns run at least once
+_SAMPLE_TEXT = """\
+MAGYARORSZÁG / HUNGARY
+SZEMÉLYAZONOSÍTÓ IGAZOLVÁNY / IDENTITY CARD
+Családi és utónév / Family name and given name: KISS JÁNOS
+Születési hely és idő / Place and date of birth: BUDAPEST 1990.01.31
+Nem / Sex: F  Állampolgárság / Nationality: HUN
+Érvényes / Date of expiry: 2031.05.01
+Okmányazonosító / Document No: 123456AB
+Lakóhely / Address: 1111 BUDAPEST, FŐ UTCA 1.
+Forgalmi rendszám / Registration number: ABC-123
+I<HUN123456AB<<<<<<<<<<<<<<<
+9001311M3105012HUN<<<<<<<<<<<4
+KISS<<JANOS<<<<<<<<<<<<<<<<<<<
+"""
+
+
+@dataclass
+class WarmupReport:
+    seconds: float = 0.0
+    processors: List[str] = field(default_factory=list)
+    rules_version: str = ""
+    provider_error: Optional[str] = None
+
+
+def warm_up() -> WarmupReport:
+    """
+    Synchronous warm-up (run it off the event loop). Processor failures
+    raise; a provider that cannot be reached is only reported, since it is
+    not something a restart of this worker would fix.
+    """
+    started = time.perf_counter()
+    report = WarmupReport(rules_version=rules_version())
+
+    ocr = OCRResult(text=_SAMPLE_TEXT, raw={"pages": [{"index": 0, "markdown": _SAMPLE_TEXT}]})
+    for doc_type in PROCESSOR_PATHS:
+        processor = get_processor(doc_type)
+        if processor is not None:
+            processor.extract_fields(ocr)
+            report.processors.append(doc_type.value)
+    classify_text(_SAMPLE_TEXT, page=0)
+    _warm_capture()
+
+    if WARMUP_PROVIDER:
+        report.provider_error = _warm_provider()
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def _warm_capture() -> None:
+    from PIL import Image
+
+    from ocr_service.pipeline.capture import analyze_frame
+
+    buf = io.BytesIO()
+    Image.new("L", (64, 48)).save(buf, "JPEG")
+    analyze_frame(buf.getvalue(), 0)
+
+
+def _warm_provider() -> Optional[str]:
+    from ocr_service.config.mistral_client import get_mistral_client
+
+    try:
+        client = get_mistral_client()
+        config = client.sdk_configuration
+        server_url, _ = config.get_server_details()
+        # any response will do: this resolves, connects and pools the connection
+        config.client.head(server_url, timeout=5.0)
+    except Exception as e:
+        logger.warning("OCR provider warm-up failed: %s", e)
+        return f"{type(e).__name__}: {e}"
+    return None